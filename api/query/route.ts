@@ -27,6 +27,25 @@ export async function POST(request: Request) {
       });
     }
 
+    // Forward to the long-running query service when one is configured: it keeps
+    // its clients warm and batches the embeddings of concurrent questions
+    if (import.meta.env.VITE_QUERY_SERVICE_URL) {
+      console.log("Forwarding query to the query service...");
+      const serviceResponse = await fetch(`${import.meta.env.VITE_QUERY_SERVICE_URL}/query`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query, namespace: 'research-papers' }),
+      });
+      return new Response(await serviceResponse.text(), {
+        status: serviceResponse.status,
+        headers: { 
+          'Content-Type': 'application/json',
+          'Cache-Control': 'no-store',
+          'Access-Control-Allow-Origin': '*'
+        },
+      });
+    }
+
     // Check environment variables
     if (!import.meta.env.VITE_OPENAI_API_KEY) {
       console.error("OpenAI API key missing");
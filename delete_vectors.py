@@ -1,6 +1,12 @@
-from pinecone import Pinecone
 import os
 from dotenv import load_dotenv
+from rag.answer_cache import invalidate_answers
+from rag.checkpoint import Checkpoint
+from rag.chunk_store import ChunkStore, chunk_scope
+from rag.dedup import DedupIndex
+from rag.lexical import LexicalIndex
+from rag.manifest import Manifest
+from rag.vector_store import open_vector_store, vector_store_backend
 
 # Load and verify environment variables
 load_dotenv()
@@ -8,27 +14,51 @@ api_key = os.getenv('VITE_PINECONE_API_KEY')
 environment = os.getenv('VITE_PINECONE_ENVIRONMENT')
 index_name = os.getenv('VITE_PINECONE_INDEX')
 
-print(f"Initializing Pinecone with:")
+print(f"Initializing {vector_store_backend()} vector store with:")
 print(f"Environment: {environment}")
 print(f"Index name: {index_name}")
-print(f"API key: {api_key[:10]}...")
+if api_key:
+    print(f"API key: {api_key[:10]}...")
 
 try:
-    # Initialize Pinecone
-    pc = Pinecone(
-        api_key=api_key,
-        environment=environment
-    )
-    
     # Get index
     print("\nGetting index...")
-    index = pc.Index(index_name)
+    store = open_vector_store(index_name, api_key=api_key)
     
     # Delete vectors
     print("\nDeleting vectors...")
-    index.delete(delete_all=True, namespace="research-papers")
+    store.delete(delete_all=True, namespace="research-papers")
+    store.close()
     print("Successfully deleted all vectors from the index")
     
+    # Forget what was indexed so the next ingest run re-uploads everything
+    manifest = Manifest.for_target(index_name, "research-papers")
+    manifest.clear()
+    manifest.save()
+    print("Cleared the ingest manifest")
+    
+    # An unfinished run's checkpoint would skip chunks that are now deleted
+    Checkpoint.for_target(index_name, "research-papers").clear()
+    print("Cleared the ingest checkpoint")
+    
+    # The BM25 index covers the same chunks
+    lexical = LexicalIndex.for_target(index_name, "research-papers")
+    lexical.clear()
+    lexical.save()
+    print("Cleared the lexical index")
+    
+    dedup = DedupIndex.for_target(index_name, "research-papers")
+    dedup.clear()
+    dedup.save()
+    print("Cleared the duplicate-detection index")
+    
+    chunk_store = ChunkStore()
+    print(f"Dropped {chunk_store.clear(chunk_scope(index_name, 'research-papers'))} stored chunk texts")
+    chunk_store.close()
+    
+    # Cached answers were drawn from the deleted vectors
+    print(f"Dropped {invalidate_answers(index_name, 'research-papers')} cached answers")
+    
 except Exception as e:
     print(f"\nError occurred:")
     print(f"Type: {type(e)}")
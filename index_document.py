@@ -1,83 +1,31 @@
 import os
+from dataclasses import replace
 from dotenv import load_dotenv
-import openai
-from pinecone import Pinecone
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-import PyPDF2
+from rag.collections import COLLECTIONS
+from rag.ingest import Ingester
+from rag.metrics import instrumented
 
 # Load environment variables
 load_dotenv()
 
-def read_pdf(file_path):
-    """Read PDF and return text content."""
-    with open(file_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
+# Same index, namespace and embedding model as the research-papers collection
+# (queries of that namespace embed with its model), with larger chunks
+COLLECTION = replace(
+    COLLECTIONS["research-papers"],
+    chunk_size=1000,
+    chunk_overlap=200,
+    max_chunk_chars=None
+)
+NAMESPACE = COLLECTION.namespace
 
-def chunk_text(text):
-    """Split text into overlapping chunks."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
-    return text_splitter.split_text(text)
-
-def get_embeddings(chunks):
-    """Get embeddings for chunks using OpenAI."""
-    embeddings = OpenAIEmbeddings(
-        api_key=os.getenv('VITE_OPENAI_API_KEY'),
-        model="text-embedding-3-small"
-    )
-    return [embeddings.embed_query(chunk) for chunk in chunks]
-
-def index_document(file_path):
-    """Index document in Pinecone."""
-    # Initialize Pinecone
-    pc = Pinecone(
-        api_key=os.getenv('VITE_PINECONE_API_KEY'),
-        environment=os.getenv('VITE_PINECONE_ENVIRONMENT')
-    )
-    
-    # Get index
-    index = pc.Index(os.getenv('VITE_PINECONE_INDEX'))
-    
-    # Read and chunk document
-    print("Reading document...")
-    text = read_pdf(file_path)
-    print("Chunking text...")
-    chunks = chunk_text(text)
-    print(f"Created {len(chunks)} chunks")
-    
-    # Get embeddings
-    print("Generating embeddings...")
-    vectors = []
-    for i, chunk in enumerate(chunks):
-        embedding = get_embeddings([chunk])[0]
-        vectors.append({
-            'id': f"chunk_{i}",
-            'values': embedding,
-            'metadata': {
-                'text': chunk,
-                'chunk_index': i,
-                'filename': os.path.basename(file_path),
-                'source': os.path.basename(file_path)
-            }
-        })
-        print(f"Processed chunk {i+1}/{len(chunks)}")
-    
-    # Upsert to Pinecone
-    print("Upserting to Pinecone...")
-    batch_size = 100
-    for i in range(0, len(vectors), batch_size):
-        batch = vectors[i:i + batch_size]
-        index.upsert(vectors=batch, namespace="research-papers")
-        print(f"Upserted batch {i//batch_size + 1}/{(len(vectors)-1)//batch_size + 1}")
+def index_document(file_path, force=False):
+    """Index document in the vector store, skipping it if unchanged since the last run."""
+    with Ingester() as ingester:
+        # METRICS_FILE, METRICS_PORT and PROFILE instrument the run
+        with instrumented(ingester.metrics, run="index_document"):
+            results = ingester.ingest(COLLECTION, paths=[file_path], force=force)
+    if not results:
+        print(f"{os.path.basename(file_path)} is unchanged since it was last indexed")
 
 if __name__ == "__main__":
     file_path = "1736171_Boukhris,O_2024.pdf"  # Update with your PDF path
@@ -0,0 +1 @@
+"""Shared ingest and retrieval helpers used by the indexing and query scripts."""
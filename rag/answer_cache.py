@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+DEFAULT_ANSWER_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "answers.sqlite"
+)
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_THRESHOLD = 0.95  # cosine similarity of two questions that should share an answer
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    sources: List[Dict]
+    similarity: float
+    age: float
+
+
+def filter_key(filter: Optional[Dict]) -> str:
+    return json.dumps(filter or {}, sort_keys=True)
+
+
+class AnswerCache:
+    """Answers keyed by (index, namespace, filter) and the question's embedding.
+
+    A lookup returns the stored answer whose question embedding is most
+    similar to the new one, if that similarity reaches ``threshold`` and the
+    entry is younger than ``ttl`` seconds. Entries for a namespace are
+    dropped by ``invalidate`` whenever it is re-ingested or cleared.
+    """
+
+    def __init__(self, path: str = DEFAULT_ANSWER_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 threshold: float = DEFAULT_THRESHOLD):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                index_name TEXT NOT NULL,
+                namespace TEXT NOT NULL,
+                filter TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (index_name, namespace, filter)")
+        self._conn.commit()
+
+    def get(self, index_name: str, namespace: Optional[str], filter: Optional[Dict],
+            vector) -> Optional[CachedAnswer]:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector, answer, sources, created FROM answers "
+                "WHERE index_name = ? AND namespace = ? AND filter = ? AND created > ?",
+                (index_name, namespace or "", filter_key(filter), now - self.ttl)
+            ).fetchall()
+        best = None
+        if rows:
+            vectors = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows])
+            scores = vectors @ query  # stored vectors are normalized
+            i = int(np.argmax(scores))
+            if scores[i] >= self.threshold:
+                _, answer, sources, created = rows[i]
+                best = CachedAnswer(answer, json.loads(sources), float(scores[i]), now - created)
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def put(self, index_name: str, namespace: Optional[str], filter: Optional[Dict], vector,
+            question: str, answer: str, sources: List[Dict]):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE created <= ?", (now - self.ttl,))
+            self._conn.execute(
+                "INSERT INTO answers (index_name, namespace, filter, vector, question, answer, sources, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (index_name, namespace or "", filter_key(filter), vector.tobytes(), question, answer,
+                 json.dumps(sources), now)
+            )
+            self._conn.commit()
+
+    def invalidate(self, index_name: str, namespace: Optional[str] = None, all_namespaces: bool = False) -> int:
+        """Drop cached answers of a namespace (or every namespace of the index)."""
+        with self._lock:
+            if all_namespaces:
+                cursor = self._conn.execute("DELETE FROM answers WHERE index_name = ?", (index_name,))
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM answers WHERE index_name = ? AND namespace = ?",
+                    (index_name, namespace or "")
+                )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def invalidate_answers(index_name: str, namespace: Optional[str] = None,
+                       path: str = DEFAULT_ANSWER_CACHE_PATH) -> int:
+    """Drop cached answers after a namespace's vectors changed; a no-op if nothing is cached."""
+    if not os.path.exists(path):
+        return 0
+    cache = AnswerCache(path)
+    try:
+        return cache.invalidate(index_name, namespace)
+    finally:
+        cache.close()
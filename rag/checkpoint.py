@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from rag.vector_store import vector_store_backend
+
+CHECKPOINT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "checkpoints"
+)
+
+
+def checkpoint_path(index_name: str, namespace: Optional[str] = None,
+                    backend: Optional[str] = None, directory: Optional[str] = None) -> str:
+    name = f"{index_name}--{namespace or 'default'}"
+    backend = backend or vector_store_backend()
+    if backend != "pinecone":
+        name = f"{backend}--{name}"
+    return os.path.join(directory or CHECKPOINT_DIR, re.sub(r"[^\w.-]", "_", name) + ".jsonl")
+
+
+class Checkpoint:
+    """Journal of files an ingest has started but not yet recorded in the manifest.
+
+    After every settled upsert batch the file, its chunk range and the
+    vector IDs that were upserted or failed are appended and fsynced, so a
+    run that dies part way (a crash, a rate limit, Ctrl-C) loses at most the
+    batches still in flight. The next run of the same version of a file
+    skips the chunks already upserted; ``failed_files`` names the files with
+    failed chunks or extraction errors, for a retry of just those.
+
+    A file's entries are dropped once it is recorded in the manifest, and
+    ``compact`` rewrites the journal with one line per remaining file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final line of an interrupted write
+                    self._apply(record)
+
+    @classmethod
+    def for_target(cls, index_name: str, namespace: Optional[str] = None,
+                   backend: Optional[str] = None, directory: Optional[str] = None) -> "Checkpoint":
+        return cls(checkpoint_path(index_name, namespace, backend, directory))
+
+    def _apply(self, record: Dict):
+        key = record["file"]
+        if "start" in record:
+            self.files[key] = {
+                "sha256": record["start"]["sha256"],
+                "params": record["start"]["params"],
+                "stale": set(record["start"].get("stale", [])),
+                "upserted": set(),
+                "failed": set(),
+                "error": None,
+            }
+            return
+        if record.get("done"):
+            self.files.pop(key, None)
+            return
+        entry = self.files.get(key)
+        if entry is None:
+            return
+        if "error" in record:
+            entry["error"] = record["error"]
+            return
+        entry["upserted"].update(record.get("ids", []))
+        entry["failed"].difference_update(record.get("ids", []))
+        entry["failed"].update(record.get("failed", []))
+        entry["error"] = None
+
+    def _append(self, records: Iterable[Dict]):
+        # Called with the lock held
+        records = list(records)
+        for record in records:
+            self._apply(record)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def resume(self, key: str, sha256: str, params: Dict) -> Set[str]:
+        """IDs of this version of the file that are already upserted; starts a fresh entry otherwise."""
+        with self._lock:
+            entry = self.files.get(key)
+            if entry is not None and entry["sha256"] == sha256 and entry["params"] == params:
+                return set(entry["upserted"])
+            # A partial upload of another version may have left vectors behind
+            stale = set(entry["upserted"]) | entry["stale"] if entry is not None else set()
+            self._append([{"file": key, "start": {"sha256": sha256, "params": params,
+                                                  "stale": sorted(stale)}}])
+            return set()
+
+    def record_batch(self, key: str, chunks: Tuple[int, int], upserted: List[str], failed: List[str]):
+        with self._lock:
+            if key in self.files:
+                self._append([{"file": key, "chunks": list(chunks), "ids": upserted, "failed": failed}])
+
+    def record_error(self, key: str, error: str):
+        with self._lock:
+            if key in self.files:
+                self._append([{"file": key, "error": error}])
+
+    def done(self, key: str):
+        with self._lock:
+            if key in self.files:
+                self._append([{"file": key, "done": True}])
+
+    def stale_ids(self, key: str) -> Set[str]:
+        """IDs upserted for an earlier version of the file that was never finished."""
+        entry = self.files.get(key)
+        return set(entry["stale"]) if entry else set()
+
+    def failed_files(self) -> List[str]:
+        return sorted(key for key, entry in self.files.items() if entry["failed"] or entry["error"])
+
+    def summary(self) -> Dict:
+        return {
+            "files": len(self.files),
+            "upserted": sum(len(entry["upserted"]) for entry in self.files.values()),
+            "failed": sum(len(entry["failed"]) for entry in self.files.values()),
+            "errors": sum(1 for entry in self.files.values() if entry["error"]),
+        }
+
+    def clear(self):
+        with self._lock:
+            self.files = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def compact(self):
+        """Rewrite the journal as one entry per file still in progress."""
+        with self._lock:
+            if not self.files and not os.path.exists(self.path):
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                for key, entry in self.files.items():
+                    f.write(json.dumps({"file": key, "start": {
+                        "sha256": entry["sha256"], "params": entry["params"],
+                        "stale": sorted(entry["stale"])}}) + "\n")
+                    f.write(json.dumps({"file": key, "ids": sorted(entry["upserted"]),
+                                        "failed": sorted(entry["failed"])}) + "\n")
+                    if entry["error"]:
+                        f.write(json.dumps({"file": key, "error": entry["error"]}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
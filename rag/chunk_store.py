@@ -0,0 +1,87 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Sequence
+
+from rag.vector_store import vector_store_backend
+
+DEFAULT_CHUNK_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "chunks.sqlite"
+)
+MAX_QUERY_PARAMS = 900  # stay under SQLite's bound-parameter limit
+
+
+def chunk_scope(index_name: str, namespace: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """Key of one index namespace's chunks; vector IDs are only unique within it."""
+    name = f"{index_name}--{namespace or 'default'}"
+    backend = backend or vector_store_backend()
+    if backend != "pinecone":
+        name = f"{backend}--{name}"
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+class ChunkStore:
+    """Chunk text keyed by (scope, vector ID), so vectors need not carry it in metadata.
+
+    The ingester writes every chunk's text here before upserting it, and the
+    retriever looks up the text of a query's matches in one ``get`` call.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHUNK_STORE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                scope TEXT NOT NULL,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (scope, id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def put(self, scope: str, ids: Sequence[str], texts: Sequence[str]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (scope, id, text) VALUES (?, ?, ?)",
+                [(scope, vector_id, text) for vector_id, text in zip(ids, texts)]
+            )
+            self._conn.commit()
+
+    def get(self, scope: str, ids: Sequence[str]) -> Dict[str, str]:
+        """Text of the given IDs; IDs that aren't stored are left out."""
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), MAX_QUERY_PARAMS):
+                part = ids[i:i + MAX_QUERY_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT id, text FROM chunks WHERE scope = ? AND id IN ({','.join('?' * len(part))})",
+                    [scope] + part
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def delete(self, scope: str, ids: Iterable[str]) -> int:
+        with self._lock:
+            cursor = self._conn.executemany(
+                "DELETE FROM chunks WHERE scope = ? AND id = ?",
+                [(scope, vector_id) for vector_id in ids]
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self, scope: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM chunks WHERE scope = ?", (scope,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,158 @@
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Collection:
+    """Where a collection's PDFs live, where they are indexed and how they are chunked.
+
+    ``index_name`` may reference environment variables (``$VITE_PINECONE_INDEX``),
+    which are expanded when the collection is ingested. ``chunker`` is
+    ``"text"`` (split the joined document, as ``scripts/process_pdf.py``
+    always did), ``"pages"`` (split page by page, as the persona index
+    scripts did) or ``"sections"`` (split within the paper's sections, with
+    ``drop_references`` leaving out the reference list); see
+    ``rag.ingest.CHUNKERS``. ``lexical`` also keeps a local BM25 index of the
+    chunks (``rag.lexical``) for hybrid retrieval. ``dedup`` skips documents
+    that are near-duplicates of one already indexed (a preprint and its
+    published version) and chunks repeating indexed ones (``rag.dedup``).
+
+    Chunk text is always kept in the local ``ChunkStore``; ``metadata_text``
+    also copies it into the vector metadata. The web app reads
+    ``metadata.text`` from Pinecone directly, so only collections it does not
+    query should turn this off.
+
+    ``dimensions`` stores shorter vectors: text-embedding-3 models return
+    them directly, other models are projected with a PCA fitted on the
+    collection (``scripts/evaluate_compression.py --save-pca``). The index
+    must have been created with that dimension, and queries must ask for it
+    too (``Retriever(dimensions=...)``).
+    """
+    name: str
+    source_dir: str
+    index_name: str
+    namespace: Optional[str] = None
+    chunker: str = "pages"
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    model: str = "text-embedding-3-small"
+    max_chunk_chars: Optional[int] = None
+    drop_references: bool = False
+    lexical: bool = True
+    metadata_text: bool = True
+    dedup: bool = True
+    dimensions: Optional[int] = None
+
+    def resolved_index_name(self) -> str:
+        index_name = os.path.expandvars(self.index_name)
+        if not index_name or "$" in index_name:
+            raise ValueError(f"Collection {self.name}: index name {self.index_name} is not set")
+        return index_name
+
+    def resolved_source_dir(self) -> str:
+        return os.path.join(ROOT_DIR, self.source_dir) if not os.path.isabs(self.source_dir) else self.source_dir
+
+    def index_params(self) -> Dict:
+        """Anything that changes the vectors produced for a file; a change forces re-indexing."""
+        params = {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "model": self.model,
+        }
+        # Newer settings are only listed when used, so manifests written before them stay valid
+        if self.chunker == "sections":
+            params["chunker"] = self.chunker
+            params["drop_references"] = self.drop_references
+        if not self.metadata_text:
+            params["metadata_text"] = False
+        if self.dimensions:
+            params["dimensions"] = self.dimensions
+        return params
+
+
+COLLECTIONS: Dict[str, Collection] = {
+    collection.name: collection for collection in [
+        Collection(
+            name="research-papers",
+            source_dir="pdfs",
+            index_name="$VITE_PINECONE_INDEX",
+            namespace="research-papers",
+            chunker="sections",
+            chunk_size=500,
+            chunk_overlap=50,
+            model="text-embedding-ada-002",
+            max_chunk_chars=8000,
+            drop_references=True,
+        ),
+        Collection(
+            name="female-athlete",
+            source_dir="female-athlete-research",
+            index_name="female-athlete-index",
+        ),
+        Collection(
+            name="sleep-research",
+            source_dir="sleep-research",
+            index_name="$VITE_PINECONE_SPORT_SCIENTIST_INDEX",
+            namespace="sleep-research",
+        ),
+    ]
+}
+
+
+def load_collections(path: Optional[str] = None) -> Dict[str, Collection]:
+    """Built-in collections, plus or overridden by those in a JSON file.
+
+    The file holds a list of objects with the ``Collection`` fields.
+    """
+    collections = dict(COLLECTIONS)
+    if path:
+        with open(path) as f:
+            entries = json.load(f)
+        known = {field.name for field in fields(Collection)}
+        for entry in entries:
+            unknown = set(entry) - known
+            if unknown:
+                raise ValueError(f"Unknown collection fields in {path}: {', '.join(sorted(unknown))}")
+            base = asdict(collections[entry["name"]]) if entry.get("name") in collections else {}
+            collection = Collection(**{**base, **entry})
+            collections[collection.name] = collection
+    return collections
+
+
+def select_collections(names: List[str], path: Optional[str] = None) -> List[Collection]:
+    collections = load_collections(path)
+    missing = [name for name in names if name not in collections]
+    if missing:
+        raise ValueError(f"Unknown collections: {', '.join(missing)} "
+                         f"(available: {', '.join(collections)})")
+    return [collections[name] for name in names]
+
+
+def find_collection(index_name: str, namespace: Optional[str] = None,
+                    path: Optional[str] = None, manifest_dir: Optional[str] = None) -> Collection:
+    """The collection indexed into ``index_name``/``namespace``, whose model queries must embed with.
+
+    Collections whose index name is not set in the environment are skipped.
+    Raises ValueError if the target's manifest records files embedded with
+    another model, whose scores against the query would be meaningless.
+    """
+    from rag.manifest import Manifest
+    for collection in load_collections(path).values():
+        try:
+            resolved = collection.resolved_index_name()
+        except ValueError:
+            continue
+        if resolved == index_name and (collection.namespace or None) == (namespace or None):
+            manifest = Manifest.for_target(index_name, namespace, directory=manifest_dir)
+            others = manifest.models() - {collection.model}
+            if others:
+                raise ValueError(f"{index_name}/{namespace or 'default'} holds vectors embedded with "
+                                 f"{', '.join(sorted(others))} besides {collection.model}; "
+                                 f"re-index them with {collection.model}")
+            return collection
+    raise ValueError(f"No collection is indexed into {index_name}/{namespace or 'default'}; "
+                     f"its embedding model is unknown")
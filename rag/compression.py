@@ -0,0 +1,185 @@
+import os
+import re
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+PCA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "pca"
+)
+# Models that return shortened embeddings when asked for `dimensions`
+REDUCIBLE_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+QUANTIZATIONS = ("int8", "binary")
+
+# Set bits in each byte value, for Hamming distances over packed bit vectors
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+def supports_dimensions(model: str) -> bool:
+    return model in REDUCIBLE_MODELS
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """What the API returns for ``dimensions`` on a text-embedding-3 model: the leading values, renormalized."""
+    return normalize(np.asarray(vectors)[..., :dimensions])
+
+
+class PCA:
+    """Projection onto the top principal components of a corpus's embeddings.
+
+    For models that can't shorten their own embeddings (ada-002). Projected
+    vectors are unit-normalized, so cosine scores stay comparable.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)  # (dimensions, input dimensions)
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimensions: int) -> "PCA":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < dimensions:
+            raise ValueError(f"Need at least {dimensions} embeddings to fit {dimensions} components, "
+                             f"got {len(vectors)}")
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dimensions])
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return normalize((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, mean=self.mean, components=self.components)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PCA":
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"])
+
+
+def pca_path(index_name: str, namespace: Optional[str], model: str, dimensions: int,
+             directory: Optional[str] = None) -> str:
+    name = re.sub(r"[^\w.-]", "_", f"{index_name}--{namespace or 'default'}--{model}-{dimensions}")
+    return os.path.join(directory or PCA_DIR, name + ".npz")
+
+
+def load_reducer(index_name: str, namespace: Optional[str], model: str,
+                 dimensions: Optional[int], directory: Optional[str] = None) -> Optional[PCA]:
+    """The PCA that reduces ``model`` embeddings to ``dimensions``, if the model can't do it itself."""
+    if dimensions is None or supports_dimensions(model):
+        return None
+    path = pca_path(index_name, namespace, model, dimensions, directory)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No {dimensions}-dimension PCA for {model} embeddings of {index_name}/{namespace or 'default'}; "
+            f"fit one with scripts/evaluate_compression.py --save-pca {dimensions}"
+        )
+    return PCA.load(path)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 codes with one float32 scale per vector (4x smaller than float32)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=-1) / 127
+    scales = np.where(scales == 0, 1, scales).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[..., None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits packed eight to a byte (32x smaller than float32)."""
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    return (codes.astype(np.float32) @ np.asarray(query, dtype=np.float32)) * scales
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    """Set bits per row of a packed bit matrix."""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        if bits.shape[-1] % 8 == 0 and bits.flags.c_contiguous:
+            bits = bits.view(np.uint64)
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int32)
+    return POPCOUNT[bits].sum(axis=-1, dtype=np.int32)
+
+
+def binary_scores(bits: np.ndarray, query: np.ndarray, dimensions: int) -> np.ndarray:
+    """Cosine estimates from the Hamming distance between sign bits, in [-1, 1]."""
+    distances = _popcount(np.bitwise_xor(bits, quantize_binary(query)))
+    return 1 - 2 * distances.astype(np.float32) / dimensions
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def compression_report(corpus: np.ndarray, queries: np.ndarray, options: Sequence[str],
+                       k: int = 10, pcas: Optional[Dict[int, PCA]] = None) -> Dict[str, Dict]:
+    """Recall@k of each compression option against exact full-precision search.
+
+    ``options`` are ``"float32"``, ``"int8"``, ``"binary"``, ``"truncate-<d>"``
+    (what the API returns for text-embedding-3 models) and ``"pca-<d>"``
+    (fitted on ``corpus`` unless given in ``pcas``). Each entry reports the
+    recall, bytes per stored vector and the time to score every query.
+    """
+    corpus = normalize(corpus)
+    queries = normalize(queries)
+    truth = _top_k(queries @ corpus.T, k)
+    report = {}
+    for option in options:
+        # Queries are scored one at a time, as the local store does
+        started = time.perf_counter()
+        if option == "float32":
+            scores = np.stack([corpus @ query for query in queries])
+            nbytes = corpus.shape[1] * 4
+        elif option == "int8":
+            codes, scales = quantize_int8(corpus)
+            started = time.perf_counter()
+            scores = np.stack([int8_scores(codes, scales, query) for query in queries])
+            nbytes = corpus.shape[1] + 4
+        elif option == "binary":
+            bits = quantize_binary(corpus)
+            started = time.perf_counter()
+            scores = np.stack([binary_scores(bits, query, corpus.shape[1]) for query in queries])
+            nbytes = bits.shape[1]
+        elif option.startswith("truncate-"):
+            dimensions = int(option.split("-", 1)[1])
+            reduced = truncate(corpus, dimensions)
+            started = time.perf_counter()
+            scores = np.stack([reduced @ query for query in truncate(queries, dimensions)])
+            nbytes = dimensions * 4
+        elif option.startswith("pca-"):
+            dimensions = int(option.split("-", 1)[1])
+            pca = (pcas or {}).get(dimensions) or PCA.fit(corpus, dimensions)
+            reduced = pca.transform(corpus)
+            started = time.perf_counter()
+            scores = np.stack([reduced @ query for query in pca.transform(queries)])
+            nbytes = dimensions * 4
+        else:
+            raise ValueError(f"Unknown compression option: {option}")
+        seconds = time.perf_counter() - started
+        found = _top_k(scores, k)
+        recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(truth, found)])
+        report[option] = {
+            f"recall@{k}": round(float(recall), 4),
+            "bytes_per_vector": nbytes,
+            "scan_ms": round(seconds * 1000, 2),
+        }
+    return report
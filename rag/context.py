@@ -0,0 +1,182 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from rag.embeddings import TokenCounter
+from rag.vector_store import QueryMatch
+
+DEFAULT_MAX_TOKENS = 3000
+SEPARATOR = "\n\n"
+SHINGLE_WORDS = 5
+MIN_OVERLAP_CHARS = 20
+MIN_PIECE_TOKENS = 64  # don't bother truncating a piece to fit fewer tokens than this
+
+_CHUNK_ID = re.compile(r"-chunk-(\d+)$")
+
+
+class ContextPiece(NamedTuple):
+    filename: str
+    chunk_indices: List[int]
+    pages: List[int]
+    text: str
+    score: float
+
+
+class Context(NamedTuple):
+    text: str
+    pieces: List[ContextPiece]
+    tokens: int
+    naive_tokens: int  # tokens of every match joined as-is
+    stats: Dict[str, int]
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.naive_tokens - self.tokens
+
+
+def _chunk_index(match: QueryMatch) -> Optional[int]:
+    if match.metadata.get("chunk_index") is not None:
+        return int(match.metadata["chunk_index"])
+    found = _CHUNK_ID.search(match.id)
+    return int(found.group(1)) if found else None
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    # The leftmost candidate start gives the longest overlap
+    start = left.find(probe, max(0, len(left) - len(right)))
+    while start >= 0:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+def _merge_run(matches: List[Tuple[int, QueryMatch]], filename: str) -> ContextPiece:
+    text = ""
+    pages = []
+    for _, match in matches:
+        chunk = match.metadata.get("text", "")
+        overlap = overlap_length(text, chunk)
+        if not text:
+            text = chunk
+        elif overlap:
+            text += chunk[overlap:]
+        else:
+            text += " " + chunk  # adjacent chunks whose overlap was cleaned differently
+        page = match.metadata.get("page")
+        if page is not None and page not in pages:
+            pages.append(page)
+    return ContextPiece(filename, [i for i, _ in matches], pages, text,
+                        max(match.score for _, match in matches))
+
+
+def merge_adjacent(matches: Sequence[QueryMatch]) -> Tuple[List[ContextPiece], int]:
+    """Merge matches that are consecutive chunks of the same file into one piece.
+
+    Returns the pieces and how many matches were merged into another.
+    """
+    by_file: Dict[str, List[Tuple[Optional[int], QueryMatch]]] = {}
+    for match in matches:
+        filename = match.metadata.get("filename") or match.metadata.get("source") or ""
+        by_file.setdefault(filename, []).append((_chunk_index(match), match))
+
+    pieces = []
+    for filename, entries in by_file.items():
+        indexed = sorted({e[0]: e for e in entries if e[0] is not None}.values(), key=lambda e: e[0])
+        run: List[Tuple[int, QueryMatch]] = []
+        for index, match in indexed:
+            if run and index != run[-1][0] + 1:
+                pieces.append(_merge_run(run, filename))
+                run = []
+            run.append((index, match))
+        if run:
+            pieces.append(_merge_run(run, filename))
+        # Without a chunk index there is nothing to merge with
+        pieces.extend(_merge_run([(-1, match)], filename)._replace(chunk_indices=[])
+                      for index, match in entries if index is None)
+    return pieces, len(matches) - len(pieces)
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def drop_near_duplicates(pieces: List[ContextPiece], threshold: float = 0.8) -> Tuple[List[ContextPiece], int]:
+    """Drop pieces mostly contained in a higher-scoring piece (by word 5-gram shingles)."""
+    kept: List[Tuple[ContextPiece, Set]] = []
+    dropped = 0
+    for piece in sorted(pieces, key=lambda p: -p.score):
+        shingles = _shingles(piece.text)
+        if any(len(shingles & other) >= threshold * len(shingles) for _, other in kept):
+            dropped += 1
+            continue
+        kept.append((piece, shingles))
+    return [piece for piece, _ in kept], dropped
+
+
+class ContextBuilder:
+    """Assembles retrieved chunks into a prompt context under a token budget.
+
+    Consecutive chunks of a file are merged with their overlap removed,
+    pieces mostly repeated by a better-scoring piece are dropped, and the
+    rest are packed best score first until ``max_tokens`` (counted with the
+    chat model's tokenizer) is reached; the last piece that does not fit is
+    truncated. The packed pieces are emitted in document order.
+    """
+
+    def __init__(self, model: str = "gpt-4-turbo-preview", max_tokens: int = DEFAULT_MAX_TOKENS,
+                 min_score: float = 0.0, duplicate_threshold: float = 0.8):
+        self.counter = TokenCounter(model)
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+        self.duplicate_threshold = duplicate_threshold
+
+    def build(self, matches: Sequence[QueryMatch]) -> Context:
+        matches = [m for m in matches if m.score > self.min_score and m.metadata.get("text")]
+        naive_tokens = self.counter.count("\n".join(m.metadata["text"] for m in matches))
+
+        pieces, merged = merge_adjacent(matches)
+        pieces, duplicates = drop_near_duplicates(pieces, self.duplicate_threshold)
+
+        packed: List[ContextPiece] = []
+        used = 0
+        truncated = 0
+        separator_tokens = self.counter.count(SEPARATOR)
+        for piece in pieces:  # best score first
+            cost = self.counter.count(piece.text) + (separator_tokens if packed else 0)
+            if used + cost <= self.max_tokens:
+                packed.append(piece)
+                used += cost
+                continue
+            room = self.max_tokens - used - (separator_tokens if packed else 0)
+            if room >= MIN_PIECE_TOKENS:
+                packed.append(piece._replace(text=self.counter.truncate(piece.text, room)))
+                truncated += 1
+            break
+
+        # Rank files by their best piece, and keep each file's pieces in document order
+        file_rank = {}
+        for piece in packed:
+            file_rank.setdefault(piece.filename, len(file_rank))
+        packed.sort(key=lambda p: (file_rank[p.filename], p.chunk_indices[0] if p.chunk_indices else 0))
+
+        text = SEPARATOR.join(piece.text for piece in packed)
+        return Context(
+            text=text,
+            pieces=packed,
+            tokens=self.counter.count(text) if text else 0,
+            naive_tokens=naive_tokens,
+            stats={
+                "matches": len(matches),
+                "merged": merged,
+                "duplicates": duplicates,
+                "truncated": truncated,
+                "dropped": len(pieces) - len(packed),
+            }
+        )
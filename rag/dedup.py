@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from rag.vector_store import vector_store_backend
+
+DEDUP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "dedup"
+)
+
+# Documents: MinHash over word 5-shingles, 32 bands of 4 rows (candidates
+# from ~0.4 Jaccard), confirmed by the estimated Jaccard similarity
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 32
+DOCUMENT_THRESHOLD = 0.7
+# Chunks: 64-bit SimHash over word 3-shingles. A one-word edit of an 80-word
+# chunk moves it ~5 bits, unrelated chunks of one paper stay 13+ bits apart;
+# 6 bands of 10-11 bits find every pair within MAX_CHUNK_DISTANCE bits
+CHUNK_SHINGLE_WORDS = 3
+CHUNK_BANDS = 6
+MAX_CHUNK_DISTANCE = 5
+MIN_CHUNK_WORDS = 20  # shorter chunks (captions, headings) are never collapsed
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK = np.uint64(0xFFFFFFFF)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def dedup_path(index_name: str, namespace: Optional[str] = None,
+               backend: Optional[str] = None, directory: Optional[str] = None) -> str:
+    name = f"{index_name}--{namespace or 'default'}"
+    backend = backend or vector_store_backend()
+    if backend != "pinecone":
+        name = f"{backend}--{name}"
+    return os.path.join(directory or DEDUP_DIR, re.sub(r"[^\w.-]", "_", name) + ".json")
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _shingles(words: Sequence[str], size: int) -> List[str]:
+    return [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of a document's word shingles."""
+    shingles = set(_shingles(_words(text), SHINGLE_WORDS))
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+    # (a * x + b) mod p per permutation; the products wrap in uint64, which
+    # still scatters values well enough for MinHash
+    with np.errstate(over="ignore"):
+        values = ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME) & _MASK
+    return values.min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a chunk's word shingles."""
+    features = _shingles(_words(text), CHUNK_SHINGLE_WORDS)
+    hashes = np.array([int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big")
+                       for f in features], dtype=">u8")
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    return int.from_bytes(np.packbits(bits.sum(axis=0) * 2 > len(features)).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _document_bands(signature: np.ndarray) -> List[Tuple[int, bytes]]:
+    rows = NUM_PERM // BANDS
+    return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+
+_CHUNK_BAND_BOUNDS = [64 * band // CHUNK_BANDS for band in range(CHUNK_BANDS + 1)]
+
+
+def _chunk_bands(value: int) -> List[Tuple[int, int]]:
+    bounds = _CHUNK_BAND_BOUNDS
+    return [(band, (value >> bounds[band]) & ((1 << (bounds[band + 1] - bounds[band])) - 1))
+            for band in range(CHUNK_BANDS)]
+
+
+class DedupIndex:
+    """Signatures of a target's indexed documents and chunks, for near-duplicate lookups.
+
+    Each document keeps its MinHash signature and the SimHash of every chunk
+    it contributed; a duplicate document is kept as an alias of the one it
+    repeats. Banded LSH tables over both are rebuilt in memory on load, so a
+    lookup only compares against candidates sharing a band. Documents also
+    list the ones whose chunks made some of theirs redundant: when those
+    change or go away, ``dependents`` names the documents to check again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.documents: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._document_buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self._chunk_buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self._chunks: Dict[str, Tuple[str, int]] = {}  # chunk ID -> (document, simhash)
+        if os.path.exists(path):
+            with open(path) as f:
+                for filename, entry in json.load(f).get("documents", {}).items():
+                    entry["signature"] = np.array(entry["signature"], dtype=np.uint32)
+                    self._insert(filename, entry)
+
+    @classmethod
+    def for_target(cls, index_name: str, namespace: Optional[str] = None,
+                   backend: Optional[str] = None, directory: Optional[str] = None) -> "DedupIndex":
+        return cls(dedup_path(index_name, namespace, backend, directory))
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.documents
+
+    def _insert(self, filename: str, entry: Dict):
+        self.documents[filename] = entry
+        if entry.get("alias_of"):
+            return
+        for key in _document_bands(entry["signature"]):
+            self._document_buckets.setdefault(key, set()).add(filename)
+        for chunk_id, value in entry["chunks"].items():
+            self._chunks[chunk_id] = (filename, value)
+            for key in _chunk_bands(value):
+                self._chunk_buckets.setdefault(key, set()).add(chunk_id)
+
+    def _remove(self, filename: str) -> Optional[Dict]:
+        entry = self.documents.pop(filename, None)
+        if entry is None or entry.get("alias_of"):
+            return entry
+        for key in _document_bands(entry["signature"]):
+            self._document_buckets.get(key, set()).discard(filename)
+        for chunk_id, value in entry["chunks"].items():
+            self._chunks.pop(chunk_id, None)
+            for key in _chunk_bands(value):
+                self._chunk_buckets.get(key, set()).discard(chunk_id)
+        return entry
+
+    def find_document(self, filename: str, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """The most similar other indexed document at DOCUMENT_THRESHOLD or above, with its similarity."""
+        with self._lock:
+            candidates = set()
+            for key in _document_bands(signature):
+                candidates |= self._document_buckets.get(key, set())
+            candidates.discard(filename)
+            scored = [(similarity(signature, self.documents[c]["signature"]), c) for c in candidates]
+        scored = [item for item in scored if item[0] >= DOCUMENT_THRESHOLD]
+        if not scored:
+            return None
+        score, canonical = max(scored)
+        return canonical, score
+
+    def filter_chunks(self, filename: str, ids: Sequence[str],
+                      texts: Sequence[str]) -> Tuple[Dict[str, int], Dict[str, str]]:
+        """Split a document's chunks into those to index and near-duplicates of indexed ones.
+
+        Returns the SimHash of each chunk to keep, and each dropped chunk's
+        ID mapped to the chunk it repeats (in another document, or earlier
+        in this one).
+        """
+        kept: Dict[str, int] = {}
+        dropped: Dict[str, str] = {}
+        local: Dict[Tuple[int, int], List[str]] = {}
+        for chunk_id, text in zip(ids, texts):
+            value = simhash(text)
+            if len(_words(text)) >= MIN_CHUNK_WORDS:
+                match = self._find_chunk(value, filename)
+                if match is None:
+                    match = next((other for key in _chunk_bands(value) for other in local.get(key, [])
+                                  if hamming(value, kept[other]) <= MAX_CHUNK_DISTANCE), None)
+                if match is not None:
+                    dropped[chunk_id] = match
+                    continue
+            kept[chunk_id] = value
+            for key in _chunk_bands(value):
+                local.setdefault(key, []).append(chunk_id)
+        return kept, dropped
+
+    def _find_chunk(self, value: int, filename: str) -> Optional[str]:
+        with self._lock:
+            for key in _chunk_bands(value):
+                for chunk_id in self._chunk_buckets.get(key, ()):
+                    document, other = self._chunks[chunk_id]
+                    # The document's own previous version is about to be replaced
+                    if document != filename and hamming(value, other) <= MAX_CHUNK_DISTANCE:
+                        return chunk_id
+        return None
+
+    def chunk_document(self, chunk_id: str) -> Optional[str]:
+        entry = self._chunks.get(chunk_id)
+        return entry[0] if entry else None
+
+    def add(self, filename: str, signature: np.ndarray, chunks: Dict[str, int],
+            depends_on: Iterable[str] = ()):
+        """Record a document (replacing an earlier version) with the chunk SimHashes it indexed."""
+        with self._lock:
+            self._remove(filename)
+            self._insert(filename, {"signature": np.asarray(signature, dtype=np.uint32),
+                                    "chunks": dict(chunks),
+                                    "depends_on": sorted(set(depends_on) - {filename})})
+
+    def alias(self, filename: str, signature: np.ndarray, canonical: str, score: float):
+        """Record a document as a duplicate of ``canonical``; it contributes no chunks."""
+        with self._lock:
+            self._remove(filename)
+            self._insert(filename, {"signature": np.asarray(signature, dtype=np.uint32),
+                                    "chunks": {}, "alias_of": canonical, "similarity": round(score, 4),
+                                    "depends_on": [canonical]})
+
+    def aliases(self) -> Dict[str, str]:
+        return {filename: entry["alias_of"] for filename, entry in self.documents.items()
+                if entry.get("alias_of")}
+
+    def dependents(self, filename: str) -> List[str]:
+        """Documents that are duplicates of, or dropped chunks repeating, ``filename``."""
+        return sorted(other for other, entry in self.documents.items()
+                      if filename in entry.get("depends_on", ()))
+
+    def forget(self, filename: str):
+        with self._lock:
+            self._remove(filename)
+
+    def clear(self):
+        with self._lock:
+            self.documents = {}
+            self._document_buckets = {}
+            self._chunk_buckets = {}
+            self._chunks = {}
+
+    def save(self):
+        with self._lock:
+            documents = {filename: {**entry, "signature": entry["signature"].tolist()}
+                         for filename, entry in self.documents.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"documents": documents}, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,300 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.compression import supports_dimensions
+
+DEFAULT_MODEL = "text-embedding-3-small"
+
+# OpenAI embeddings endpoint limits
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_INPUT = 8191
+
+
+class TokenCounter:
+    """Count tokens with tiktoken, falling back to a conservative estimate."""
+
+    def __init__(self, model: str):
+        self._encoder = None
+        try:
+            import tiktoken
+            try:
+                self._encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken missing or its encoding files cannot be downloaded
+            self._encoder = None
+
+    def count(self, text: str) -> int:
+        if self._encoder is not None:
+            return len(self._encoder.encode(text, disallowed_special=()))
+        # English prose averages ~4 characters per token; assume 3 to stay under budget
+        return len(text) // 3 + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._encoder is not None:
+            tokens = self._encoder.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return self._encoder.decode(tokens[:max_tokens])
+        return text[:max_tokens * 3]
+
+
+def pack_batches(token_counts: Sequence[int], max_batch_tokens: int,
+                 max_batch_size: int) -> List[Tuple[int, int]]:
+    """Group consecutive inputs into (start, end) ranges under the token budget."""
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        full = i - start >= max_batch_size or batch_tokens + tokens > max_batch_tokens
+        if i > start and full:
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def _status(exc: Exception) -> Optional[int]:
+    # openai errors carry status_code, pinecone errors carry status
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    return _status(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    if is_rate_limit_error(exc):
+        return True
+    status = _status(exc)
+    if status is not None and status >= 500:
+        return True
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError", "Timeout", "ConnectionError")
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Return the server's Retry-After hint, if the error carries one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    """Concurrency gate that halves on rate limits and grows back on success."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self._active = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._active < self.limit:
+                    self._active += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, rate_limited: bool = False, pause: float = 0.0):
+        with self._cond:
+            self._active -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class EmbeddingEngine:
+    """Embed texts in token-budgeted batches over one reused OpenAI client.
+
+    Batches run concurrently on a bounded thread pool. Rate-limit responses
+    pause every worker for the server's Retry-After (or a jittered backoff)
+    and halve the number of requests in flight until calls succeed again.
+    With an ``EmbeddingCache`` attached only uncached texts are sent.
+
+    ``dimensions`` asks a text-embedding-3 model for shortened embeddings;
+    they are cached apart from the full-size ones. With a ``Metrics``, the
+    counts in ``stats`` and each request's latency are recorded there too.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, api_key: Optional[str] = None,
+                 client=None, max_batch_tokens: int = 100_000, max_batch_size: int = 512,
+                 max_concurrency: int = 4, max_retries: int = 6, cache=None,
+                 dimensions: Optional[int] = None, metrics=None):
+        if dimensions is not None and not supports_dimensions(model):
+            raise ValueError(f"{model} does not support reduced dimensions")
+        self.model = model
+        self.dimensions = dimensions
+        self.cache_key = model if dimensions is None else f"{model}@{dimensions}"
+        self._client = client
+        self._api_key = api_key
+        self._client_lock = threading.Lock()
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = min(max_batch_size, MAX_INPUTS_PER_REQUEST)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.metrics = metrics
+        self.tokens = TokenCounter(model)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="embed")
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "inputs": 0,
+            "tokens": 0,
+            "retries": 0,
+            "rate_limited": 0,
+        }
+
+    @property
+    def client(self):
+        # Created on the first uncached request: importing openai is slow,
+        # and a run served from the cache never needs it
+        with self._client_lock:
+            if self._client is None:
+                import openai
+                self._client = openai.OpenAI(
+                    api_key=self._api_key or os.getenv("VITE_OPENAI_API_KEY"),
+                    max_retries=0  # retries are handled here, with backoff shared across workers
+                )
+            return self._client
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+        if self.metrics is not None:
+            self.metrics.count(f"embed_{key}", amount, model=self.cache_key)
+
+    def _prepare(self, texts: Sequence[str]) -> Tuple[List[str], List[int]]:
+        prepared = []
+        counts = []
+        for text in texts:
+            # The API rejects empty strings
+            text = text or " "
+            tokens = self.tokens.count(text)
+            if tokens > MAX_TOKENS_PER_INPUT:
+                text = self.tokens.truncate(text, MAX_TOKENS_PER_INPUT)
+                tokens = MAX_TOKENS_PER_INPUT
+            prepared.append(text)
+            counts.append(tokens)
+        return prepared, counts
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> np.ndarray:
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+                response = self.client.embeddings.create(model=self.model, input=texts, **kwargs)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    self.limiter.release()
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                self.limiter.release(rate_limited=rate_limited, pause=delay)
+                self._count("retries")
+                if rate_limited:
+                    self._count("rate_limited")
+                else:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.release()
+            if self.metrics is not None:
+                self.metrics.observe("embed_request", time.perf_counter() - started, model=self.cache_key)
+            self._count("requests")
+            self._count("inputs", len(texts))
+            self._count("tokens", tokens)
+            data = sorted(response.data, key=lambda item: item.index)
+            return np.array([item.embedding for item in data], dtype=np.float32)
+
+    def _embed_uncached(self, texts: Sequence[str]) -> np.ndarray:
+        prepared, counts = self._prepare(texts)
+        batches = pack_batches(counts, self.max_batch_tokens, self.max_batch_size)
+        futures = [
+            self._pool.submit(self._embed_batch, prepared[start:end], sum(counts[start:end]))
+            for start, end in batches
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into a (len(texts), dim) float32 matrix. Cached texts are not re-sent."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._embed_uncached(texts)
+        cached = self.cache.get_many(self.cache_key, texts)
+        missing: Dict[str, List[int]] = {}
+        for i, (text, embedding) in enumerate(zip(texts, cached)):
+            if embedding is None:
+                missing.setdefault(text, []).append(i)
+        fresh = None
+        if missing:
+            pending = list(missing)
+            fresh = self._embed_uncached(pending)
+            self.cache.put_many(self.cache_key, pending, fresh)
+        dim = fresh.shape[1] if fresh is not None else len(cached[0])
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        for i, embedding in enumerate(cached):
+            if embedding is not None:
+                embeddings[i] = embedding
+        if fresh is not None:
+            for row, text in enumerate(missing):
+                embeddings[missing[text]] = fresh[row]
+        return embeddings
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed texts as lists of floats (LangChain's Embeddings interface)."""
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from rag.metrics import Histogram
+from rag.vector_store import QueryMatch
+
+DEFAULT_KS = (1, 3, 5, 10, 20)
+
+
+class EvalQuestion(NamedTuple):
+    question: str
+    expected: List[Dict]  # each {"id": chunk ID} or {"filename": ..., "page": optional}
+    filter: Optional[Dict] = None
+
+
+def load_questions(path: str) -> List[EvalQuestion]:
+    """Questions from a JSON lines file, or a text file with one question per line.
+
+    A JSON line is ``{"question": ..., "expected": [...], "filter": {...}}``;
+    ``expected`` lists chunk IDs, or ``{"filename": ..., "page": ...}``
+    objects, which still match after the collection is re-chunked.
+    """
+    questions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("{"):
+                questions.append(EvalQuestion(line, []))
+                continue
+            record = json.loads(line)
+            expected = [{"id": item} if isinstance(item, str) else item
+                        for item in record.get("expected", [])]
+            questions.append(EvalQuestion(record["question"], expected, record.get("filter")))
+    return questions
+
+
+def is_relevant(expected: Dict, match: QueryMatch) -> bool:
+    if "id" in expected:
+        return match.id == expected["id"]
+    filename = match.metadata.get("filename") or match.metadata.get("source")
+    if filename != expected.get("filename"):
+        return False
+    return expected.get("page") is None or match.metadata.get("page") == expected["page"]
+
+
+def expected_ranks(expected: Sequence[Dict], matches: Sequence[QueryMatch]) -> List[Optional[int]]:
+    """1-based rank of the first match of each expected item; None if it was not retrieved."""
+    ranks = []
+    for item in expected:
+        ranks.append(next((rank for rank, match in enumerate(matches, start=1)
+                           if is_relevant(item, match)), None))
+    return ranks
+
+
+def evaluate(retriever, questions: Sequence[EvalQuestion], ks: Sequence[int] = DEFAULT_KS,
+             concurrency: int = 8, generate: bool = False, generate_concurrency: int = 4,
+             details: Optional[List[Dict]] = None) -> Dict:
+    """Run a question set through a ``Retriever`` and measure retrieval quality and latency.
+
+    All questions are embedded up front in one ``embed_many`` call, which
+    the retriever's engine batches and parallelizes. Queries then run on
+    ``concurrency`` threads; with ``generate``, each also gets its context
+    built and answered, with at most ``generate_concurrency`` chat requests
+    in flight. Recall@k and MRR cover the questions with ``expected`` items.
+    Per-question results are appended to ``details`` when given.
+    """
+    # Exact percentiles: a question set is small enough to keep every latency
+    histograms = {stage: Histogram(keep_values=True) for stage in ("query", "context", "generate", "question")}
+    histogram_lock = threading.Lock()
+    chat_slots = threading.Semaphore(generate_concurrency)
+    started = time.perf_counter()
+
+    vectors = retriever.embed_many([q.question for q in questions])
+    embed_seconds = time.perf_counter() - started
+
+    def observe(stage: str, seconds: float):
+        with histogram_lock:
+            histograms[stage].observe(seconds)
+
+    def run(question: EvalQuestion, vector) -> Dict:
+        question_started = time.perf_counter()
+        matches = retriever.retrieve(question.question, question.filter, vector)
+        observe("query", time.perf_counter() - question_started)
+        result = {
+            "question": question.question,
+            "matches": [match.id for match in matches],
+            "ranks": expected_ranks(question.expected, matches),
+        }
+        if generate:
+            mark = time.perf_counter()
+            context = retriever.build_context(matches)
+            observe("context", time.perf_counter() - mark)
+            result["context_tokens"] = context.tokens
+            if context.text:
+                with chat_slots:
+                    mark = time.perf_counter()
+                    result["answer"] = retriever.generate(question.question, context.text)
+                    observe("generate", time.perf_counter() - mark)
+        observe("question", time.perf_counter() - question_started)
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="evaluate") as pool:
+        results = list(pool.map(run, questions, vectors))
+    seconds = time.perf_counter() - started
+
+    judged = [r for q, r in zip(questions, results) if q.expected]
+    recall = {}
+    for k in ks:
+        if judged:
+            recall[k] = round(float(np.mean([
+                np.mean([rank is not None and rank <= k for rank in r["ranks"]]) for r in judged
+            ])), 4)
+    reciprocal_ranks = [1 / min(found) if found else 0.0
+                        for found in ([rank for rank in r["ranks"] if rank is not None] for r in judged)]
+    if details is not None:
+        details.extend(results)
+    return {
+        "questions": len(questions),
+        "judged": len(judged),
+        "depth": max((len(r["matches"]) for r in results), default=0),
+        "recall_at_k": recall,
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if judged else None,
+        "embed_seconds": round(embed_seconds, 3),
+        "seconds": round(seconds, 3),
+        "questions_per_s": round(len(questions) / seconds, 2) if seconds else None,
+        "latency": {stage: {**h.summary(), "buckets": h.buckets()} for stage, h in histograms.items() if h.count},
+    }
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"{report['questions']} questions ({report['judged']} with expected sources) in "
+             f"{report['seconds']}s: {report['questions_per_s']} questions/s, "
+             f"embedding took {report['embed_seconds']}s"]
+    if report["judged"]:
+        recall = ", ".join(f"@{k} {value}" for k, value in report["recall_at_k"].items())
+        lines.append(f"Recall {recall}; MRR {report['mrr']} (depth {report['depth']})")
+    for stage, latency in report["latency"].items():
+        lines.append(f"{stage}: p50 {latency['p50_ms']} ms, p90 {latency['p90_ms']} ms, "
+                     f"p99 {latency['p99_ms']} ms, max {latency['max_ms']} ms")
+        lines.append("  " + "  ".join(f"{label}: {count}" for label, count in latency["buckets"].items()))
+    return "\n".join(lines)
@@ -0,0 +1,300 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+PAGES_PER_TASK = 8
+
+# A page with less extracted text than this, or mostly symbols, is probably
+# scanned (or uses a font PyPDF2 can't map) and goes to the fallbacks
+MIN_PAGE_CHARS = 100
+MIN_WORD_CHAR_RATIO = 0.6
+OCR_DPI = 300
+OCR_LANGUAGE = "eng"
+
+
+class Page(NamedTuple):
+    source: str  # path of the PDF
+    page: int  # 0-based, matching PyPDFLoader's "page" metadata
+    text: str
+    method: str = "text"  # "text", or the fallback that produced it ("pdfium", "ocr")
+    failed_fallbacks: Tuple[str, ...] = ()  # fallbacks that raised on this page
+
+
+def _word_chars(text: str) -> int:
+    return sum(1 for c in text if c.isalnum())
+
+
+def page_quality(text: str) -> Optional[str]:
+    """Why a page's extracted text looks unusable ("empty", "sparse", "garbled"); None if it looks fine."""
+    visible = len(text) - sum(1 for c in text if c.isspace())
+    if visible == 0:
+        return "empty"
+    if visible < MIN_PAGE_CHARS:
+        return "sparse"
+    # Unmapped glyphs come out as (cid:NN), replacement characters or symbol soup
+    if "(cid:" in text or _word_chars(text) < visible * MIN_WORD_CHAR_RATIO:
+        return "garbled"
+    return None
+
+
+def count_pdf_pages(path: str) -> int:
+    import PyPDF2
+    with open(path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """Extract the text and extraction time of pages [start, end). Runs in a worker process.
+
+    A page PyPDF2 fails on comes back empty, for the fallbacks to retry.
+    """
+    import PyPDF2
+    pages = []
+    with open(path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for i in range(start, end):
+            started = time.perf_counter()
+            try:
+                text = reader.pages[i].extract_text() or ''
+            except Exception:
+                text = ''
+            pages.append((i, text, time.perf_counter() - started))
+    return pages
+
+
+def _pdfium_text(path: str, page: int) -> str:
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        return pdf[page].get_textpage().get_text_range()
+    finally:
+        pdf.close()
+
+
+def _ocr_text(path: str, page: int) -> str:
+    import pypdfium2
+    import pytesseract
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        image = pdf[page].render(scale=OCR_DPI / 72).to_pil()
+    finally:
+        pdf.close()
+    try:
+        return pytesseract.image_to_string(image, lang=OCR_LANGUAGE)
+    except pytesseract.TesseractNotFoundError as e:
+        raise ImportError(str(e)) from e  # as good as not installed
+
+
+# Tried in order until a page reads well; each needs optional packages
+# (pypdfium2, and pytesseract with the tesseract binary for OCR; see requirements.txt)
+FALLBACKS: Sequence[Tuple[str, Callable[[str, int], str]]] = (
+    ("pdfium", _pdfium_text),
+    ("ocr", _ocr_text),
+)
+
+
+class FallbackResult(NamedTuple):
+    text: str
+    method: str
+    seconds: float
+    missing: Tuple[Tuple[str, str], ...]  # (fallback, why) for those not installed
+    failed: Tuple[str, ...]  # fallbacks that raised on this page
+
+
+_reported_missing = set()
+
+
+def _report_missing(missing: Iterable[Tuple[str, str]]):
+    """Say once per process that a fallback can't run, rather than once per page."""
+    for name, why in missing:
+        if name not in _reported_missing:
+            _reported_missing.add(name)
+            print(f"The {name} fallback for low-quality pages is unavailable ({why}); "
+                  f"see the optional dependencies in requirements.txt")
+
+
+def extract_page_fallback(path: str, page: int, text: str) -> FallbackResult:
+    """Re-extract a low-quality page with the ``FALLBACKS``. Runs in a worker process.
+
+    Keeps whichever candidate has the most letters and digits, so a page
+    no fallback improves (or none is installed) keeps its original text.
+    Fallbacks that aren't installed and those that raised are reported
+    back, for the caller to log and count.
+    """
+    started = time.perf_counter()
+    best, method = text, "text"
+    missing, failed = [], []
+    for name, extract in FALLBACKS:
+        try:
+            candidate = extract(path, page)
+        except ImportError as e:
+            missing.append((name, str(e)))
+            continue
+        except Exception:
+            failed.append(name)  # this page defeats it
+            continue
+        if _word_chars(candidate) > _word_chars(best):
+            best, method = candidate, name
+        if page_quality(best) is None:
+            break
+    return FallbackResult(best, method, time.perf_counter() - started, tuple(missing), tuple(failed))
+
+
+def _submit_range(pool: Executor, fallback_pool: Executor, path: str,
+                  start: int, end: int) -> Future:
+    """Future of a page range as (page, text, method, seconds, fallback result) rows.
+
+    Low-quality pages are sent to ``fallback_pool`` as soon as their range
+    is extracted, so slow OCR runs beside the text extraction of later
+    ranges and files instead of holding up ``pool``.
+    """
+    combined: Future = Future()
+    lock = threading.Lock()
+
+    def extracted(future: Future):
+        try:
+            rows = [[i, text, "text", seconds, None] for i, text, seconds in future.result()]
+        except Exception as e:
+            combined.set_exception(e)
+            return
+        poor = [row for row in rows if page_quality(row[1]) is not None]
+        remaining = [len(poor)]
+
+        def fell_back(row, fallback: Future):
+            try:
+                row[4] = fallback.result()
+                row[1], row[2] = row[4].text, row[4].method
+            except Exception:
+                pass  # keep the text we have
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            combined.set_result([tuple(row) for row in rows])
+
+        if not poor:
+            combined.set_result([tuple(row) for row in rows])
+        for row in poor:
+            try:
+                fallback = fallback_pool.submit(extract_page_fallback, path, row[0], row[1])
+            except RuntimeError:  # the pool is shutting down
+                fallback = Future()
+                fallback.set_exception(RuntimeError("fallback pool shut down"))
+            fallback.add_done_callback(lambda f, row=row: fell_back(row, f))
+
+    pool.submit(extract_page_range, path, start, end).add_done_callback(extracted)
+    return combined
+
+
+def _iter_page_futures(pool: Executor, fallback_pool: Executor, paths: Sequence[str],
+                       pages_per_task: int, prefetch: int):
+    """Yield (path, range futures, error) in input order, keeping `prefetch` files queued."""
+    counts = iter([(path, pool.submit(count_pdf_pages, path)) for path in paths])
+    queue = deque()
+
+    def fill():
+        while len(queue) < prefetch:
+            try:
+                path, count = next(counts)
+            except StopIteration:
+                return
+            try:
+                n = count.result()
+                futures = [
+                    _submit_range(pool, fallback_pool, path, start, min(start + pages_per_task, n))
+                    for start in range(0, n, pages_per_task)
+                ]
+                queue.append((path, futures, None))
+            except Exception as e:
+                queue.append((path, [], e))
+
+    fill()
+    while queue:
+        item = queue.popleft()
+        fill()
+        yield item
+
+
+def iter_pdf_documents(paths: Iterable[str], max_workers: Optional[int] = None,
+                       pages_per_task: int = PAGES_PER_TASK,
+                       on_error: Optional[Callable[[str, Exception], None]] = None,
+                       pool: Optional[Executor] = None, fallback_pool: Optional[Executor] = None,
+                       observe: Optional[Callable[[str, float], None]] = None
+                       ) -> Iterator[Tuple[str, List[Page]]]:
+    """Extract PDFs on a process pool, yielding (path, pages) in input order.
+
+    Pages of every file are split into ranges and parsed in parallel, and
+    files ahead of the consumer keep being extracted while it works. Empty,
+    sparse or garbled pages (see ``page_quality``) are re-extracted with the
+    ``FALLBACKS`` on ``fallback_pool``. A file that fails to parse is passed
+    to ``on_error`` and skipped; without a callback the error is raised.
+
+    ``observe(stage, seconds)`` is called with each page's extraction time
+    (``page``) and, for pages sent to the fallbacks, their time (``page_fallback``).
+    Fallbacks that raised on a page are listed in its ``failed_fallbacks``;
+    one that isn't installed is reported once.
+    Pools passed in are shared with other callers and left running.
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    owns_pool = pool is None
+    if owns_pool:
+        pool = ProcessPoolExecutor(max_workers=max_workers)
+    owns_fallback_pool = fallback_pool is None
+    if owns_fallback_pool:
+        # Worker processes only start once a page needs a fallback
+        fallback_pool = ProcessPoolExecutor(max_workers=max(1, max_workers // 2))
+    try:
+        for path, futures, error in _iter_page_futures(pool, fallback_pool, paths, pages_per_task,
+                                                       prefetch=max_workers * 2):
+            pages = []
+            try:
+                if error is not None:
+                    raise error
+                for future in futures:
+                    for i, text, method, seconds, fallback in future.result():
+                        if fallback is not None:
+                            _report_missing(fallback.missing)
+                        pages.append(Page(path, i, text, method, fallback.failed if fallback else ()))
+                        if observe is not None:
+                            observe("page", seconds)
+                            if fallback is not None:
+                                observe("page_fallback", fallback.seconds)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(path, e)
+                continue
+            yield path, pages
+    finally:
+        if owns_pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if owns_fallback_pool:
+            fallback_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_pdf_pages(paths: Iterable[str], **kwargs) -> Iterator[Page]:
+    """Like iter_pdf_documents, but yields one page at a time."""
+    for _, pages in iter_pdf_documents(paths, **kwargs):
+        yield from pages
+
+
+def join_pages(pages: Sequence[Page], separator: str = '\n') -> Tuple[str, List[int]]:
+    """Join page texts, returning the text and the offset each page starts at."""
+    starts = []
+    offset = 0
+    for page in pages:
+        starts.append(offset)
+        offset += len(page.text) + len(separator)
+    return separator.join(page.text for page in pages), starts
+
+
+def page_at(pages: Sequence[Page], starts: Sequence[int], offset: int) -> int:
+    """Page number containing a character offset of the joined text."""
+    return pages[max(0, bisect.bisect_right(starts, offset) - 1)].page
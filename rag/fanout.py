@@ -0,0 +1,141 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from rag.context import Context, ContextBuilder
+from rag.lexical import RRF_K
+from rag.retrieval import Retriever
+from rag.vector_store import QueryMatch
+
+DEFAULT_DEADLINE = 3.0  # seconds for embedding and every target's query
+FUSIONS = ("score", "rrf")
+
+
+class Target(NamedTuple):
+    name: str  # tagged onto each match's metadata as "collection"
+    retriever: Retriever
+    weight: float = 1.0
+
+
+class FanoutResult(NamedTuple):
+    matches: List[QueryMatch]
+    seconds: Dict[str, float]  # per target that answered, from the start of the request
+    timed_out: List[str]  # targets that missed the deadline; their matches are left out
+    errors: Dict[str, str]  # targets whose embedding or query failed
+
+
+def normalize_scores(matches: Sequence[QueryMatch]) -> List[float]:
+    """Min-max scale one target's scores to [0, 1], so cosine and RRF scores can be mixed."""
+    if not matches:
+        return []
+    scores = np.array([match.score for match in matches], dtype=np.float64)
+    spread = scores.max() - scores.min()
+    if spread == 0:
+        return [1.0] * len(matches)
+    return ((scores - scores.min()) / spread).tolist()
+
+
+def fuse(rankings: Dict[str, Sequence[QueryMatch]], weights: Dict[str, float], top_k: int,
+         fusion: str = "score") -> List[QueryMatch]:
+    """Merge per-target rankings into one list, tagging each match with its target.
+
+    ``"score"`` weights each target's min-max normalized scores;
+    ``"rrf"`` sums ``weight / (k + rank)``, ignoring the scores. The same
+    vector ID in two targets is two different chunks, so nothing is merged.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"Unknown fusion {fusion}; expected one of {', '.join(FUSIONS)}")
+    fused = []
+    for name, matches in rankings.items():
+        weight = weights.get(name, 1.0)
+        if fusion == "score":
+            scores = [weight * score for score in normalize_scores(matches)]
+        else:
+            scores = [weight / (RRF_K + rank) for rank in range(1, len(matches) + 1)]
+        for match, score in zip(matches, scores):
+            fused.append(QueryMatch(match.id, score, {**match.metadata, "collection": name}))
+    fused.sort(key=lambda match: -match.score)
+    return fused[:top_k]
+
+
+class FanoutRetriever:
+    """Runs one question against several collections' retrievers at once.
+
+    The question is embedded once per distinct embedding setup (model,
+    dimensions, PCA) among the targets, and every target is queried on its
+    own thread as soon as its embedding is ready, so a cross-collection
+    question takes about as long as the slowest target instead of the sum
+    of all of them. Each target's retriever does its own lexical fusion and
+    text hydration.
+
+    Whatever has not answered by the deadline is left out and reported in
+    ``timed_out``; its request keeps running on the pool and its result is
+    dropped. The retrievers stay owned by the caller.
+    """
+
+    def __init__(self, targets: Sequence[Target], top_k: int = 10, fusion: str = "score",
+                 deadline: float = DEFAULT_DEADLINE, max_workers: Optional[int] = None,
+                 max_context_tokens: Optional[int] = None):
+        if fusion not in FUSIONS:
+            raise ValueError(f"Unknown fusion {fusion}; expected one of {', '.join(FUSIONS)}")
+        self.targets = list(targets)
+        self.top_k = top_k
+        self.fusion = fusion
+        self.deadline = deadline
+        first = self.targets[0].retriever
+        self.context_builder = (ContextBuilder(first.chat_model, max_tokens=max_context_tokens)
+                                if max_context_tokens else first.context_builder)
+        # Embeddings and queries of a request, plus requests left over from missed deadlines
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 4 * len(self.targets),
+                                        thread_name_prefix="fanout")
+
+    @staticmethod
+    def _embedding_key(retriever: Retriever):
+        return retriever.engine.cache_key, id(retriever.reducer)
+
+    def retrieve(self, query: str, filter: Optional[Dict] = None,
+                 deadline: Optional[float] = None) -> FanoutResult:
+        started = time.perf_counter()
+        deadline = self.deadline if deadline is None else deadline
+        embeddings: Dict[tuple, Future] = {}
+        for target in self.targets:
+            key = self._embedding_key(target.retriever)
+            if key not in embeddings:
+                embeddings[key] = self._pool.submit(target.retriever.embed, query)
+
+        def run(target: Target):
+            vector = embeddings[self._embedding_key(target.retriever)].result()
+            matches = target.retriever.retrieve(query, filter, vector)
+            return matches, time.perf_counter() - started
+
+        futures = {target.name: self._pool.submit(run, target) for target in self.targets}
+        wait(futures.values(), timeout=max(0.0, deadline - (time.perf_counter() - started)))
+
+        rankings: Dict[str, List[QueryMatch]] = {}
+        seconds: Dict[str, float] = {}
+        timed_out: List[str] = []
+        errors: Dict[str, str] = {}
+        for name, future in futures.items():
+            if not future.done():
+                timed_out.append(name)
+                continue
+            try:
+                rankings[name], seconds[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+        weights = {target.name: target.weight for target in self.targets}
+        return FanoutResult(fuse(rankings, weights, self.top_k, self.fusion), seconds, timed_out, errors)
+
+    def build_context(self, matches: List[QueryMatch]) -> Context:
+        return self.context_builder.build(matches)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
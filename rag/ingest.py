@@ -0,0 +1,614 @@
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+
+from rag.answer_cache import DEFAULT_ANSWER_CACHE_PATH, invalidate_answers
+from rag.checkpoint import Checkpoint
+from rag.chunk_store import ChunkStore, chunk_scope
+from rag.collections import Collection
+from rag.compression import load_reducer, supports_dimensions
+from rag.dedup import DedupIndex, minhash
+from rag.embedding_cache import EmbeddingCache
+from rag.embeddings import EmbeddingEngine
+from rag.extraction import Page, iter_pdf_documents, join_pages, page_at, page_quality
+from rag.lexical import LexicalIndex
+from rag.manifest import Manifest, delete_vector_ids, file_sha256, make_vector_id
+from rag.metrics import Metrics, Progress
+from rag.pipeline import Chunk, FileDone, run_ingest
+from rag.sections import REFERENCES, split_sections
+from rag.upsert import Upserter, dead_letter_path, replay_dead_letters
+from rag.vector_store import VectorStore, open_vector_store
+
+
+def _splitter(collection: Collection, **kwargs):
+    # langchain takes longer to import than everything else here; only chunking needs it
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=collection.chunk_size,
+        chunk_overlap=collection.chunk_overlap,
+        length_function=len,
+        **kwargs
+    )
+
+
+def chunk_text(pdf_path: str, pages: List[Page], collection: Collection) -> Iterator[Chunk]:
+    """Split the joined document into cleaned chunks, keeping the page each starts on."""
+    text, page_starts = join_pages(pages)
+    if not text.strip():
+        raise ValueError(f"No text content found in PDF: {pdf_path}")
+
+    filename = os.path.basename(pdf_path)
+    splitter = _splitter(collection, add_start_index=True)
+    for i, doc in enumerate(splitter.create_documents([text])):
+        clean_text = ' '.join(doc.page_content.split())
+        if collection.max_chunk_chars:
+            clean_text = clean_text[:collection.max_chunk_chars]
+        yield Chunk(
+            id=make_vector_id(filename, i),
+            text=clean_text,
+            source=pdf_path,
+            metadata={
+                'source': filename,
+                'filename': filename,
+                'page': page_at(pages, page_starts, doc.metadata['start_index']),
+                'chunk_index': i
+            }
+        )
+
+
+def chunk_pages(pdf_path: str, pages: List[Page], collection: Collection) -> Iterator[Chunk]:
+    """Split each page on its own, so no chunk spans two pages."""
+    filename = os.path.basename(pdf_path)
+    splitter = _splitter(collection)
+    i = 0
+    for page in pages:
+        for text in splitter.split_text(page.text):
+            if collection.max_chunk_chars:
+                text = text[:collection.max_chunk_chars]
+            yield Chunk(
+                id=make_vector_id(filename, i),
+                text=text,
+                source=pdf_path,
+                metadata={'source': filename, 'page': page.page}
+            )
+            i += 1
+
+
+def chunk_sections(pdf_path: str, pages: List[Page], collection: Collection) -> Iterator[Chunk]:
+    """Split each section of the document on its own, tagging chunks with section and page range.
+
+    Chunks never span a section heading, but do run across page breaks
+    within a section. With ``drop_references`` the reference list is not
+    indexed at all.
+    """
+    filename = os.path.basename(pdf_path)
+    splitter = _splitter(collection, add_start_index=True)
+    sections = split_sections(pages)
+    if not any(page.text.strip() for section in sections for page in section.pages):
+        raise ValueError(f"No text content found in PDF: {pdf_path}")
+
+    i = 0
+    for section in sections:
+        if collection.drop_references and section.name == REFERENCES:
+            continue
+        text, page_starts = join_pages(section.pages)
+        for doc in splitter.create_documents([text]):
+            start = doc.metadata['start_index']
+            clean_text = ' '.join(doc.page_content.split())
+            if collection.max_chunk_chars:
+                clean_text = clean_text[:collection.max_chunk_chars]
+            yield Chunk(
+                id=make_vector_id(filename, i),
+                text=clean_text,
+                source=pdf_path,
+                metadata={
+                    'source': filename,
+                    'filename': filename,
+                    'page': page_at(section.pages, page_starts, start),
+                    'page_end': page_at(section.pages, page_starts, start + len(doc.page_content) - 1),
+                    'section': section.name,
+                    'chunk_index': i
+                }
+            )
+            i += 1
+
+
+CHUNKERS: Dict[str, Callable[[str, List[Page], Collection], Iterator[Chunk]]] = {
+    "text": chunk_text,
+    "pages": chunk_pages,
+    "sections": chunk_sections,
+}
+
+
+def summarize_file(pdf_path: str, vector_ids: List[str], failed: int, store: VectorStore,
+                   namespace: Optional[str] = None, params: Optional[Dict] = None,
+                   manifest: Optional[Manifest] = None, sha256: Optional[str] = None,
+                   abandoned_ids: Iterable[str] = (), extra: Optional[Dict] = None) -> Dict:
+    """Build a file's summary and, if it fully uploaded, record it in the manifest.
+
+    ``abandoned_ids`` were upserted by an unfinished run over an earlier
+    version of the file; those no longer produced are deleted with the stale ones.
+    """
+    summary = {
+        'filename': os.path.basename(pdf_path),
+        'processed_chunks': len(vector_ids),
+        'failed_chunks': failed,
+        'total_chunks': len(vector_ids) + failed,
+        **(extra or {})
+    }
+
+    # Only record complete uploads so a partial file is retried next run
+    if manifest is not None and failed == 0:
+        stale_ids = manifest.record(pdf_path, params, vector_ids, sha256=sha256)
+        stale_ids = sorted(set(stale_ids) | (set(abandoned_ids) - set(vector_ids)))
+        summary['stale_deleted'] = delete_vector_ids(store, stale_ids, namespace)
+        store.flush()
+        manifest.save()
+    return summary
+
+
+class Ingester:
+    """Ingests collections with embedding, upsert and extraction pools shared between them.
+
+    Collections using the same embedding model share one ``EmbeddingEngine``,
+    so its adaptive limiter paces them against a single rate limit. Upserts
+    of every collection run on one thread pool, and PDFs are parsed on one
+    process pool, with scanned or garbled pages re-extracted (OCR'd, if
+    available) on a second one. ``ingest_all`` runs collections
+    concurrently, so a slow extraction in one keeps the API quotas busy
+    with another.
+
+    Chunk text goes into the shared ``ChunkStore`` as files are chunked, so
+    it is there before any of their vectors can be returned by a query.
+    Each settled upsert batch is journaled in the target's ``Checkpoint``,
+    so an interrupted run resumes from the last batch it committed. With a
+    store that only persists on flush (the local one) batches are journaled
+    after a flush, at the end of each file and every ``flush_interval``
+    seconds, so nothing is journaled before it is on disk.
+    Near-duplicate documents and chunks are dropped before they are
+    embedded, against the target's ``DedupIndex``.
+
+    ``embedding_client`` and ``open_store`` replace the OpenAI client and
+    ``open_vector_store`` (the benchmark passes local stand-ins), and the
+    ``*_dir`` and ``answer_cache_path`` arguments move the ingester's state
+    out of ``.cache``.
+
+    Timings and counts go into ``metrics``: the time spent waiting for each
+    extracted file (``extract``), chunking it (``chunk``) and extracting each
+    page (``page``, ``page_fallback``), every embedding and upsert request
+    with its retries, rate limits and tokens, and each run's files and
+    chunks. ``observe(stage, seconds)`` is also called with the stage
+    timings. Progress is printed at most every ``progress_interval`` seconds.
+    """
+
+    def __init__(self, openai_key: Optional[str] = None, pinecone_key: Optional[str] = None,
+                 cache: Optional[EmbeddingCache] = None, max_embed_concurrency: int = 4,
+                 max_inflight_upserts: int = 8, extraction_workers: Optional[int] = None,
+                 fallback_workers: Optional[int] = None,
+                 upsert_batch_size: int = 100, use_cache: bool = True, embedding_client=None,
+                 open_store: Optional[Callable[[str], VectorStore]] = None,
+                 observe: Optional[Callable[[str, float], None]] = None,
+                 manifest_dir: Optional[str] = None, lexical_dir: Optional[str] = None,
+                 chunk_store: Optional[ChunkStore] = None, checkpoint_dir: Optional[str] = None,
+                 dedup_dir: Optional[str] = None, metrics: Optional[Metrics] = None,
+                 progress_interval: float = 10.0, answer_cache_path: Optional[str] = None,
+                 dead_letter_dir: Optional[str] = None, flush_interval: float = 30.0):
+        self.openai_key = openai_key
+        self.pinecone_key = pinecone_key
+        self.cache = (cache if cache is not None else EmbeddingCache()) if use_cache else None
+        self.embedding_client = embedding_client
+        self.open_store = open_store or (lambda index_name: open_vector_store(index_name, api_key=pinecone_key))
+        self._observe = observe
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.progress_interval = progress_interval
+        self.flush_interval = flush_interval
+        self.manifest_dir = manifest_dir
+        self.lexical_dir = lexical_dir
+        self.checkpoint_dir = checkpoint_dir
+        self.dedup_dir = dedup_dir
+        self.dead_letter_dir = dead_letter_dir
+        self.answer_cache_path = answer_cache_path or DEFAULT_ANSWER_CACHE_PATH
+        self._owns_chunk_store = chunk_store is None
+        self.chunk_store = chunk_store or ChunkStore()
+        self.max_embed_concurrency = max_embed_concurrency
+        self.max_inflight_upserts = max_inflight_upserts
+        self.upsert_batch_size = upsert_batch_size
+        self._engines: Dict[str, EmbeddingEngine] = {}
+        self._lock = threading.Lock()
+        self._upsert_pool = ThreadPoolExecutor(max_workers=max_inflight_upserts,
+                                               thread_name_prefix="upsert")
+        self._extraction_pool = ProcessPoolExecutor(max_workers=extraction_workers or os.cpu_count() or 1)
+        # OCR is slow; its own pool keeps it from holding up text extraction
+        self._fallback_pool = ProcessPoolExecutor(
+            max_workers=fallback_workers or max(1, (extraction_workers or os.cpu_count() or 1) // 2)
+        )
+
+    def engine(self, model: str, dimensions: Optional[int] = None) -> EmbeddingEngine:
+        key = model if dimensions is None else f"{model}@{dimensions}"
+        with self._lock:
+            if key not in self._engines:
+                self._engines[key] = EmbeddingEngine(
+                    model=model,
+                    api_key=self.openai_key,
+                    client=self.embedding_client,
+                    max_concurrency=self.max_embed_concurrency,
+                    cache=self.cache,
+                    dimensions=dimensions,
+                    metrics=self.metrics
+                )
+            return self._engines[key]
+
+    def observe(self, stage: str, seconds: float):
+        self.metrics.observe(stage, seconds)
+        if self._observe is not None:
+            self._observe(stage, seconds)
+
+    def embedder(self, collection: Collection) -> Callable[[List[str]], np.ndarray]:
+        """Embedding function producing the collection's stored vectors (reduced, if configured)."""
+        model, dimensions = collection.model, collection.dimensions
+        if dimensions is None or supports_dimensions(model):
+            return self.engine(model, dimensions).embed_array
+        reducer = load_reducer(collection.resolved_index_name(), collection.namespace, model, dimensions)
+        engine = self.engine(model)
+        return lambda texts: reducer.transform(engine.embed_array(texts))
+
+    def ingest(self, collection: Collection, paths: Optional[Iterable[str]] = None,
+               force: bool = False, retry_failed: bool = False) -> List[Dict]:
+        """Index a collection's new and changed PDFs; returns one summary per file.
+
+        ``paths`` restricts the run to those files; otherwise every PDF in the
+        source directory is considered and files that disappeared from it have
+        their vectors deleted. ``force`` re-indexes unchanged files too.
+
+        Chunks a previous, interrupted run already upserted are skipped.
+        ``retry_failed`` only revisits the files the checkpoint holds failed
+        chunks or errors for, re-sending just what did not make it. A target
+        holding other files embedded with another model raises ValueError.
+        """
+        index_name = collection.resolved_index_name()
+        namespace = collection.namespace
+        params = collection.index_params()
+        chunker = CHUNKERS[collection.chunker]
+        label = f"[{collection.name}]"
+
+        if paths is None:
+            source_dir = collection.resolved_source_dir()
+            if not os.path.exists(source_dir):
+                os.makedirs(source_dir)
+                print(f"{label} Created directory: {source_dir}")
+            files = [os.path.join(source_dir, f) for f in sorted(os.listdir(source_dir))
+                     if f.lower().endswith('.pdf')]
+        else:
+            files = list(paths)
+        print(f"{label} Found {len(files)} PDF files")
+
+        manifest = Manifest.for_target(index_name, namespace, directory=self.manifest_dir)
+        checkpoint = Checkpoint.for_target(index_name, namespace, directory=self.checkpoint_dir)
+        if checkpoint.files:
+            print(f"{label} Resuming from checkpoint: {checkpoint.summary()}")
+        if retry_failed:
+            failed_files = set(checkpoint.failed_files())
+            files = [path for path in files if os.path.basename(path) in failed_files]
+            print(f"{label} Retrying {len(files)} files with recorded failures")
+        # Files of other directories indexed into the same target are left alone
+        plan = manifest.plan(files, params, directory=source_dir if paths is None else None)
+        if force or retry_failed:
+            plan.changed += plan.unchanged
+            plan.unchanged = []
+        if paths is not None or retry_failed:
+            plan.removed = []  # other files in the manifest were not asked about
+        # Queries embed with the collection's model, so a target holds one model's vectors
+        reindexed = {os.path.basename(path) for path in plan.changed} | set(plan.removed)
+        mixed = sorted(key for key, entry in manifest.files.items()
+                       if key not in reindexed and entry["params"].get("model") != collection.model)
+        if mixed:
+            raise ValueError(f"{label} {index_name}/{namespace or 'default'} holds files embedded with "
+                             f"another model than {collection.model}: {', '.join(mixed)}; re-index "
+                             f"them with it (force=True) or remove them first")
+        # Files recorded in the manifest (or gone) since they were checkpointed
+        for path in plan.unchanged:
+            checkpoint.done(os.path.basename(path))
+        for filename in plan.removed:
+            checkpoint.done(filename)
+        checkpoint.compact()
+        scope = chunk_scope(index_name, namespace)
+        dedup = (DedupIndex.for_target(index_name, namespace, directory=self.dedup_dir)
+                 if collection.dedup else None)
+        # Files recorded in the dedup index whose upsert hasn't finished: later
+        # files in this run are checked against them, but they are forgotten
+        # if it fails or is interrupted, so nothing is dropped in their favour
+        unconfirmed: Set[str] = set()
+        if dedup is not None and plan.unchanged:
+            # Duplicates of files that changed or went away are checked again,
+            # and files indexed before the dedup index existed are checked once
+            revisit = {other for path in plan.changed for other in dedup.dependents(os.path.basename(path))}
+            revisit.update(other for filename in plan.removed for other in dedup.dependents(filename))
+            # including those of files dropped from it after a failed upsert
+            revisit.update(other for path in plan.unchanged if os.path.basename(path) not in dedup
+                           for other in dedup.dependents(os.path.basename(path)))
+            recheck = [path for path in plan.unchanged
+                       if os.path.basename(path) in revisit or os.path.basename(path) not in dedup]
+            plan.changed += recheck
+            plan.unchanged = [path for path in plan.unchanged if path not in recheck]
+        lexical = (LexicalIndex.for_target(index_name, namespace, directory=self.lexical_dir)
+                   if collection.lexical else None)
+        if lexical is not None and plan.unchanged:
+            # Files indexed before the lexical index existed are re-ingested
+            # once; their embeddings come from the cache
+            indexed = lexical.sources() | set(dedup.aliases() if dedup is not None else ())
+            missing = [path for path in plan.unchanged if os.path.basename(path) not in indexed]
+            plan.changed += missing
+            plan.unchanged = [path for path in plan.unchanged if path not in missing]
+        print(f"{label} Sync plan: {plan.summary()}")
+
+        store = self.open_store(index_name)
+        results: List[Dict] = []
+        try:
+            # Remove vectors of files that are no longer in the source directory
+            for filename in plan.removed:
+                removed_ids = manifest.forget(filename)
+                deleted = delete_vector_ids(store, removed_ids, namespace)
+                self.chunk_store.delete(scope, removed_ids)
+                if lexical is not None:
+                    lexical.remove_ids(removed_ids)
+                if dedup is not None:
+                    dedup.forget(filename)
+                print(f"{label} Deleted {deleted} vectors for removed file {filename}")
+            store.flush()
+            manifest.save()
+            if lexical is not None:
+                lexical.save()
+            if dedup is not None:
+                dedup.save()
+            if plan.removed:
+                invalidate_answers(index_name, namespace, self.answer_cache_path)
+
+            if not plan.changed:
+                print(f"{label} Nothing to index")
+                return results
+
+            def file_sha(pdf_path: str) -> str:
+                if pdf_path not in plan.hashes:
+                    plan.hashes[pdf_path] = file_sha256(pdf_path)
+                return plan.hashes[pdf_path]
+
+            progress = Progress(label, total=len(plan.changed), interval=self.progress_interval)
+
+            def record_failure(pdf_path: str, error: Exception):
+                key = os.path.basename(pdf_path)
+                print(f"{label} Failed to process {key}: {str(error)}")
+                results.append({'filename': key, 'error': str(error)})
+                self.metrics.count("failed_files", collection=collection.name)
+                progress.update(files=1)
+                checkpoint.resume(key, file_sha(pdf_path), params)
+                checkpoint.record_error(key, str(error))
+
+            pending: Dict[str, list] = {}  # chunks awaiting their file's upsert
+            positions: Dict[str, Dict[str, int]] = {}  # chunk ID -> index in its file
+            resumed: Dict[str, List[str]] = {}  # IDs upserted by an interrupted run
+            duplicates: Dict[str, Dict] = {}  # what dedup collapsed, per file
+            # Settled batches not yet journaled: a buffered store (the local one) only
+            # persists on flush, so they are journaled after one
+            unflushed: List[tuple] = []
+            last_flush = [time.monotonic()]
+
+            def commit():
+                if store.buffered:
+                    store.flush()
+                for args in unflushed:
+                    checkpoint.record_batch(*args)
+                unflushed.clear()
+                last_flush[0] = time.monotonic()
+
+            def drop_duplicates(pdf_path: str, pages: List[Page], chunks: List[Chunk]) -> List[Chunk]:
+                key = os.path.basename(pdf_path)
+                unconfirmed.add(key)
+                signature = minhash(join_pages(pages)[0])
+                match = dedup.find_document(key, signature)
+                if match is not None:
+                    canonical, score = match
+                    print(f"{label} {key} duplicates {canonical} (similarity {score:.2f}); not indexing it")
+                    dedup.alias(key, signature, canonical, score)
+                    duplicates[pdf_path] = {'duplicate_of': canonical}
+                    return []
+                kept, dropped = dedup.filter_chunks(key, [c.id for c in chunks], [c.text for c in chunks])
+                dedup.add(key, signature, kept, {dedup.chunk_document(i) for i in dropped.values()} - {None})
+                if dropped:
+                    print(f"{label} Dropping {len(dropped)}/{len(chunks)} chunks of {key} "
+                          f"that repeat indexed ones")
+                    duplicates[pdf_path] = {'duplicate_chunks': len(dropped)}
+                return [c for c in chunks if c.id in kept]
+
+            def iter_chunks():
+                documents = iter_pdf_documents(plan.changed, on_error=record_failure,
+                                               pool=self._extraction_pool,
+                                               fallback_pool=self._fallback_pool, observe=self.observe)
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        pdf_path, pages = next(documents)
+                    except StopIteration:
+                        return
+                    self.observe("extract", time.perf_counter() - started)
+                    fallbacks = Counter(page.method for page in pages if page.method != "text")
+                    poor = sum(1 for page in pages if page_quality(page.text) is not None)
+                    self.metrics.count("pages", len(pages), collection=collection.name)
+                    for method, n in fallbacks.items():
+                        self.metrics.count("pages_reextracted", n, method=method)
+                    if poor:
+                        self.metrics.count("poor_pages", poor, collection=collection.name)
+                    failures = Counter(name for page in pages for name in page.failed_fallbacks)
+                    for method, n in failures.items():
+                        self.metrics.count("fallback_failures", n, method=method)
+                    if fallbacks or poor:
+                        methods = ", ".join(f"{n} by {m}" for m, n in fallbacks.items()) or "none improved"
+                        print(f"{label} {os.path.basename(pdf_path)}: low-quality pages re-extracted "
+                              f"({methods}); {poor}/{len(pages)} still sparse or garbled")
+                    started = time.perf_counter()
+                    try:
+                        chunks = list(chunker(pdf_path, pages, collection))
+                    except Exception as e:
+                        record_failure(pdf_path, e)
+                        continue
+                    self.observe("chunk", time.perf_counter() - started)
+                    if dedup is not None:
+                        chunks = drop_duplicates(pdf_path, pages, chunks)
+                    self.chunk_store.put(scope, [c.id for c in chunks], [c.text for c in chunks])
+                    done = checkpoint.resume(os.path.basename(pdf_path), file_sha(pdf_path), params)
+                    pending[pdf_path] = chunks
+                    positions[pdf_path] = {c.id: i for i, c in enumerate(chunks)}
+                    resumed[pdf_path] = [c.id for c in chunks if c.id in done]
+                    if resumed[pdf_path]:
+                        print(f"{label} Skipping {len(resumed[pdf_path])}/{len(chunks)} chunks "
+                              f"of {os.path.basename(pdf_path)} upserted by an earlier run")
+                    yield from (c for c in chunks if c.id not in done)
+                    yield FileDone(pdf_path)
+
+            def batch_done(source: str, upserted_ids: List[str], failed_ids: List[str]):
+                indexes = [positions[source][i] for i in upserted_ids + failed_ids]
+                unflushed.append((os.path.basename(source), (min(indexes), max(indexes)),
+                                  upserted_ids, failed_ids))
+                if not store.buffered or time.monotonic() - last_flush[0] >= self.flush_interval:
+                    commit()
+                progress.update(chunks=len(indexes), failed=len(failed_ids))
+
+            def file_done(source: str, vector_ids: List[str], failed: int):
+                # The file's vectors must be on disk before the manifest or checkpoint say so
+                commit()
+                key = os.path.basename(source)
+                chunks = pending.pop(source, [])
+                positions.pop(source, None)
+                # Keep the file's chunk order, whichever run upserted them
+                upserted = set(vector_ids) | set(resumed.pop(source, []))
+                vector_ids = [c.id for c in chunks if c.id in upserted]
+                previous_ids = set(manifest.vector_ids(key)) | checkpoint.stale_ids(key)
+                results.append(summarize_file(source, vector_ids, failed, store, namespace, params,
+                                              manifest, plan.hashes.get(source),
+                                              checkpoint.stale_ids(key), duplicates.get(source)))
+                progress.update(files=1)
+                unconfirmed.discard(key)
+                if failed > 0:
+                    print(f"{label} {key}: {failed}/{len(vector_ids) + failed} chunks failed")
+                    if dedup is not None:
+                        dedup.forget(key)
+                    return
+                checkpoint.done(key)
+                self.chunk_store.delete(scope, previous_ids - set(vector_ids))
+                if lexical is not None:
+                    lexical.remove_source(os.path.basename(source))
+                    lexical.add([c.id for c in chunks], [c.text for c in chunks],
+                                [c.metadata for c in chunks])
+
+            embedder = self.embedder(collection)
+            upserter = Upserter(store, namespace, max_inflight=self.max_inflight_upserts,
+                                dead_letter=dead_letter_path(index_name, namespace,
+                                                             directory=self.dead_letter_dir),
+                                executor=self._upsert_pool, include_text=collection.metadata_text,
+                                metrics=self.metrics)
+            stats = run_ingest(
+                iter_chunks(),
+                embed=embedder,
+                upsert=upserter,
+                on_file_done=file_done,
+                on_batch_done=batch_done,
+                upsert_batch_size=self.upsert_batch_size,
+                max_inflight_upserts=self.max_inflight_upserts
+            )
+            progress.finish()
+            print(f"{label} Upserted {stats['upserted']}/{stats['chunks']} chunks "
+                  f"from {stats['files']} files")
+            self.metrics.count("files", stats['files'], collection=collection.name)
+            self.metrics.count("chunks", stats['chunks'], collection=collection.name)
+            self.metrics.count("failed_chunks", stats['failed'], collection=collection.name)
+            if lexical is not None:
+                lexical.save()
+                print(f"{label} Lexical index: {len(lexical)} chunks")
+            if duplicates:
+                documents = sum(1 for d in duplicates.values() if 'duplicate_of' in d)
+                dropped_chunks = sum(d.get('duplicate_chunks', 0) for d in duplicates.values())
+                self.metrics.count("duplicate_documents", documents, collection=collection.name)
+                self.metrics.count("duplicate_chunks", dropped_chunks, collection=collection.name)
+                print(f"{label} Collapsed {documents} duplicate documents and {dropped_chunks} "
+                      f"duplicate chunks before embedding")
+            if checkpoint.failed_files():
+                print(f"{label} {len(checkpoint.failed_files())} files have failed chunks; "
+                      f"rerun with --retry-failed to re-send only those")
+            # Answers cached before this run may cite replaced or missing chunks
+            invalidate_answers(index_name, namespace, self.answer_cache_path)
+        finally:
+            # Files that finished before an interruption stay searchable and
+            # aren't re-ingested for the lexical index next run
+            if lexical is not None:
+                lexical.save()
+            if dedup is not None:
+                for key in unconfirmed:
+                    dedup.forget(key)
+                dedup.save()
+            checkpoint.compact()
+            store.close()
+        return results
+
+    def replay_dead_letters(self, collection: Collection) -> Dict:
+        """Re-upsert a collection's dead-lettered vectors; those failing again stay dead-lettered.
+
+        The files they came from are still recorded as failed, so the next
+        ``ingest`` (or ``retry_failed``) run re-checks them and records them
+        once all of their chunks are in.
+        """
+        index_name = collection.resolved_index_name()
+        path = dead_letter_path(index_name, collection.namespace, directory=self.dead_letter_dir)
+        label = f"[{collection.name}]"
+        if not os.path.exists(path):
+            print(f"{label} No dead letters")
+            return {"upserted": 0, "failed": 0}
+        store = self.open_store(index_name)
+        try:
+            result = replay_dead_letters(store, path, metrics=self.metrics)
+        finally:
+            store.close()
+        print(f"{label} Replayed {len(result.upserted)} dead-lettered vectors, "
+              f"{len(result.failed)} failed again")
+        return {"upserted": len(result.upserted), "failed": len(result.failed)}
+
+    def ingest_all(self, collections: List[Collection], force: bool = False,
+                   retry_failed: bool = False) -> Dict[str, List[Dict]]:
+        """Ingest several collections concurrently; returns each one's file summaries.
+
+        A collection that fails is reported under its name with an ``error``
+        entry and does not stop the others.
+        """
+        def run(collection: Collection) -> List[Dict]:
+            try:
+                return self.ingest(collection, force=force, retry_failed=retry_failed)
+            except Exception as e:
+                print(f"[{collection.name}] Ingest failed: {str(e)}")
+                return [{'error': str(e)}]
+
+        if len(collections) == 1:
+            return {collections[0].name: run(collections[0])}
+        with ThreadPoolExecutor(max_workers=len(collections), thread_name_prefix="collection") as pool:
+            futures = {collection.name: pool.submit(run, collection) for collection in collections}
+            return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        for engine in self._engines.values():
+            engine.close()
+        self._upsert_pool.shutdown(wait=True)
+        self._extraction_pool.shutdown(wait=True)
+        self._fallback_pool.shutdown(wait=True)
+        if self.cache is not None:
+            print(f"Embedding cache: {self.cache.stats()}")
+            self.cache.close()
+        if self._owns_chunk_store:
+            self.chunk_store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,263 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.vector_store import QueryMatch, matches_filter, vector_store_backend
+
+LEXICAL_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "lexical"
+)
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about after all also an and are as at be been but by can could did do does for from had has
+have how if in into is it its may more most no not of on or our over such than that the their
+them then there these they this those through to was we were what when where which while who
+will with within would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms, so "VO2max" and "CMJ" stay whole."""
+    return [term for term in _TOKEN.findall(text.lower()) if term not in STOPWORDS]
+
+
+def lexical_index_path(index_name: str, namespace: Optional[str] = None,
+                       backend: Optional[str] = None, directory: Optional[str] = None) -> str:
+    name = f"{index_name}--{namespace or 'default'}"
+    backend = backend or vector_store_backend()
+    if backend != "pinecone":
+        name = f"{backend}--{name}"
+    return os.path.join(directory or LEXICAL_DIR, re.sub(r"[^\w.-]", "_", name))
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk IDs, stored as flat numpy arrays.
+
+    A saved index is one generation directory holding ``postings_docs.npy``
+    (int32 doc numbers, grouped by term), ``postings_tf.npy`` (uint16 term
+    frequencies), ``offsets.npy`` (where each term's postings start),
+    ``doc_lengths.npy`` and ``docs.json`` (vocabulary, chunk IDs and their
+    metadata). The arrays are memory-mapped on load, so a query touches only
+    the postings of its terms. ``CURRENT`` names the live generation;
+    ``save`` writes a new one and switches it atomically, so readers never
+    see a half-written index.
+
+    Changes (``add``/``remove_source``/``remove_ids``) are buffered and merged
+    into the arrays by ``save``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._generation: Optional[str] = None
+        self._load()
+
+    @classmethod
+    def for_target(cls, index_name: str, namespace: Optional[str] = None,
+                   backend: Optional[str] = None, directory: Optional[str] = None) -> "LexicalIndex":
+        return cls(lexical_index_path(index_name, namespace, backend, directory))
+
+    def _current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        generation = self._current()
+        self._generation = generation
+        self._added: Dict[str, Tuple[Counter, int, Dict]] = {}
+        self._removed: set = set()
+        if generation is None:
+            self.vocab: Dict[str, int] = {}
+            self.ids: List[str] = []
+            self.metadata: List[Dict] = []
+            self.docs = np.zeros(0, dtype=np.int32)
+            self.tfs = np.zeros(0, dtype=np.uint16)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.doc_lengths = np.zeros(0, dtype=np.int32)
+        else:
+            directory = os.path.join(self.path, generation)
+            with open(os.path.join(directory, "docs.json")) as f:
+                docs = json.load(f)
+            self.vocab = {term: i for i, term in enumerate(docs["vocab"])}
+            self.ids = docs["ids"]
+            self.metadata = docs["metadata"]
+            self.docs = np.load(os.path.join(directory, "postings_docs.npy"), mmap_mode="r")
+            self.tfs = np.load(os.path.join(directory, "postings_tf.npy"), mmap_mode="r")
+            self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+            self.doc_lengths = np.load(os.path.join(directory, "doc_lengths.npy"), mmap_mode="r")
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    def refresh(self) -> bool:
+        """Reload if another process saved a newer generation; returns whether it did."""
+        with self._lock:
+            if self._current() == self._generation or self._added or self._removed:
+                return False
+            self._load()
+            return True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def sources(self) -> set:
+        """``source`` metadata of the saved chunks (the files they came from)."""
+        with self._lock:
+            return {meta.get("source") for meta in self.metadata}
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], metadata: Sequence[Dict]):
+        with self._lock:
+            for vector_id, text, meta in zip(ids, texts, metadata):
+                terms = tokenize(text)
+                self._added[vector_id] = (Counter(terms), len(terms), dict(meta))
+                self._removed.discard(vector_id)
+
+    def remove_ids(self, ids: Iterable[str]):
+        with self._lock:
+            for vector_id in ids:
+                self._added.pop(vector_id, None)
+                if vector_id in self.rows:
+                    self._removed.add(vector_id)
+
+    def remove_source(self, source: str):
+        """Remove every chunk whose ``source`` metadata is ``source``."""
+        with self._lock:
+            self.remove_ids([vector_id for vector_id, meta in zip(self.ids, self.metadata)
+                             if meta.get("source") == source])
+            self.remove_ids([vector_id for vector_id, (_, _, meta) in list(self._added.items())
+                             if meta.get("source") == source])
+
+    def clear(self):
+        with self._lock:
+            self._added.clear()
+            self._removed = set(self.ids)
+
+    def save(self):
+        """Merge buffered changes into a new generation on disk."""
+        with self._lock:
+            if not self._added and not self._removed:
+                return
+            # Existing postings as (term, doc, tf) triples, minus removed and replaced docs
+            terms = np.repeat(np.arange(len(self.vocab), dtype=np.int64), np.diff(self.offsets))
+            docs = np.asarray(self.docs, dtype=np.int64)
+            tfs = np.asarray(self.tfs)
+            drop = np.zeros(len(self.ids), dtype=bool)
+            for vector_id in self._removed | set(self._added):
+                row = self.rows.get(vector_id)
+                if row is not None:
+                    drop[row] = True
+            keep_docs = np.flatnonzero(~drop)
+            renumber = np.full(len(self.ids), -1, dtype=np.int64)
+            renumber[keep_docs] = np.arange(len(keep_docs))
+            live = ~drop[docs] if len(docs) else np.zeros(0, dtype=bool)
+            terms, docs, tfs = terms[live], renumber[docs[live]], tfs[live]
+
+            ids = [self.ids[row] for row in keep_docs]
+            metadata = [self.metadata[row] for row in keep_docs]
+            lengths = [int(self.doc_lengths[row]) for row in keep_docs]
+            vocab = list(self.vocab)
+            term_numbers = dict(self.vocab)
+            new_terms, new_docs, new_tfs = [], [], []
+            for vector_id, (counts, length, meta) in self._added.items():
+                doc = len(ids)
+                ids.append(vector_id)
+                metadata.append(meta)
+                lengths.append(length)
+                for term, tf in counts.items():
+                    number = term_numbers.get(term)
+                    if number is None:
+                        number = term_numbers[term] = len(vocab)
+                        vocab.append(term)
+                    new_terms.append(number)
+                    new_docs.append(doc)
+                    new_tfs.append(min(tf, 65535))
+            terms = np.concatenate([terms, np.array(new_terms, dtype=np.int64)])
+            docs = np.concatenate([docs, np.array(new_docs, dtype=np.int64)])
+            tfs = np.concatenate([tfs, np.array(new_tfs, dtype=np.uint16)])
+
+            # Drop terms left without postings and renumber the rest
+            counts = np.bincount(terms, minlength=len(vocab))
+            live_terms = np.flatnonzero(counts)
+            renumber = np.full(len(vocab), -1, dtype=np.int64)
+            renumber[live_terms] = np.arange(len(live_terms))
+            terms = renumber[terms]
+            vocab = [vocab[number] for number in live_terms]
+
+            order = np.lexsort((docs, terms))
+            offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+            np.cumsum(counts[live_terms], out=offsets[1:])
+
+            generation = str(int(self._generation or 0) + 1)
+            directory = os.path.join(self.path, generation)
+            os.makedirs(directory, exist_ok=True)
+            np.save(os.path.join(directory, "postings_docs.npy"), docs[order].astype(np.int32))
+            np.save(os.path.join(directory, "postings_tf.npy"), tfs[order].astype(np.uint16))
+            np.save(os.path.join(directory, "offsets.npy"), offsets)
+            np.save(os.path.join(directory, "doc_lengths.npy"), np.array(lengths, dtype=np.int32))
+            with open(os.path.join(directory, "docs.json"), "w") as f:
+                json.dump({"vocab": vocab, "ids": ids, "metadata": metadata}, f)
+            tmp = os.path.join(self.path, "CURRENT.tmp")
+            with open(tmp, "w") as f:
+                f.write(generation)
+            os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+            previous = self._generation
+            self._load()
+            if previous is not None:
+                # Readers that mapped the old arrays keep them until they reload
+                shutil.rmtree(os.path.join(self.path, previous), ignore_errors=True)
+
+    def search(self, query: str, top_k: int = 10, filter: Optional[Dict] = None) -> List[QueryMatch]:
+        """Chunks ranked by BM25 score, restricted by a metadata filter."""
+        with self._lock:
+            n = len(self.ids)
+            if not n:
+                return []
+            scores = np.zeros(n, dtype=np.float32)
+            for term in set(tokenize(query)):
+                number = self.vocab.get(term)
+                if number is None:
+                    continue
+                start, end = int(self.offsets[number]), int(self.offsets[number + 1])
+                docs = self.docs[start:end]
+                tf = self.tfs[start:end].astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[docs] / (self.avg_length or 1.0))
+                scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            candidates = np.flatnonzero(scores)
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            matches = []
+            for row in candidates:
+                if filter and not matches_filter(self.metadata[row], filter):
+                    continue
+                matches.append(QueryMatch(self.ids[row], float(scores[row]), dict(self.metadata[row])))
+                if len(matches) >= top_k:
+                    break
+            return matches
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[QueryMatch]], top_k: int,
+                           k: int = RRF_K, weights: Optional[Sequence[float]] = None) -> List[QueryMatch]:
+    """Fuse ranked lists by summing ``weight / (k + rank)``; metadata comes from the first list with the ID."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    metadata: Dict[str, Dict] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, match in enumerate(ranking, start=1):
+            scores[match.id] = scores.get(match.id, 0.0) + weight / (k + rank)
+            metadata.setdefault(match.id, match.metadata)
+    best = sorted(scores, key=lambda vector_id: -scores[vector_id])[:top_k]
+    return [QueryMatch(vector_id, scores[vector_id], metadata[vector_id]) for vector_id in best]
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from rag.vector_store import vector_store_backend
+
+MANIFEST_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "manifests"
+)
+MAX_ID_LENGTH = 512  # Pinecone vector ID limit
+
+
+def make_vector_id(filename: str, chunk_index: int) -> str:
+    """Deterministic vector ID, so re-indexing a file overwrites its vectors."""
+    suffix = f"-chunk-{chunk_index}"
+    return filename[:MAX_ID_LENGTH - len(suffix)] + suffix
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _directory(path: str) -> str:
+    return os.path.dirname(os.path.abspath(path))
+
+
+def delete_vector_ids(store, ids: Iterable[str], namespace: Optional[str] = None) -> int:
+    """Delete vectors by ID from a VectorStore; returns how many were requested."""
+    ids = list(ids)
+    if ids:
+        store.delete(ids=ids, namespace=namespace)
+    return len(ids)
+
+
+@dataclass
+class SyncPlan:
+    unchanged: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    hashes: Dict[str, str] = field(default_factory=dict)
+
+    def summary(self) -> Dict:
+        return {
+            "unchanged": len(self.unchanged),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+        }
+
+
+class Manifest:
+    """Per index/namespace record of which files are indexed and with which IDs.
+
+    Each entry keeps the file's content hash, the chunking/embedding
+    parameters it was indexed with and the vector IDs it produced, so a
+    rerun can skip unchanged files and delete IDs that are no longer
+    produced. It also keeps the directory the file was read from: several
+    scripts may index into one target, and a scan only removes the entries
+    of files that went missing from its own directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f).get("files", {})
+
+    @classmethod
+    def for_target(cls, index_name: str, namespace: Optional[str] = None,
+                   backend: Optional[str] = None, directory: Optional[str] = None) -> "Manifest":
+        name = f"{index_name}--{namespace or 'default'}"
+        backend = backend or vector_store_backend()
+        if backend != "pinecone":
+            # A local index of the same name has its own contents
+            name = f"{backend}--{name}"
+        return cls(os.path.join(directory or MANIFEST_DIR, re.sub(r"[^\w.-]", "_", name) + ".json"))
+
+    def plan(self, paths: Iterable[str], params: Dict, directory: Optional[str] = None) -> SyncPlan:
+        """Compare files on disk against the manifest.
+
+        Only with the ``directory`` the paths were listed from are files
+        missing from it planned for removal. Entries recorded before
+        directories were kept are never removed.
+        """
+        plan = SyncPlan()
+        seen = set()
+        for path in paths:
+            key = os.path.basename(path)
+            seen.add(key)
+            entry = self.files.get(key)
+            stat = os.stat(path)
+            if entry:
+                entry["directory"] = _directory(path)
+            # Skip hashing when size and mtime are unchanged since the last run
+            if (entry and entry["params"] == params and entry["size"] == stat.st_size
+                    and entry["mtime"] == stat.st_mtime):
+                plan.unchanged.append(path)
+                continue
+            sha = file_sha256(path)
+            plan.hashes[path] = sha
+            if entry and entry["sha256"] == sha and entry["params"] == params:
+                entry["size"] = stat.st_size
+                entry["mtime"] = stat.st_mtime
+                plan.unchanged.append(path)
+            else:
+                plan.changed.append(path)
+        if directory is not None:
+            directory = os.path.abspath(directory)
+            plan.removed = [key for key, entry in self.files.items()
+                            if key not in seen and entry.get("directory") == directory]
+        return plan
+
+    def models(self) -> Set[str]:
+        """Embedding models the recorded files were indexed with."""
+        return {entry["params"].get("model") for entry in self.files.values()}
+
+    def vector_ids(self, key: str) -> List[str]:
+        entry = self.files.get(key)
+        return list(entry["vector_ids"]) if entry else []
+
+    def record(self, path: str, params: Dict, vector_ids: List[str],
+               sha256: Optional[str] = None) -> List[str]:
+        """Store a successfully indexed file; returns its stale vector IDs."""
+        key = os.path.basename(path)
+        stale = set(self.vector_ids(key)) - set(vector_ids)
+        stat = os.stat(path)
+        self.files[key] = {
+            "sha256": sha256 or file_sha256(path),
+            "directory": _directory(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "params": params,
+            "vector_ids": list(vector_ids),
+            "indexed_at": time.time(),
+        }
+        return sorted(stale)
+
+    def forget(self, key: str) -> List[str]:
+        """Drop a removed file; returns the vector IDs to delete."""
+        entry = self.files.pop(key, None)
+        return list(entry["vector_ids"]) if entry else []
+
+    def clear(self):
+        self.files = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"files": self.files}, f, indent=2)
+        os.replace(tmp, self.path)
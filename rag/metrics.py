@@ -0,0 +1,334 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds of the latency buckets, in seconds: API requests land in the
+# low ones, extracting or OCR'ing a whole file in the high ones
+LATENCY_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+PROMETHEUS_PREFIX = "rag_"
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _label_text(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    """Bucketed latencies: counts per bucket, their sum and the largest, in constant memory.
+
+    With ``keep_values`` every observation is kept too and quantiles are
+    exact, for runs small enough that bucket estimates would be coarse.
+    """
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BOUNDS, keep_values: bool = False):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.values: Optional[List[float]] = [] if keep_values else None
+
+    def observe(self, seconds: float):
+        # A linear scan beats bisect for a dozen bounds
+        i = 0
+        while i < len(self.bounds) and seconds > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if self.values is not None:
+            self.values.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        """Estimate, interpolating within the bucket the quantile falls in (exact with kept values)."""
+        if not self.count:
+            return 0.0
+        if self.values is not None:
+            values = sorted(self.values)
+            position = q * (len(values) - 1)
+            lower = int(position)
+            upper = min(lower + 1, len(values) - 1)
+            return values[lower] + (values[upper] - values[lower]) * (position - lower)
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "total_s": round(self.sum, 3),
+            "mean_ms": round(self.sum / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 2),
+            "p90_ms": round(self.quantile(0.9) * 1000, 2),
+            "p99_ms": round(self.quantile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+    def buckets(self) -> Dict[str, int]:
+        """Count per non-empty bucket, labelled by its upper bound in milliseconds."""
+        labels = [f"<={bound * 1000:g}ms" for bound in self.bounds] + [f">{self.bounds[-1] * 1000:g}ms"]
+        return {label: count for label, count in zip(labels, self.counts) if count}
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms, keyed by name and labels.
+
+    ``count("embed_tokens", 512, model=...)`` adds to a counter and
+    ``observe("upsert_request", seconds, namespace=...)`` records a latency;
+    ``observe`` has the ``observe(stage, seconds)`` signature the ingester
+    and extractor call, so a ``Metrics`` can be passed straight to them.
+    The totals can be read as a dict (``snapshot``), appended to a JSON
+    lines file, rendered in the Prometheus text format or served for
+    scraping while a run is going.
+    """
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BOUNDS):
+        self.bounds = list(bounds)
+        self.counters: Dict[_Key, float] = {}
+        self.histograms: Dict[_Key, Histogram] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def count(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.bounds)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """Counters and histogram summaries, each as ``name{label="value"}`` -> value."""
+        with self._lock:
+            counters = {name + _label_text(labels): value for (name, labels), value in self.counters.items()}
+            histograms = {name + _label_text(labels): histogram.summary()
+                          for (name, labels), histogram in self.histograms.items()}
+        return {
+            "time": round(time.time(), 3),
+            "uptime_s": round(time.time() - self._started, 3),
+            "counters": dict(sorted(counters.items())),
+            "latency": dict(sorted(histograms.items())),
+        }
+
+    def report(self, top: int = 10) -> str:
+        """The stages that took the most time in total, one per line."""
+        latency = self.snapshot()["latency"]
+        ranked = sorted(latency.items(), key=lambda item: -item[1]["total_s"])[:top]
+        return "\n".join(f"  {name}: {s['total_s']}s over {s['count']} "
+                         f"(p50 {s['p50_ms']} ms, p99 {s['p99_ms']} ms, max {s['max_ms']} ms)"
+                         for name, s in ranked)
+
+    def prometheus(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h.counts), h.count, h.sum)) for key, h in self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PROMETHEUS_PREFIX}{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_label_text(labels)} {value}")
+        for (name, labels), (counts, count, total) in histograms:
+            metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, bucket in zip(self.bounds + ["+Inf"], counts):
+                cumulative += bucket
+                le = labels + (("le", str(bound)),)
+                lines.append(f"{metric}_bucket{_label_text(le)} {cumulative}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {total}")
+            lines.append(f"{metric}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self, path: str, **fields):
+        """Append a snapshot (plus ``fields``, e.g. the run's name) as one JSON line."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps({**fields, **self.snapshot()}) + "\n")
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve ``/metrics`` in the Prometheus text format on a daemon thread; ``shutdown()`` stops it."""
+        # Imported here: http.server is slow to import and most runs don't serve
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # scrapes would drown out the run's own output
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+class Progress:
+    """Throttled progress lines for a long run: at most one every ``interval`` seconds.
+
+    Replaces printing a line per file or chunk, which floods the log of a
+    nightly ingest and slows the loop doing the work.
+    """
+
+    def __init__(self, label: str, total: Optional[int] = None, interval: float = 10.0,
+                 out: Callable[[str], None] = print):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.out = out
+        self.files = 0
+        self.chunks = 0
+        self.failed = 0
+        self._started = time.perf_counter()
+        self._last = self._started
+        self._lock = threading.Lock()
+
+    def update(self, files: int = 0, chunks: int = 0, failed: int = 0):
+        with self._lock:
+            self.files += files
+            self.chunks += chunks
+            self.failed += failed
+            now = time.perf_counter()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+            line = self._line(now)
+        self.out(line)
+
+    def _line(self, now: float) -> str:
+        elapsed = now - self._started
+        files = f"{self.files}/{self.total}" if self.total is not None else str(self.files)
+        line = (f"{self.label} {files} files, {self.chunks} chunks "
+                f"({self.chunks / elapsed if elapsed else 0.0:.1f} chunks/s)")
+        if self.failed:
+            line += f", {self.failed} failed"
+        if self.total and 0 < self.files < self.total:
+            line += f", about {elapsed / self.files * (self.total - self.files):.0f}s left"
+        return line
+
+    def finish(self):
+        with self._lock:
+            line = self._line(time.perf_counter()) + f" in {time.perf_counter() - self._started:.1f}s"
+        self.out(line)
+
+
+@contextmanager
+def profiled(path: Optional[str]) -> Iterator[None]:
+    """Profile the calling thread into ``path``; a no-op without one.
+
+    A path ending in ``.html`` gets a pyinstrument report if it is
+    installed; anything else a cProfile dump (``python -m pstats`` or
+    snakeviz read it), with the top functions printed. Only the calling
+    thread is profiled, so for an ingest that is the upsert stage and the
+    waits on the others; their time shows in the stage histograms.
+    """
+    if not path:
+        yield
+        return
+    if path.endswith(".html"):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed; writing a cProfile dump instead")
+            path = path[:-len(".html")] + ".prof"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(path, "w") as f:
+                    f.write(profiler.output_html())
+                print(f"Profile written to {path}")
+            return
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        print(f"Profile written to {path}")
+
+
+@contextmanager
+def instrumented(metrics: Metrics, metrics_file: Optional[str] = None, metrics_port: Optional[int] = None,
+                 profile: Optional[str] = None, **fields) -> Iterator[Metrics]:
+    """Serve, profile and record ``metrics`` around a run.
+
+    Each option falls back to the ``METRICS_FILE``, ``METRICS_PORT`` and
+    ``PROFILE`` environment variables, so scripts without flags of their own
+    can be instrumented too. At the end the slowest stages are printed and
+    a snapshot (with ``fields``) is appended to the metrics file.
+    """
+    metrics_file = metrics_file or os.getenv("METRICS_FILE")
+    metrics_port = metrics_port or (int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None)
+    profile = profile or os.getenv("PROFILE")
+    server = metrics.serve(metrics_port) if metrics_port else None
+    if server is not None:
+        print(f"Serving metrics on http://127.0.0.1:{metrics_port}/metrics")
+    try:
+        with profiled(profile):
+            yield metrics
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if metrics.counters:
+            counters = metrics.snapshot()["counters"]
+            print("Counters:\n" + "\n".join(f"  {name}: {value}" for name, value in counters.items()))
+        if metrics.histograms:
+            print(f"Time by stage:\n{metrics.report()}")
+        if metrics_file:
+            metrics.write_jsonl(metrics_file, **fields)
+            print(f"Metrics appended to {metrics_file}")
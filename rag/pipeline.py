@@ -0,0 +1,285 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from rag.upsert import UpsertResult
+from rag.vector_batch import VectorBatch
+
+
+class Chunk(NamedTuple):
+    id: str
+    text: str
+    source: str  # file the chunk came from, used for per-file accounting
+    metadata: Dict  # filterable fields; the text travels in VectorBatch.texts
+
+
+class FileDone(NamedTuple):
+    """Marks the end of a file's chunks in the ingest stream."""
+    source: str
+
+
+class _Failed(NamedTuple):
+    chunks: List[Chunk]
+    error: Exception
+
+
+_END = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    # Blocking put that gives up once the pipeline is shutting down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _done(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _submit(upsert, batch: VectorBatch) -> Future:
+    if hasattr(upsert, "submit"):
+        return upsert.submit(batch)
+    future = Future()
+    try:
+        future.set_result(upsert(batch))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def run_ingest(items: Iterable[Union[Chunk, FileDone]],
+               embed: Callable[[List[str]], np.ndarray],
+               upsert: Callable[[VectorBatch], Optional["UpsertResult"]],
+               on_file_done: Optional[Callable[[str, List[str], int], None]] = None,
+               on_batch_done: Optional[Callable[[str, List[str], List[str]], None]] = None,
+               embed_batch_size: int = 128, upsert_batch_size: int = 100,
+               max_inflight_embeds: int = 4, max_inflight_upserts: int = 4,
+               queue_size: int = 4) -> Dict:
+    """Stream chunks through embedding and upserting with bounded buffers.
+
+    Three stages run concurrently: a producer thread pulls from ``items``
+    (and so drives extraction and chunking) and groups chunks into
+    embedding batches, an embedding thread keeps up to
+    ``max_inflight_embeds`` batches in flight while preserving order, and
+    the calling thread upserts. The bounded queues between stages block a
+    stage that gets ahead, so memory stays flat however large the input.
+
+    ``embed`` returns a float32 matrix (e.g. ``EmbeddingEngine.embed_array``)
+    and ``upsert`` receives ``VectorBatch`` objects of ``upsert_batch_size``
+    rows; converting to the store's wire format is left to ``upsert``.
+    It may return an ``UpsertResult`` naming the IDs that failed. If it also
+    has a ``submit`` method returning a future (e.g. ``Upserter``), up to
+    ``max_inflight_upserts`` batches are kept in flight.
+
+    ``on_file_done(source, vector_ids, failed)`` is called as soon as every
+    chunk of a file has been upserted or failed, without waiting for other
+    files' batches still in flight, and ``on_batch_done(source,
+    upserted_ids, failed_ids)`` once per file in every settled upsert batch
+    or failed embedding batch, in stream order. Failed embedding or upsert
+    batches are counted, not raised.
+    """
+    stop = threading.Event()
+    to_embed: queue.Queue = queue.Queue(maxsize=queue_size)
+    to_upsert: queue.Queue = queue.Queue(maxsize=queue_size)
+    stats = {"chunks": 0, "upserted": 0, "failed": 0, "files": 0}
+    errors: List[BaseException] = []
+
+    def produce():
+        batch: List[Chunk] = []
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                if isinstance(item, FileDone):
+                    if batch:
+                        _put(to_embed, batch, stop)
+                        batch = []
+                    _put(to_embed, item, stop)
+                    continue
+                batch.append(item)
+                if len(batch) >= embed_batch_size:
+                    _put(to_embed, batch, stop)
+                    batch = []
+            if batch:
+                _put(to_embed, batch, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_embed, _END, stop)
+
+    def embed_one(chunks: List[Chunk]):
+        try:
+            return chunks, embed([chunk.text for chunk in chunks])
+        except Exception as e:
+            return _Failed(chunks, e)
+
+    def embed_stage():
+        inflight: deque = deque()
+        with ThreadPoolExecutor(max_workers=max_inflight_embeds,
+                                thread_name_prefix="ingest-embed") as pool:
+            while not stop.is_set():
+                try:
+                    item = to_embed.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, FileDone):
+                    inflight.append(_done(item))
+                else:
+                    inflight.append(pool.submit(embed_one, item))
+                # Forward finished results in order; block once too many are in flight
+                while inflight and (len(inflight) > max_inflight_embeds or inflight[0].done()):
+                    _put(to_upsert, inflight.popleft().result(), stop)
+            while inflight and not stop.is_set():
+                _put(to_upsert, inflight.popleft().result(), stop)
+        _put(to_upsert, _END, stop)
+
+    producer = threading.Thread(target=produce, name="ingest-produce", daemon=True)
+    embedder = threading.Thread(target=embed_stage, name="ingest-embed", daemon=True)
+    producer.start()
+    embedder.start()
+
+    files: Dict[str, Dict] = {}
+    inflight: deque = deque()
+    # In-flight upsert batches holding each source's chunks, and the sources
+    # whose last chunk has been sent, waiting for those batches to settle
+    outstanding: Dict[str, int] = {}
+    finished: Dict[str, bool] = {}
+    pending: List[VectorBatch] = []
+    pending_sources: List[str] = []
+
+    def file_state(source: str) -> Dict:
+        return files.setdefault(source, {"ids": [], "failed": 0})
+
+    def flush(size: Optional[int] = None):
+        if not pending_sources:
+            return
+        batch = VectorBatch.concat(pending)
+        size = min(size or len(batch), len(batch))
+        rest = batch[size:] if size < len(batch) else None
+        batch = batch[:size] if rest is not None else batch
+        sources = pending_sources[:size]
+        del pending_sources[:size]
+        pending.clear()
+        if rest is not None:
+            pending.append(rest)
+        for source in set(sources):
+            outstanding[source] = outstanding.get(source, 0) + 1
+        inflight.append((_submit(upsert, batch), batch, sources))
+        # Block once too many are in flight
+        while len(inflight) > max_inflight_upserts:
+            settle(*inflight.popleft())
+        settle_done()
+
+    def settle_done():
+        # Settle finished upserts in order, without waiting on the rest
+        while inflight and inflight[0][0].done():
+            settle(*inflight.popleft())
+
+    def settle(future: Future, batch: VectorBatch, sources: List[str]):
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error uploading batch of {len(batch)} vectors: {str(e)}")
+            result = UpsertResult([], list(batch.ids))
+        if result is None:
+            result = UpsertResult(list(batch.ids), [])
+        failed = set(result.failed)
+        settled: Dict[str, tuple] = {}
+        for vector_id, source in zip(batch.ids, sources):
+            state = file_state(source)
+            upserted_ids, failed_ids = settled.setdefault(source, ([], []))
+            if vector_id in failed:
+                state["failed"] += 1
+                failed_ids.append(vector_id)
+            else:
+                state["ids"].append(vector_id)
+                upserted_ids.append(vector_id)
+        if on_batch_done is not None:
+            for source, (upserted_ids, failed_ids) in settled.items():
+                on_batch_done(source, upserted_ids, failed_ids)
+        stats["upserted"] += len(batch) - len(failed)
+        stats["failed"] += len(failed)
+        for source in set(sources):
+            outstanding[source] -= 1
+            if not outstanding[source]:
+                del outstanding[source]
+                if finished.pop(source, False):
+                    complete(source)
+
+    def complete(source: str):
+        state = files.pop(source, {"ids": [], "failed": 0})
+        stats["files"] += 1
+        if on_file_done is not None:
+            on_file_done(source, state["ids"], state["failed"])
+
+    def drain():
+        flush()
+        while inflight:
+            settle(*inflight.popleft())
+
+    try:
+        while True:
+            try:
+                item = to_upsert.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    break  # an upstream stage failed
+                settle_done()
+                continue
+            if item is _END:
+                break
+            if isinstance(item, FileDone):
+                # Send the file's last chunks, but only its own batches have to settle
+                # before it is done; other files' upserts stay in flight
+                flush()
+                if item.source in outstanding:
+                    finished[item.source] = True
+                else:
+                    complete(item.source)
+                continue
+            if isinstance(item, _Failed):
+                print(f"Error embedding batch of {len(item.chunks)} chunks: {str(item.error)}")
+                failed_ids: Dict[str, List[str]] = {}
+                for chunk in item.chunks:
+                    file_state(chunk.source)["failed"] += 1
+                    failed_ids.setdefault(chunk.source, []).append(chunk.id)
+                if on_batch_done is not None:
+                    for source, ids in failed_ids.items():
+                        on_batch_done(source, [], ids)
+                stats["chunks"] += len(item.chunks)
+                stats["failed"] += len(item.chunks)
+                continue
+            chunks, vectors = item
+            stats["chunks"] += len(chunks)
+            pending.append(VectorBatch(
+                [chunk.id for chunk in chunks],
+                vectors,
+                [chunk.metadata for chunk in chunks],
+                [chunk.text for chunk in chunks]
+            ))
+            pending_sources.extend(chunk.source for chunk in chunks)
+            while len(pending_sources) >= upsert_batch_size:
+                flush(upsert_batch_size)
+        while pending_sources:
+            flush(upsert_batch_size)
+        drain()
+    finally:
+        stop.set()
+        producer.join()
+        embedder.join()
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,353 @@
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from rag.answer_cache import AnswerCache
+from rag.chunk_store import ChunkStore, chunk_scope
+from rag.compression import load_reducer, supports_dimensions
+from rag.context import DEFAULT_MAX_TOKENS, Context, ContextBuilder, ContextPiece
+from rag.embedding_cache import EmbeddingCache
+from rag.embeddings import EmbeddingEngine
+from rag.lexical import LexicalIndex, reciprocal_rank_fusion
+from rag.vector_store import QueryMatch, VectorStore, open_vector_store
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4-turbo-preview"
+
+SYSTEM_PROMPT = """You are a sports science expert analyzing research papers.
+    Use ONLY the provided research context to answer the question.
+    Be specific about methodology, results, and conclusions from the paper.
+    If the context contains partial information, share what's available and indicate what's missing.
+    If the context doesn't contain relevant information, say so."""
+
+
+def _source(piece: ContextPiece) -> Dict:
+    return {
+        "filename": piece.filename,
+        "pages": piece.pages,
+        "chunks": piece.chunk_indices,
+        "score": round(float(piece.score), 4),
+    }
+
+
+@dataclass
+class RequestTiming:
+    """Where a question's time went, in seconds; None for stages that did not run."""
+    embed: Optional[float] = None
+    answer_cache: Optional[float] = None
+    query: Optional[float] = None
+    context: Optional[float] = None
+    first_token: Optional[float] = None  # from the start of the request
+    generate: Optional[float] = None  # from the chat request to its last token
+    total: Optional[float] = None
+    cached: bool = False
+    context_tokens: Optional[int] = None
+    chunks: int = 0  # streamed deltas
+
+    def as_dict(self) -> Dict:
+        """Stage latencies in milliseconds, for logging."""
+        record = {}
+        for key, value in asdict(self).items():
+            if isinstance(value, float):
+                record[f"{key}_ms"] = round(value * 1000, 1)
+            elif value is not None:
+                record[key] = value
+        return record
+
+
+class StreamingAnswer:
+    """Iterator of an answer's text deltas that fills in its ``timing`` as it goes.
+
+    ``text`` holds what has been received so far. When the stream finishes,
+    ``on_complete`` receives the full text (the retriever caches it there)
+    and ``on_finish`` the completed timing, cached answers included.
+    """
+
+    def __init__(self, deltas: Iterator[str], sources: List[Dict], matches: List[QueryMatch],
+                 context: Optional[Context], timing: RequestTiming, started: float,
+                 on_complete: Optional[Callable[[str], None]] = None,
+                 on_finish: Optional[Callable[[RequestTiming], None]] = None):
+        self.sources = sources
+        self.matches = matches
+        self.context = context
+        self.timing = timing
+        self._deltas = deltas
+        self._started = started
+        self._on_complete = on_complete
+        self._on_finish = on_finish
+        self._parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def __iter__(self) -> Iterator[str]:
+        generate_started = time.perf_counter()
+        for delta in self._deltas:
+            if not self._parts:
+                self.timing.first_token = time.perf_counter() - self._started
+            self._parts.append(delta)
+            self.timing.chunks += 1
+            yield delta
+        now = time.perf_counter()
+        self.timing.total = now - self._started
+        if not self.timing.cached and self._parts:
+            self.timing.generate = now - generate_started
+            if self._on_complete is not None:
+                self._on_complete(self.text)
+        if self._on_finish is not None:
+            self._on_finish(self.timing)
+
+
+class Answer(NamedTuple):
+    text: Optional[str]  # None when no context was found
+    sources: List[Dict]  # filename, pages, chunks and score of each context piece
+    matches: List[QueryMatch]  # empty for cached answers
+    cached: bool
+    timings: RequestTiming
+    context: Optional[Context] = None  # None for cached answers
+
+
+class Retriever:
+    """Answers questions over one index namespace, reusing its clients across calls.
+
+    The question embedding goes through an ``EmbeddingEngine`` backed by the
+    on-disk ``EmbeddingCache``, so a repeated question is never re-embedded.
+    Answers are kept in an ``AnswerCache``: a question close enough to an
+    earlier one (same namespace and filter) gets the earlier answer without
+    querying the index or calling the chat model.
+
+    When the namespace has a local BM25 index (built by the ingester), each
+    question is also matched lexically, and the two rankings of ``top_k``
+    candidates are fused by reciprocal rank fusion into ``fused_top_k``
+    matches, whose scores are then RRF scores. Exact terms such as "NSDR"
+    that the embedding misses still reach the context.
+
+    Matches whose metadata has no text get it from the local ``ChunkStore``
+    in one lookup, and from the vector store only if it is not there.
+
+    ``dimensions`` must match the collection's: questions are then embedded
+    at that size, or projected with the collection's PCA.
+
+    With a ``Metrics``, every query, answer and stage of ``RequestTiming``
+    is recorded there, labelled with the index and namespace.
+    """
+
+    def __init__(self, index_name: str, namespace: Optional[str] = None,
+                 embedding_model: str = EMBEDDING_MODEL, chat_model: str = CHAT_MODEL,
+                 top_k: int = 20, min_score: float = 0.01, openai_key: Optional[str] = None,
+                 store: Optional[VectorStore] = None, engine: Optional[EmbeddingEngine] = None,
+                 chat_client=None, answer_cache: Optional[AnswerCache] = None,
+                 use_answer_cache: bool = True, max_context_tokens: int = DEFAULT_MAX_TOKENS,
+                 lexical: Optional[LexicalIndex] = None, use_lexical: bool = True, fused_top_k: int = 10,
+                 chunk_store: Optional[ChunkStore] = None, dimensions: Optional[int] = None,
+                 metrics=None):
+        self.index_name = index_name
+        self.namespace = namespace
+        self.chat_model = chat_model
+        self.top_k = top_k
+        self.fused_top_k = fused_top_k
+        self.min_score = min_score
+        self.metrics = metrics
+        self._labels = {"index": index_name, "namespace": namespace or "default"}
+        # Vector matches are filtered by min_score in retrieve; fused scores are on another scale
+        self.context_builder = ContextBuilder(chat_model, max_tokens=max_context_tokens)
+        self._openai_key = openai_key or os.getenv("VITE_OPENAI_API_KEY")
+        self._owns_store = store is None
+        self._owns_engine = engine is None
+        self.store = store or open_vector_store(index_name)
+        self.engine = engine or EmbeddingEngine(
+            model=embedding_model, api_key=self._openai_key, cache=EmbeddingCache(),
+            dimensions=dimensions if supports_dimensions(embedding_model) else None,
+            metrics=metrics
+        )
+        self.reducer = load_reducer(index_name, namespace, self.engine.model, dimensions)
+        self._chat_client = chat_client
+        self._chat_lock = threading.Lock()
+        self._owns_answer_cache = answer_cache is None
+        if answer_cache is None and use_answer_cache:
+            answer_cache = AnswerCache()
+        self.answer_cache = answer_cache
+        if lexical is None and use_lexical:
+            lexical = LexicalIndex.for_target(index_name, namespace)
+        self.lexical = lexical
+        self._owns_chunk_store = chunk_store is None
+        self.chunk_store = chunk_store or ChunkStore()
+        self.chunk_scope = chunk_scope(index_name, namespace)
+
+    @property
+    def chat_client(self):
+        with self._chat_lock:
+            if self._chat_client is None:
+                import openai
+                self._chat_client = openai.OpenAI(api_key=self._openai_key)
+            return self._chat_client
+
+    def embed_many(self, queries: List[str]) -> np.ndarray:
+        vectors = self.engine.embed_array(queries)
+        return self.reducer.transform(vectors) if self.reducer is not None else vectors
+
+    def embed(self, query: str) -> np.ndarray:
+        return self.embed_many([query])[0]
+
+    def retrieve(self, query: str, filter: Optional[Dict] = None,
+                 vector: Optional[np.ndarray] = None) -> List[QueryMatch]:
+        if vector is None:
+            vector = self.embed(query)
+        started = time.perf_counter()
+        matches = self.store.query(
+            vector=vector,
+            top_k=self.top_k,
+            include_metadata=True,
+            namespace=self.namespace,
+            filter=filter
+        )
+        matches = [match for match in matches if match.score > self.min_score]
+        if self.lexical is not None:
+            self.lexical.refresh()
+            if len(self.lexical):
+                lexical_matches = self.lexical.search(query, self.top_k, filter)
+                matches = reciprocal_rank_fusion([matches, lexical_matches], self.fused_top_k)
+        matches = self._hydrate(matches)
+        if self.metrics is not None:
+            self.metrics.observe("query", time.perf_counter() - started, **self._labels)
+        return matches
+
+    def _hydrate(self, matches: List[QueryMatch]) -> List[QueryMatch]:
+        """Fill in the text of matches whose metadata does not carry it."""
+        missing = [match.id for match in matches if "text" not in match.metadata]
+        if not missing:
+            return matches
+        texts = self.chunk_store.get(self.chunk_scope, missing)
+        unknown = [vector_id for vector_id in missing if vector_id not in texts]
+        if unknown:
+            # Indexed from another machine, or before the chunk store existed
+            for vector_id, metadata in self.store.fetch(unknown, self.namespace).items():
+                if "text" in metadata:
+                    texts[vector_id] = metadata["text"]
+        return [match._replace(metadata={**match.metadata, "text": texts[match.id]})
+                if match.id in texts and "text" not in match.metadata else match
+                for match in matches]
+
+    def build_context(self, matches: List[QueryMatch]) -> Context:
+        return self.context_builder.build(matches)
+
+    def _messages(self, query: str, context: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Context: {context}\n\nQuestion: {query}"}
+        ]
+
+    def generate(self, query: str, context: str) -> str:
+        started = time.perf_counter()
+        response = self.chat_client.chat.completions.create(
+            model=self.chat_model,
+            messages=self._messages(query, context),
+            temperature=0.3,  # Lower temperature for more focused responses
+            max_tokens=1000   # Increased for more detailed responses
+        )
+        if self.metrics is not None:
+            self.metrics.observe("generate", time.perf_counter() - started, **self._labels)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self.metrics.count("chat_prompt_tokens", usage.prompt_tokens, model=self.chat_model)
+                self.metrics.count("chat_completion_tokens", usage.completion_tokens, model=self.chat_model)
+        return response.choices[0].message.content
+
+    def stream_generate(self, query: str, context: str) -> Iterator[str]:
+        """Yield the answer's text deltas as the chat model produces them."""
+        stream = self.chat_client.chat.completions.create(
+            model=self.chat_model,
+            messages=self._messages(query, context),
+            temperature=0.3,
+            max_tokens=1000,
+            stream=True
+        )
+        for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+    def _record(self, timing: RequestTiming):
+        """Add a finished answer's stage timings to the metrics (queries are recorded in ``retrieve``)."""
+        if self.metrics is None:
+            return
+        stages = {"query_embed": timing.embed, "answer_cache": timing.answer_cache,
+                  "context": timing.context, "first_token": timing.first_token,
+                  "generate": timing.generate, "answer": timing.total}
+        for stage, seconds in stages.items():
+            if seconds is not None:
+                self.metrics.observe(stage, seconds, **self._labels)
+        self.metrics.count("answers", cached=str(timing.cached).lower(), **self._labels)
+        if timing.context_tokens:
+            self.metrics.count("context_tokens", timing.context_tokens, model=self.chat_model)
+
+    def stream_answer(self, query: str, filter: Optional[Dict] = None,
+                      vector: Optional[np.ndarray] = None) -> "StreamingAnswer":
+        """Retrieve context, then return the answer as an iterator of text deltas.
+
+        Embedding, the answer cache lookup, the index query and context
+        assembly happen here; generation starts when the result is iterated.
+        A ``vector`` embedded by the caller (e.g. batched with other
+        questions) is used as is, and ``timing.embed`` is left to the caller.
+        """
+        timing = RequestTiming()
+        started = time.perf_counter()
+        if vector is None:
+            vector = self.embed(query)
+            timing.embed = time.perf_counter() - started
+
+        if self.answer_cache is not None:
+            mark = time.perf_counter()
+            hit = self.answer_cache.get(self.index_name, self.namespace, filter, vector)
+            timing.answer_cache = time.perf_counter() - mark
+            if hit is not None:
+                timing.cached = True
+                return StreamingAnswer(iter([hit.answer]), hit.sources, [], None, timing, started,
+                                       on_finish=self._record)
+
+        mark = time.perf_counter()
+        matches = self.retrieve(query, filter, vector)
+        timing.query = time.perf_counter() - mark
+
+        mark = time.perf_counter()
+        context = self.build_context(matches)
+        timing.context = time.perf_counter() - mark
+        timing.context_tokens = context.tokens
+        if not context.text:
+            return StreamingAnswer(iter([]), [], matches, context, timing, started, on_finish=self._record)
+
+        sources = [_source(piece) for piece in context.pieces]
+
+        def cache_answer(text: str):
+            if self.answer_cache is not None:
+                self.answer_cache.put(self.index_name, self.namespace, filter, vector, query, text, sources)
+
+        return StreamingAnswer(self.stream_generate(query, context.text), sources, matches, context,
+                               timing, started, on_complete=cache_answer, on_finish=self._record)
+
+    def answer(self, query: str, filter: Optional[Dict] = None) -> Answer:
+        streaming = self.stream_answer(query, filter)
+        text = "".join(streaming) or None
+        return Answer(text, streaming.sources, streaming.matches, streaming.timing.cached,
+                      streaming.timing, streaming.context)
+
+    def close(self):
+        if self._owns_engine:
+            self.engine.close()
+            self.engine.cache.close()
+        if self._owns_answer_cache and self.answer_cache is not None:
+            self.answer_cache.close()
+        if self._owns_chunk_store:
+            self.chunk_store.close()
+        if self._owns_store:
+            self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,72 @@
+import re
+from typing import List, NamedTuple, Optional, Sequence
+
+from rag.extraction import Page
+
+FRONT_MATTER = "front matter"  # title, authors and anything before the first heading
+REFERENCES = "references"
+
+# Canonical section name -> heading wording; a heading is a line of its own,
+# optionally numbered ("2.", "II", "3 ") and followed by a colon
+SECTION_HEADINGS = {
+    "abstract": r"abstract",
+    "introduction": r"introduction|background",
+    "methods": r"methods?|materials and methods|methodology|(?:patients|participants|subjects) and methods",
+    "results": r"results|results and discussion",
+    "discussion": r"discussion|general discussion",
+    "conclusion": r"conclusions?|concluding remarks|practical applications",
+    "acknowledgements": r"acknowledge?ments?",
+    REFERENCES: r"references|bibliography|literature cited|works cited",
+    "back matter": (r"author contributions|conflicts? of interest(?: statement)?|competing interests|"
+                    r"funding(?: information)?|data availability(?: statement)?|ethics statement|"
+                    r"supporting information|supplementary materials?|appendix|orcid"),
+}
+
+_NUMBERING = r"(?:(?:\d+|[ivx]+)\.?\s+)?"
+_HEADINGS = [
+    (name, re.compile(rf"^{_NUMBERING}(?:{pattern})\s*:?$", re.IGNORECASE))
+    for name, pattern in SECTION_HEADINGS.items()
+]
+# Abstracts are often run in: "Abstract Background: ..."
+_RUN_IN_ABSTRACT = re.compile(r"^abstract\b", re.IGNORECASE)
+
+
+class Section(NamedTuple):
+    name: str  # canonical name, one of SECTION_HEADINGS or FRONT_MATTER
+    heading: Optional[str]  # the heading as printed
+    pages: List[Page]  # the part of each page that belongs to the section
+
+
+def heading_section(line: str) -> Optional[str]:
+    """Canonical section name if the line is a section heading."""
+    line = " ".join(line.split())
+    if not line or len(line) > 60:
+        return None
+    for name, pattern in _HEADINGS:
+        if pattern.match(line):
+            return name
+    if _RUN_IN_ABSTRACT.match(line):
+        return "abstract"
+    return None
+
+
+def split_sections(pages: Sequence[Page]) -> List[Section]:
+    """Split a document's pages at section headings, keeping each piece's page number.
+
+    A heading for the section already in progress (a running header, or
+    "Results" repeated on a continuation page) does not start a new one.
+    """
+    sections = [Section(FRONT_MATTER, None, [])]
+    for page in pages:
+        start = offset = 0
+        for line in page.text.splitlines(keepends=True):
+            name = heading_section(line)
+            if name is not None and name != sections[-1].name:
+                if page.text[start:offset].strip():
+                    sections[-1].pages.append(page._replace(text=page.text[start:offset]))
+                sections.append(Section(name, line.strip(), []))
+                start = offset
+            offset += len(line)
+        if page.text[start:].strip():
+            sections[-1].pages.append(page._replace(text=page.text[start:]))
+    return [section for section in sections if section.pages]
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.metrics import Metrics
+from rag.retrieval import Retriever
+
+DEFAULT_WINDOW = 0.005  # seconds a question waits for others to share its embedding request
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_GENERATIONS = 4
+MAX_BODY_BYTES = 1024 * 1024
+
+_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class _Batch:
+    def __init__(self, retriever: Retriever):
+        self.retriever = retriever
+        self.texts: List[str] = []
+        self.futures: List[asyncio.Future] = []
+
+
+class EmbeddingBatcher:
+    """Coalesces questions arriving within ``window`` seconds into one embedding call.
+
+    Questions for retrievers with the same embedding setup (model,
+    dimensions, PCA) share a batch. A batch is embedded once its window has
+    passed or it holds ``max_batch`` questions, with ``embed_many`` on the
+    executor, so the embedding cache and token-budgeted batching still apply.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, window: float = DEFAULT_WINDOW,
+                 max_batch: int = DEFAULT_MAX_BATCH, metrics: Optional[Metrics] = None):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.metrics = metrics
+        self._pending: Dict[tuple, _Batch] = {}
+
+    @staticmethod
+    def _key(retriever: Retriever) -> tuple:
+        return retriever.engine.cache_key, id(retriever.reducer)
+
+    async def embed(self, retriever: Retriever, query: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        key = self._key(retriever)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(retriever)
+            loop.call_later(self.window, self._flush, key, batch)
+        future = loop.create_future()
+        batch.texts.append(query)
+        batch.futures.append(future)
+        if len(batch.texts) >= self.max_batch:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: tuple, batch: _Batch):
+        if self._pending.get(key) is not batch:
+            return  # already sent when it filled up
+        del self._pending[key]
+        if self.metrics is not None:
+            self.metrics.count("query_embed_batches", model=key[0])
+            self.metrics.count("query_embed_questions", len(batch.texts), model=key[0])
+        embedding = asyncio.get_running_loop().run_in_executor(
+            self.executor, batch.retriever.embed_many, batch.texts
+        )
+
+        def settle(done: asyncio.Future):
+            error = done.exception()
+            for i, future in enumerate(batch.futures):
+                if future.done():
+                    continue  # the request went away
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(done.result()[i])
+
+        embedding.add_done_callback(settle)
+
+
+class QueryService:
+    """Answers questions from one long-lived process over pooled, warm clients.
+
+    Retrievers are built once per namespace by ``make_retriever`` and kept,
+    so the OpenAI and vector store clients (and their keep-alive
+    connections) and the caches are reused by every request. Questions are
+    embedded in micro-batches by an ``EmbeddingBatcher``, index queries run
+    on a thread pool, and at most ``max_generations`` chat completions are
+    in flight; the others wait their turn instead of piling onto the rate
+    limit. Cached answers skip that queue.
+
+    ``serve`` speaks just enough HTTP/1.1 (keep-alive, JSON bodies) for the
+    front end's API route to forward to it:
+
+    - ``POST /query`` ``{"query", "namespace"?, "filter"?}`` returns ``{"matches"}``
+    - ``POST /answer`` (same body) returns the answer, its sources and timing
+    - ``GET /health`` and ``GET /metrics`` (Prometheus text)
+    """
+
+    def __init__(self, make_retriever: Callable[[str], Retriever], default_namespace: str = "research-papers",
+                 window: float = DEFAULT_WINDOW, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_generations: int = DEFAULT_MAX_GENERATIONS, max_workers: int = 32,
+                 metrics: Optional[Metrics] = None):
+        self.make_retriever = make_retriever
+        self.default_namespace = default_namespace
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._retrievers: Dict[str, Retriever] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        self.batcher = EmbeddingBatcher(self._executor, window, max_batch, self.metrics)
+        self._generations = asyncio.Semaphore(max_generations)
+
+    def retriever(self, namespace: Optional[str] = None) -> Retriever:
+        namespace = namespace or self.default_namespace
+        with self._lock:
+            if namespace not in self._retrievers:
+                self._retrievers[namespace] = self.make_retriever(namespace)
+            return self._retrievers[namespace]
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def query(self, query: str, namespace: Optional[str] = None,
+                    filter: Optional[Dict] = None) -> List[Dict]:
+        retriever = await self._run(self.retriever, namespace)
+        vector = await self.batcher.embed(retriever, query)
+        matches = await self._run(retriever.retrieve, query, filter, vector)
+        return [{"id": match.id, "score": float(match.score), "metadata": match.metadata}
+                for match in matches]
+
+    async def answer(self, query: str, namespace: Optional[str] = None,
+                     filter: Optional[Dict] = None) -> Dict:
+        retriever = await self._run(self.retriever, namespace)
+        started = time.perf_counter()
+        vector = await self.batcher.embed(retriever, query)
+        embedded = time.perf_counter() - started
+        streaming = await self._run(retriever.stream_answer, query, filter, vector)
+        streaming.timing.embed = embedded
+        if streaming.timing.cached or streaming.context is None or not streaming.context.text:
+            text = "".join(streaming)  # nothing left to generate
+        else:
+            queued = time.perf_counter()
+            async with self._generations:
+                self.metrics.observe("generate_queue", time.perf_counter() - queued)
+                text = await self._run("".join, streaming)
+        return {
+            "answer": text or None,
+            "sources": streaming.sources,
+            "cached": streaming.timing.cached,
+            "timing": {**streaming.timing.as_dict(),
+                       "request_ms": round((time.perf_counter() - started) * 1000, 1)},
+        }
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, str, bytes]:
+        """Route one request; returns the status, content type and body."""
+        path = path.split("?")[0].rstrip("/") or "/"
+        if method == "OPTIONS":
+            return 204, "text/plain", b""
+        if path == "/health":
+            return 200, "application/json", b'{"status": "ok"}'
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.metrics.prometheus().encode("utf-8")
+        if path not in ("/query", "/answer"):
+            return 404, "application/json", json.dumps({"error": f"Unknown path {path}"}).encode("utf-8")
+        if method != "POST":
+            return 405, "application/json", b'{"error": "Use POST"}'
+        try:
+            payload = json.loads(body or b"{}")
+            query = payload["query"]
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError("query must be a non-empty string")
+        except (ValueError, KeyError, TypeError) as e:
+            error = {"error": "Failed to parse request body", "details": str(e)}
+            return 400, "application/json", json.dumps(error).encode("utf-8")
+
+        started = time.perf_counter()
+        try:
+            if path == "/query":
+                result = {"matches": await self.query(query, payload.get("namespace"), payload.get("filter"))}
+            else:
+                result = await self.answer(query, payload.get("namespace"), payload.get("filter"))
+        except Exception as e:
+            self.metrics.count("requests", endpoint=path, status="error")
+            error = {"error": str(e), "type": type(e).__name__}
+            return 500, "application/json", json.dumps(error).encode("utf-8")
+        self.metrics.observe("request", time.perf_counter() - started, endpoint=path)
+        self.metrics.count("requests", endpoint=path, status="ok")
+        return 200, "application/json", json.dumps(result).encode("utf-8")
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, content_type, body = 413, "application/json", b'{"error": "Request too large"}'
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, content_type, body = await self.handle(method.upper(), path, body)
+                    keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+                writer.write((
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Cache-Control: no-store\r\n"
+                    "Access-Control-Allow-Origin: *\r\n"
+                    "Access-Control-Allow-Headers: Content-Type\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                ).encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # the client went away or sent something that isn't HTTP
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        """Serve until cancelled."""
+        server = await asyncio.start_server(self._connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for retriever in self._retrievers.values():
+            retriever.close()
+        self._retrievers.clear()
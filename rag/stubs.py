@@ -0,0 +1,201 @@
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag.compression import truncate
+from rag.vector_batch import VectorBatch
+from rag.vector_store import QueryMatch, VectorStore
+
+
+class FakeRateLimitError(Exception):
+    """Shaped like openai.RateLimitError: status 429 with a retry-after-ms header."""
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached, retry after {retry_after:.3f}s")
+        self.response = SimpleNamespace(headers={"retry-after-ms": str(int(retry_after * 1000))})
+
+
+class TokenBucket:
+    """Allows ``rate`` units per second with bursts of up to one second's worth."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.level = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount: float) -> float:
+        """Take ``amount`` units; returns 0, or the seconds to wait if there are too few."""
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.rate, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.level >= amount or amount > self.rate:
+                self.level -= amount
+                return 0.0
+            return (amount - self.level) / self.rate
+
+
+def fake_embedding(text: str, dimension: int) -> np.ndarray:
+    """Deterministic unit vector seeded by the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _FakeEmbeddings:
+    def __init__(self, client: "FakeEmbeddingClient"):
+        self._client = client
+
+    def create(self, model: str, input: Sequence[str], dimensions: Optional[int] = None, **kwargs):
+        return self._client.create(model, input, dimensions)
+
+
+class FakeEmbeddingClient:
+    """Stands in for ``openai.OpenAI`` in ``EmbeddingEngine(client=...)``.
+
+    Each request sleeps ``latency`` plus ``latency_per_token`` per estimated
+    token, and requests beyond ``requests_per_second`` or
+    ``tokens_per_second`` raise ``FakeRateLimitError``. Vectors depend only
+    on the text, so repeated runs embed identically.
+    """
+
+    def __init__(self, dimension: int = 1536, latency: float = 0.05,
+                 latency_per_token: float = 0.0, requests_per_second: Optional[float] = None,
+                 tokens_per_second: Optional[float] = None):
+        self.dimension = dimension
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.embeddings = _FakeEmbeddings(self)
+        self._requests = TokenBucket(requests_per_second) if requests_per_second else None
+        self._tokens = TokenBucket(tokens_per_second) if tokens_per_second else None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "inputs": 0, "tokens": 0, "rate_limited": 0}
+        self.latencies: List[float] = []
+
+    def create(self, model: str, input: Sequence[str], dimensions: Optional[int] = None):
+        started = time.perf_counter()
+        tokens = sum(len(text) // 4 + 1 for text in input)
+        for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+            wait = bucket.take(amount) if bucket else 0.0
+            if wait:
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                raise FakeRateLimitError(wait)
+        time.sleep(self.latency + self.latency_per_token * tokens)
+        vectors = [fake_embedding(text, self.dimension) for text in input]
+        if dimensions:
+            # Shortened like the real API: leading values, renormalized
+            vectors = [truncate(vector, dimensions) for vector in vectors]
+        data = [SimpleNamespace(index=i, embedding=vector) for i, vector in enumerate(vectors)]
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["inputs"] += len(input)
+            self.stats["tokens"] += tokens
+            self.latencies.append(time.perf_counter() - started)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(total_tokens=tokens))
+
+
+class _FakeCompletions:
+    def __init__(self, client: "FakeChatClient"):
+        self._client = client
+
+    def create(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        return self._client.create(model, messages, stream)
+
+
+class FakeChatClient:
+    """Stands in for ``openai.OpenAI`` as a ``Retriever``'s ``chat_client``.
+
+    Each completion sleeps ``latency`` and answers by repeating the
+    question; with ``stream=True`` the answer comes word by word.
+    ``max_inflight`` is the most completions ever running at once.
+    """
+
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0}
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def create(self, model: str, messages: List[Dict], stream: bool = False):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+        question = messages[-1]["content"].rsplit("Question: ", 1)[-1]
+        text = f"Stand-in answer to: {question}"
+        if stream:
+            words = text.split(" ")
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+                         for word in words[:1] + [" " + word for word in words[1:]]])
+        prompt_tokens = sum(len(message["content"]) // 4 + 1 for message in messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                               usage=SimpleNamespace(prompt_tokens=prompt_tokens,
+                                                     completion_tokens=len(text) // 4 + 1))
+
+
+class FakeVectorStore(VectorStore):
+    """In-memory VectorStore that sleeps ``latency`` per request.
+
+    Only IDs and metadata are kept, so large benchmarks don't measure the
+    stand-in's own memory. Queries return no matches.
+    """
+
+    def __init__(self, latency: float = 0.02, latency_per_vector: float = 0.0):
+        self.latency = latency
+        self.latency_per_vector = latency_per_vector
+        self.records: Dict[Optional[str], Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+        self.stats_counts = {"upsert_requests": 0, "vectors": 0, "delete_requests": 0}
+        self.latencies: List[float] = []
+
+    def upsert(self, batch: VectorBatch, namespace: Optional[str] = None):
+        started = time.perf_counter()
+        time.sleep(self.latency + self.latency_per_vector * len(batch))
+        with self._lock:
+            records = self.records.setdefault(namespace, {})
+            for vector_id, metadata in zip(batch.ids, batch.metadata):
+                records[vector_id] = metadata
+            self.stats_counts["upsert_requests"] += 1
+            self.stats_counts["vectors"] += len(batch)
+            self.latencies.append(time.perf_counter() - started)
+
+    def query(self, vector, top_k=10, namespace=None, filter=None, include_metadata=True) -> List[QueryMatch]:
+        time.sleep(self.latency)
+        return []
+
+    def delete(self, ids=None, namespace=None, filter=None, delete_all=False):
+        time.sleep(self.latency)
+        with self._lock:
+            self.stats_counts["delete_requests"] += 1
+            records = self.records.get(namespace, {})
+            if delete_all:
+                records.clear()
+            for vector_id in ids or []:
+                records.pop(vector_id, None)
+
+    def fetch(self, ids, namespace=None) -> Dict[str, Dict]:
+        time.sleep(self.latency)
+        with self._lock:
+            records = self.records.get(namespace, {})
+            return {i: dict(records[i]) for i in ids if i in records}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "namespaces": {ns or "": {"vector_count": len(r)} for ns, r in self.records.items()},
+                **self.stats_counts,
+            }
@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from rag.embeddings import backoff_delay, is_rate_limit_error, is_retryable_error
+from rag.vector_batch import VectorBatch
+from rag.vector_store import vector_store_backend
+
+DEAD_LETTER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "dead-letter"
+)
+
+# Pinecone request limits
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+MAX_REQUEST_VECTORS = 1000
+
+# JSON size of one float32 value as sent over the wire ("-0.0123456789...", )
+BYTES_PER_VALUE = 20
+BYTES_PER_RECORD = 64  # braces, keys and separators around id/values/metadata
+
+
+class UpsertResult(NamedTuple):
+    upserted: List[str]
+    failed: List[str]
+
+
+def payload_sizes(batch: VectorBatch, text_field: Optional[str] = "text") -> np.ndarray:
+    """Estimated request bytes of each record, metadata and chunk text included."""
+    sizes = np.empty(len(batch), dtype=np.int64)
+    vector_bytes = batch.dimension * BYTES_PER_VALUE if len(batch) else 0
+    for i, vector_id in enumerate(batch.ids):
+        metadata_bytes = len(json.dumps(batch.metadata[i]).encode("utf-8"))
+        if text_field and batch.texts is not None:
+            metadata_bytes += len(json.dumps(batch.texts[i]).encode("utf-8")) + len(text_field) + 4
+        sizes[i] = BYTES_PER_RECORD + len(vector_id) + vector_bytes + metadata_bytes
+    return sizes
+
+
+def split_by_payload(batch: VectorBatch, max_bytes: int = MAX_REQUEST_BYTES,
+                     max_vectors: int = MAX_REQUEST_VECTORS) -> List[VectorBatch]:
+    """Split a batch into consecutive parts that fit one upsert request each."""
+    parts = []
+    start = 0
+    total = 0
+    for i, size in enumerate(payload_sizes(batch)):
+        if i > start and (total + size > max_bytes or i - start >= max_vectors):
+            parts.append(batch[start:i])
+            start = i
+            total = 0
+        total += int(size)
+    if start < len(batch):
+        parts.append(batch[start:] if start else batch)
+    return parts
+
+
+def dead_letter_path(index_name: str, namespace: Optional[str] = None,
+                     backend: Optional[str] = None, directory: Optional[str] = None) -> str:
+    name = f"{index_name}--{namespace or 'default'}"
+    backend = backend or vector_store_backend()
+    if backend != "pinecone":
+        name = f"{backend}--{name}"
+    return os.path.join(directory or DEAD_LETTER_DIR, re.sub(r"[^\w.-]", "_", name) + ".jsonl")
+
+
+class Upserter:
+    """Concurrent upserts into a VectorStore with retries and a dead-letter file.
+
+    ``submit`` splits a batch into requests sized by payload bytes and runs
+    them on a pool so that up to ``max_inflight`` requests are in flight over
+    the store's shared client; it blocks once twice that many are queued.
+    Transient errors (429/5xx/connection) are retried with jittered
+    exponential backoff. A request rejected outright is bisected to isolate
+    the offending vectors, and vectors that still fail are appended to the
+    dead-letter JSON-lines file for ``replay_dead_letters``.
+
+    Upserters for several namespaces can share one ``executor``; each still
+    queues at most ``2 * max_inflight`` of its own requests. With
+    ``include_text=False`` chunk text is left out of the vector metadata (it
+    is kept in the ``ChunkStore`` instead). With a ``Metrics``, the counts
+    in ``stats`` and each request's latency are recorded there too.
+    """
+
+    def __init__(self, store, namespace: Optional[str] = None, max_inflight: int = 4,
+                 max_request_bytes: int = MAX_REQUEST_BYTES, max_retries: int = 5,
+                 dead_letter: Optional[str] = None, executor: Optional[Executor] = None,
+                 include_text: bool = True, metrics=None):
+        self.store = store
+        self.namespace = namespace
+        self.include_text = include_text
+        self.metrics = metrics
+        self.max_request_bytes = max_request_bytes
+        self.max_retries = max_retries
+        self.dead_letter = dead_letter
+        self._owns_pool = executor is None
+        self._pool = executor or ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="upsert")
+        self._slots = threading.BoundedSemaphore(max_inflight * 2)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "upserted": 0, "dead_lettered": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+        if self.metrics is not None:
+            name = "upsert_vectors" if key == "upserted" else f"upsert_{key}"
+            self.metrics.count(name, amount, namespace=self.namespace or "default")
+
+    def _send(self, batch: VectorBatch) -> Optional[Exception]:
+        """Upsert one request, retrying transient errors; returns the final error, if any."""
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                self._count("requests")
+                self.store.upsert(batch, self.namespace)
+                if self.metrics is not None:
+                    self.metrics.observe("upsert_request", time.perf_counter() - started,
+                                         namespace=self.namespace or "default")
+                self._count("upserted", len(batch))
+                return None
+            except Exception as e:
+                if self.metrics is not None and is_rate_limit_error(e):
+                    self.metrics.count("upsert_rate_limited", namespace=self.namespace or "default")
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    return e
+                self._count("retries")
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    def _upsert_part(self, batch: VectorBatch) -> UpsertResult:
+        error = self._send(batch)
+        if error is None:
+            return UpsertResult(list(batch.ids), [])
+        if len(batch) > 1 and not is_retryable_error(error):
+            # The request was rejected; bisect to find the vectors responsible
+            middle = len(batch) // 2
+            left = self._upsert_part(batch[:middle])
+            right = self._upsert_part(batch[middle:])
+            return UpsertResult(left.upserted + right.upserted, left.failed + right.failed)
+        print(f"Upsert of {len(batch)} vectors failed: {str(error)}")
+        self._write_dead_letter(batch, error)
+        return UpsertResult([], list(batch.ids))
+
+    def _write_dead_letter(self, batch: VectorBatch, error: Exception):
+        self._count("dead_lettered", len(batch))
+        if not self.dead_letter:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter)), exist_ok=True)
+            with open(self.dead_letter, "a") as f:
+                for i, vector_id in enumerate(batch.ids):
+                    f.write(json.dumps({
+                        "namespace": self.namespace,
+                        "id": vector_id,
+                        "values": batch.vectors[i].tolist(),
+                        "metadata": batch.metadata[i],
+                        "text": batch.texts[i] if batch.texts is not None else None,
+                        "error": str(error),
+                    }) + "\n")
+
+    def _run(self, batch: VectorBatch) -> UpsertResult:
+        try:
+            return self._upsert_part(batch)
+        finally:
+            self._slots.release()
+
+    def submit(self, batch: VectorBatch) -> "Future[UpsertResult]":
+        if not self.include_text:
+            batch = VectorBatch(batch.ids, batch.vectors, batch.metadata)
+        parts = split_by_payload(batch, self.max_request_bytes)
+        futures = []
+        for part in parts:
+            self._slots.acquire()
+            futures.append(self._pool.submit(self._run, part))
+        return _gather(futures)
+
+    def __call__(self, batch: VectorBatch) -> UpsertResult:
+        return self.submit(batch).result()
+
+    def close(self):
+        if self._owns_pool:
+            self._pool.shutdown(wait=True)
+
+
+def _gather(futures: List[Future]) -> Future:
+    """Combine part futures into one future of the merged UpsertResult."""
+    combined: Future = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            results = [future.result() for future in futures]
+        except Exception as e:
+            combined.set_exception(e)
+            return
+        combined.set_result(UpsertResult(
+            [i for result in results for i in result.upserted],
+            [i for result in results for i in result.failed]
+        ))
+
+    if not futures:
+        combined.set_result(UpsertResult([], []))
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+def read_dead_letters(path: str) -> List[Tuple[Optional[str], VectorBatch]]:
+    """Load a dead-letter file as one VectorBatch per namespace."""
+    groups = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                groups.setdefault(record["namespace"], []).append(record)
+    batches = []
+    for namespace, records in groups.items():
+        texts = [r["text"] for r in records]
+        batches.append((namespace, VectorBatch(
+            [r["id"] for r in records],
+            np.array([r["values"] for r in records], dtype=np.float32),
+            [r["metadata"] for r in records],
+            texts if all(t is not None for t in texts) else None
+        )))
+    return batches
+
+
+def replay_dead_letters(store, path: str, metrics=None) -> UpsertResult:
+    """Re-upsert dead-lettered vectors; those that fail again stay in the file."""
+    if not os.path.exists(path):
+        return UpsertResult([], [])
+    retry_path = path + ".retry"
+    os.replace(path, retry_path)
+    upserted, failed = [], []
+    for namespace, batch in read_dead_letters(retry_path):
+        upserter = Upserter(store, namespace, dead_letter=path, metrics=metrics)
+        result = upserter(batch)
+        upserter.close()
+        upserted += result.upserted
+        failed += result.failed
+    os.remove(retry_path)
+    return UpsertResult(upserted, failed)
@@ -0,0 +1,87 @@
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class VectorBatch:
+    """Columnar batch of vectors: a float32 matrix plus parallel ID/metadata/text columns.
+
+    Embeddings stay in one contiguous ``np.float32`` array (4 bytes per value
+    instead of a boxed Python float each) and chunk text is kept in its own
+    column rather than copied into every metadata dict. The per-vector dicts
+    Pinecone expects are only built by ``to_pinecone`` at upsert time.
+    """
+
+    def __init__(self, ids: Sequence[str], vectors: np.ndarray,
+                 metadata: Optional[Sequence[Dict]] = None,
+                 texts: Optional[Sequence[str]] = None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"Expected a ({len(ids)}, dim) matrix, got shape {vectors.shape}")
+        self.ids = list(ids)
+        self.vectors = vectors
+        self.metadata = list(metadata) if metadata is not None else [{} for _ in self.ids]
+        self.texts = list(texts) if texts is not None else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+    def __getitem__(self, index) -> "VectorBatch":
+        """Slice rows, e.g. ``batch[10:20]`` or ``batch[[0, 3, 5]]``."""
+        if isinstance(index, slice):
+            rows = range(len(self))[index]
+        else:
+            rows = list(index)
+        rows = list(rows)
+        return VectorBatch(
+            [self.ids[i] for i in rows],
+            self.vectors[rows],
+            [self.metadata[i] for i in rows],
+            [self.texts[i] for i in rows] if self.texts is not None else None
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["VectorBatch"]) -> "VectorBatch":
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        has_texts = all(batch.texts is not None for batch in batches)
+        return cls(
+            [i for batch in batches for i in batch.ids],
+            np.concatenate([batch.vectors for batch in batches]),
+            [m for batch in batches for m in batch.metadata],
+            [t for batch in batches for t in batch.texts] if has_texts else None
+        )
+
+    def to_pinecone(self, text_field: Optional[str] = "text") -> List[Dict]:
+        """Wire format for ``index.upsert``; chunk text goes into ``text_field`` if set."""
+        records = []
+        values = self.vectors.tolist()
+        for i, vector_id in enumerate(self.ids):
+            metadata = dict(self.metadata[i])
+            if text_field and self.texts is not None:
+                metadata[text_field] = self.texts[i]
+            records.append({"id": vector_id, "values": values[i], "metadata": metadata})
+        return records
+
+    def save(self, prefix: str):
+        """Write ``<prefix>.npy`` and ``<prefix>.json`` so the batch can be reloaded for a retry."""
+        np.save(prefix + ".npy", self.vectors)
+        with open(prefix + ".json", "w") as f:
+            json.dump({"ids": self.ids, "metadata": self.metadata, "texts": self.texts}, f)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> "VectorBatch":
+        vectors = np.load(prefix + ".npy", mmap_mode="r" if mmap else None)
+        with open(prefix + ".json") as f:
+            columns = json.load(f)
+        return cls(columns["ids"], vectors, columns["metadata"], columns["texts"])
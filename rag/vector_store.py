@@ -0,0 +1,453 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from rag.compression import QUANTIZATIONS, binary_scores, int8_scores, quantize_binary, quantize_int8
+from rag.vector_batch import VectorBatch
+
+LOCAL_STORE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "vector-store"
+)
+DEFAULT_NAMESPACE = ""
+DELETE_BATCH_SIZE = 1000  # Pinecone delete-by-ID limit
+FETCH_BATCH_SIZE = 1000
+POOL_THREADS = 8  # HTTP connections per index client
+
+
+class QueryMatch(NamedTuple):
+    """One query result; same attributes as a Pinecone match."""
+    id: str
+    score: float
+    metadata: Dict
+
+
+class VectorStore:
+    """Interface the indexers and query scripts use to talk to a vector index."""
+
+    # True when upserts and deletes only reach disk on ``flush`` (LocalVectorStore)
+    buffered = False
+
+    def upsert(self, batch: VectorBatch, namespace: Optional[str] = None):
+        raise NotImplementedError
+
+    def query(self, vector: Sequence[float], top_k: int = 10, namespace: Optional[str] = None,
+              filter: Optional[Dict] = None, include_metadata: bool = True) -> List[QueryMatch]:
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[Iterable[str]] = None, namespace: Optional[str] = None,
+               filter: Optional[Dict] = None, delete_all: bool = False):
+        raise NotImplementedError
+
+    def fetch(self, ids: Sequence[str], namespace: Optional[str] = None) -> Dict[str, Dict]:
+        """Metadata of the given vector IDs; IDs that don't exist are left out."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist the upserts and deletes made so far; a no-op for stores that write through."""
+
+    def close(self):
+        pass
+
+
+class PineconeStore(VectorStore):
+    """VectorStore backed by a Pinecone index."""
+
+    def __init__(self, index_name: str, api_key: Optional[str] = None, index=None):
+        if index is None:
+            from pinecone import Pinecone
+            pc = Pinecone(api_key=api_key or os.getenv("VITE_PINECONE_API_KEY"))
+            # Size the HTTP connection pool for concurrent upserts (see rag.upsert)
+            index = pc.Index(index_name, pool_threads=POOL_THREADS)
+        self.index_name = index_name
+        self.index = index
+
+    def upsert(self, batch: VectorBatch, namespace: Optional[str] = None):
+        kwargs = {"namespace": namespace} if namespace else {}
+        self.index.upsert(vectors=batch.to_pinecone(), **kwargs)
+
+    def query(self, vector, top_k=10, namespace=None, filter=None, include_metadata=True):
+        kwargs = {"namespace": namespace} if namespace else {}
+        if filter:
+            kwargs["filter"] = filter
+        response = self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            **kwargs
+        )
+        return [QueryMatch(m.id, m.score, m.metadata or {}) for m in response.matches]
+
+    def delete(self, ids=None, namespace=None, filter=None, delete_all=False):
+        kwargs = {"namespace": namespace} if namespace else {}
+        if delete_all:
+            self.index.delete(delete_all=True, **kwargs)
+        elif filter:
+            self.index.delete(filter=filter, **kwargs)
+        elif ids:
+            ids = list(ids)
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                self.index.delete(ids=ids[i:i + DELETE_BATCH_SIZE], **kwargs)
+
+    def fetch(self, ids, namespace=None):
+        kwargs = {"namespace": namespace} if namespace else {}
+        found = {}
+        ids = list(ids)
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            response = self.index.fetch(ids=ids[i:i + FETCH_BATCH_SIZE], **kwargs)
+            for vector_id, vector in response.vectors.items():
+                found[vector_id] = dict(vector.metadata or {})
+        return found
+
+    def stats(self) -> Dict:
+        stats = self.index.describe_index_stats()
+        return stats.to_dict() if hasattr(stats, "to_dict") else dict(stats)
+
+
+def _compare(op: str, value: Any, expected: Any) -> bool:
+    if op == "$eq":
+        return value == expected
+    if op == "$ne":
+        return value != expected
+    if op == "$in":
+        return value in expected
+    if op == "$nin":
+        return value not in expected
+    if op == "$exists":
+        return (value is not None) == expected
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > expected
+    if op == "$gte":
+        return value >= expected
+    if op == "$lt":
+        return value < expected
+    if op == "$lte":
+        return value <= expected
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one metadata dict."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(op, value, expected) for op, expected in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class _Namespace:
+    """Vectors of one namespace: a matrix plus ids/metadata and a tombstone mask.
+
+    The matrix holds float32 values, or with ``quantization`` int8 codes
+    (with a scale per row in ``scales``) or packed sign bits.
+    """
+
+    def __init__(self, vectors: Optional[np.ndarray] = None, ids: Optional[List[str]] = None,
+                 metadata: Optional[List[Dict]] = None, quantization: Optional[str] = None,
+                 dimension: Optional[int] = None, scales: Optional[np.ndarray] = None):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.vectors = vectors  # may be a read-only memmap until the first write
+        self.quantization = quantization
+        self.scales = scales
+        self.dimension = dimension or (vectors.shape[1] if vectors is not None and quantization is None else None)
+        self.size = len(ids) if ids else 0
+        self.ids: List[str] = ids or []
+        self.metadata: List[Dict] = metadata or []
+        self.alive = np.ones(self.size, dtype=bool)
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.dirty = False
+        self._eq_index: Dict[str, Dict[Any, List[int]]] = {}
+
+    def _reserve(self, count: int, dimension: int):
+        needed = self.size + count
+        if self.quantization == "binary":
+            width, dtype = (dimension + 7) // 8, np.uint8
+        else:
+            width, dtype = dimension, np.int8 if self.quantization == "int8" else np.float32
+        if self.vectors is None or self.size == 0:
+            self.vectors = np.zeros((max(needed, 1024), width), dtype=dtype)
+            self.dimension = dimension
+        elif self.dimension != dimension:
+            raise ValueError(f"Dimension mismatch: index has {self.dimension}, got {dimension}")
+        elif needed > len(self.vectors) or not self.vectors.flags.writeable:
+            # Grow geometrically (and copy a read-only memmap into memory)
+            grown = np.zeros((max(needed, 2 * len(self.vectors)), width), dtype=dtype)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+        if self.quantization == "int8" and (self.scales is None or needed > len(self.scales)
+                                            or not self.scales.flags.writeable):
+            scales = np.ones(max(needed, len(self.vectors)), dtype=np.float32)
+            if self.scales is not None:
+                scales[:self.size] = self.scales[:self.size]
+            self.scales = scales
+        if needed > len(self.alive):
+            alive = np.zeros(max(needed, 2 * len(self.alive)), dtype=bool)
+            alive[:self.size] = self.alive[:self.size]
+            self.alive = alive
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, metadata: List[Dict]):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)  # cosine similarity == dot product
+        self._reserve(len(ids), vectors.shape[1])
+        scales = None
+        if self.quantization == "int8":
+            vectors, scales = quantize_int8(vectors)
+        elif self.quantization == "binary":
+            vectors = quantize_binary(vectors)
+        for i, (vector_id, vector, meta) in enumerate(zip(ids, vectors, metadata)):
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.rows[vector_id] = row
+                self.ids.append(vector_id)
+                self.metadata.append(meta)
+            else:
+                self.metadata[row] = meta
+            self.vectors[row] = vector
+            if scales is not None:
+                self.scales[row] = scales[i]
+            self.alive[row] = True
+        self._eq_index.clear()
+        self.dirty = True
+
+    def delete_rows(self, rows: Iterable[int]):
+        for row in rows:
+            if self.alive[row]:
+                self.alive[row] = False
+                del self.rows[self.ids[row]]
+        self._eq_index.clear()
+        self.dirty = True
+
+    def _rows_equal(self, key: str, value: Any) -> List[int]:
+        index = self._eq_index.get(key)
+        if index is None:
+            index = {}
+            for row in range(self.size):
+                if self.alive[row]:
+                    field = self.metadata[row].get(key)
+                    if isinstance(field, (str, int, float, bool)):
+                        index.setdefault(field, []).append(row)
+            self._eq_index[key] = index
+        return index.get(value, [])
+
+    def candidate_rows(self, filter: Optional[Dict]) -> np.ndarray:
+        """Rows matching the filter; single-field $eq/$in filters use a value index."""
+        if not filter:
+            return np.flatnonzero(self.alive[:self.size])
+        if len(filter) == 1:
+            (key, condition), = filter.items()
+            if not key.startswith("$"):
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                if list(condition) == ["$eq"]:
+                    return np.array(self._rows_equal(key, condition["$eq"]), dtype=np.int64)
+                if list(condition) == ["$in"]:
+                    rows = [r for value in condition["$in"] for r in self._rows_equal(key, value)]
+                    return np.array(sorted(rows), dtype=np.int64)
+        return np.array([
+            row for row in range(self.size)
+            if self.alive[row] and matches_filter(self.metadata[row], filter)
+        ], dtype=np.int64)
+
+    def scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity (estimated, when quantized) of a unit query to the given rows."""
+        if self.quantization == "int8":
+            return int8_scores(self.vectors[rows], self.scales[rows], query)
+        if self.quantization == "binary":
+            return binary_scores(self.vectors[rows], query, self.dimension)
+        return self.vectors[rows] @ query
+
+    def compacted(self):
+        live = np.flatnonzero(self.alive[:self.size])
+        vectors = self.vectors[live] if self.vectors is not None else np.zeros((0, 0), np.float32)
+        scales = self.scales[live] if self.scales is not None else None
+        return vectors, scales, [self.ids[r] for r in live], [self.metadata[r] for r in live]
+
+
+class LocalVectorStore(VectorStore):
+    """In-process exact-search vector store persisted as memory-mapped numpy files.
+
+    Each namespace lives in ``<directory>/<namespace>/`` as ``vectors.npy``
+    (unit-normalized float32, memory-mapped on load) and ``records.json``.
+    Queries are a single matrix-vector product over the rows that pass the
+    metadata filter, which supports the Pinecone operators ($eq, $ne, $in,
+    $nin, $gt, $gte, $lt, $lte, $exists, $and, $or). Scores are cosine
+    similarities, like a cosine Pinecone index.
+
+    With ``quantization`` new namespaces store int8 codes (a quarter of the
+    memory and nearly the same ranking, but slower to scan) or sign bits
+    (1/32 of the memory and faster to scan, with scores estimated from
+    Hamming distance, so recall drops); ``scripts/evaluate_compression.py``
+    measures both on a collection. Existing namespaces keep the format they
+    were written in.
+
+    Changes are held in memory until ``flush`` (or ``close``), which
+    rewrites each changed namespace.
+    """
+
+    buffered = True
+
+    def __init__(self, directory: str = LOCAL_STORE_DIR, index_name: str = "default",
+                 quantization: Optional[str] = None):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.index_name = index_name
+        self.quantization = quantization
+        self.directory = os.path.join(directory, index_name)
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.directory, namespace or "__default__")
+
+    def _namespace(self, namespace: Optional[str]) -> _Namespace:
+        namespace = namespace or DEFAULT_NAMESPACE
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            path = self._path(namespace)
+            if os.path.exists(os.path.join(path, "records.json")):
+                with open(os.path.join(path, "records.json")) as f:
+                    records = json.load(f)
+                vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+                quantization = records.get("quantization")
+                scales = (np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+                          if quantization == "int8" else None)
+                ns = _Namespace(vectors, records["ids"], records["metadata"], quantization,
+                                records.get("dimension"), scales)
+            else:
+                ns = _Namespace(quantization=self.quantization)
+            self._namespaces[namespace] = ns
+        return ns
+
+    def upsert(self, batch: VectorBatch, namespace=None):
+        records = batch.to_pinecone()
+        with self._lock:
+            self._namespace(namespace).upsert(
+                batch.ids, np.asarray(batch.vectors, dtype=np.float32),
+                [record["metadata"] for record in records]
+            )
+
+    def query(self, vector, top_k=10, namespace=None, filter=None, include_metadata=True):
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self._lock:
+            ns = self._namespace(namespace)
+            rows = ns.candidate_rows(filter)
+            if ns.vectors is None or not len(rows):
+                return []
+            scores = ns.scores(rows, query)
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                QueryMatch(
+                    ns.ids[rows[i]],
+                    float(scores[i]),
+                    dict(ns.metadata[rows[i]]) if include_metadata else {}
+                )
+                for i in top
+            ]
+
+    def delete(self, ids=None, namespace=None, filter=None, delete_all=False):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if delete_all:
+                ns = _Namespace(quantization=ns.quantization)
+                ns.dirty = True
+                self._namespaces[namespace or DEFAULT_NAMESPACE] = ns
+            elif filter:
+                ns.delete_rows(ns.candidate_rows(filter).tolist())
+            elif ids:
+                ns.delete_rows([ns.rows[i] for i in ids if i in ns.rows])
+
+    def fetch(self, ids, namespace=None):
+        with self._lock:
+            ns = self._namespace(namespace)
+            return {i: dict(ns.metadata[ns.rows[i]]) for i in ids if i in ns.rows}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    self._namespace("" if name == "__default__" else name)
+            namespaces = {
+                name: {"vector_count": int(ns.alive[:ns.size].sum())}
+                for name, ns in self._namespaces.items()
+            }
+            dimension = next(
+                (ns.dimension for ns in self._namespaces.values() if ns.dimension), 0
+            )
+        return {
+            "dimension": dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+        }
+
+    def flush(self):
+        """Write changed namespaces to disk."""
+        with self._lock:
+            for name, ns in self._namespaces.items():
+                if not ns.dirty:
+                    continue
+                path = self._path(name)
+                os.makedirs(path, exist_ok=True)
+                vectors, scales, ids, metadata = ns.compacted()
+                np.save(os.path.join(path, "vectors.npy.tmp.npy"), vectors)
+                if scales is not None:
+                    np.save(os.path.join(path, "scales.npy.tmp.npy"), scales)
+                with open(os.path.join(path, "records.json.tmp"), "w") as f:
+                    json.dump({"ids": ids, "metadata": metadata, "quantization": ns.quantization,
+                               "dimension": ns.dimension}, f)
+                os.replace(os.path.join(path, "vectors.npy.tmp.npy"), os.path.join(path, "vectors.npy"))
+                if scales is not None:
+                    os.replace(os.path.join(path, "scales.npy.tmp.npy"), os.path.join(path, "scales.npy"))
+                os.replace(os.path.join(path, "records.json.tmp"), os.path.join(path, "records.json"))
+                ns.dirty = False
+
+    def close(self):
+        self.flush()
+
+
+def open_vector_store(index_name: str, backend: Optional[str] = None, api_key: Optional[str] = None,
+                      directory: Optional[str] = None) -> VectorStore:
+    """Open ``index_name`` on the configured backend.
+
+    ``backend`` defaults to the ``VECTOR_STORE`` environment variable:
+    ``pinecone`` (default) or ``local`` for the offline in-process index,
+    stored under ``LOCAL_VECTOR_STORE_DIR`` (default ``.cache/vector-store``)
+    and quantized as ``LOCAL_VECTOR_QUANTIZATION`` (``int8`` or ``binary``)
+    says.
+    """
+    backend = backend or vector_store_backend()
+    if backend == "pinecone":
+        return PineconeStore(index_name, api_key=api_key)
+    if backend == "local":
+        return LocalVectorStore(directory or os.getenv("LOCAL_VECTOR_STORE_DIR") or LOCAL_STORE_DIR,
+                                index_name, quantization=os.getenv("LOCAL_VECTOR_QUANTIZATION") or None)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def vector_store_backend() -> str:
+    return (os.getenv("VECTOR_STORE") or "pinecone").lower()
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+from dataclasses import replace
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.chunk_store import ChunkStore
+from rag.collections import COLLECTIONS
+from rag.extraction import iter_pdf_documents
+from rag.ingest import Ingester
+from rag.stubs import FakeEmbeddingClient, FakeVectorStore
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_PDF = os.path.join(ROOT_DIR, '1736171_Boukhris,O_2024.pdf')
+LINES_PER_PAGE = 74
+CHARS_PER_LINE = 110
+
+def write_text_pdf(path: str, pages: List[str]):
+    """Write a minimal Helvetica text-only PDF, wrapping each page's text."""
+    page_lines = []
+    for text in pages:
+        lines = textwrap.wrap(text, CHARS_PER_LINE) or ['']
+        for start in range(0, len(lines), LINES_PER_PAGE):
+            page_lines.append(lines[start:start + LINES_PER_PAGE])
+
+    def escape(line: str) -> str:
+        line = line.encode('latin-1', 'replace').decode('latin-1')
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once page object numbers are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    kids = []
+    for lines in page_lines:
+        content = 'BT /F1 8 Tf 10 TL 36 756 Td ' + ' T* '.join(f'({escape(line)}) Tj' for line in lines) + ' ET'
+        content = content.encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+def build_corpus(directory: str, scale: int) -> List[str]:
+    """The bundled PDF plus ``scale - 1`` synthetic variants of it.
+
+    Each variant shuffles the sentences of every page with its own seed, so
+    its chunks are new text (no embedding cache or dedup hits) of the same
+    size and vocabulary as the original.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, os.path.basename(BUNDLED_PDF))]
+    shutil.copy(BUNDLED_PDF, paths[0])
+    if scale > 1:
+        _, pages = next(iter_pdf_documents([BUNDLED_PDF]))
+        sentences = [re.split(r'(?<=[.!?])\s+', ' '.join(page.text.split())) for page in pages]
+        for variant in range(1, scale):
+            rng = random.Random(variant)
+            variant_pages = []
+            for page in sentences:
+                page = list(page)
+                rng.shuffle(page)
+                variant_pages.append(' '.join(page))
+            path = os.path.join(directory, f'synthetic-{variant:03d}.pdf')
+            write_text_pdf(path, variant_pages)
+            paths.append(path)
+    return paths
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50_ms': round(float(np.percentile(values, 50)) * 1000, 2),
+        'p99_ms': round(float(np.percentile(values, 99)) * 1000, 2),
+    }
+
+def peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_once(args) -> Dict:
+    """Ingest one corpus directory through the real pipeline against the stand-ins."""
+    client = FakeEmbeddingClient(
+        dimension=args.dimension,
+        latency=args.embed_latency,
+        requests_per_second=args.embed_rps,
+        tokens_per_second=args.embed_tps
+    )
+    store = FakeVectorStore(latency=args.upsert_latency)
+    stages: Dict[str, List[float]] = {'extract': [], 'chunk': [], 'page': [], 'page_fallback': []}
+    lock = threading.Lock()
+
+    def observe(stage: str, seconds: float):
+        with lock:
+            stages.setdefault(stage, []).append(seconds)
+
+    # The synthetic variants are reshuffles of one paper, which dedup would collapse
+    collection = replace(COLLECTIONS[args.collection], source_dir=args.corpus, index_name='benchmark',
+                         dedup=False)
+    # Manifests, checkpoints, lexical index, chunk texts, dead letters and the answer
+    # cache the run invalidates, inside the workdir so nothing touches .cache; none of it is kept
+    state_dir = tempfile.mkdtemp(prefix='benchmark-state-', dir=os.path.dirname(os.path.abspath(args.corpus)))
+    chunk_store = ChunkStore(os.path.join(state_dir, 'chunks.sqlite'))
+    started = time.perf_counter()
+    try:
+        with Ingester(use_cache=False, embedding_client=client, open_store=lambda name: store,
+                      observe=observe, manifest_dir=os.path.join(state_dir, 'manifests'),
+                      lexical_dir=os.path.join(state_dir, 'lexical'), chunk_store=chunk_store,
+                      checkpoint_dir=os.path.join(state_dir, 'checkpoints'),
+                      dead_letter_dir=os.path.join(state_dir, 'dead-letter'),
+                      answer_cache_path=os.path.join(state_dir, 'answers.sqlite'),
+                      max_embed_concurrency=args.embed_concurrency,
+                      max_inflight_upserts=args.upsert_concurrency) as ingester:
+            results = ingester.ingest(collection, force=True)
+            engine_stats = dict(ingester.engine(collection.model).stats)
+    finally:
+        chunk_store.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+
+    chunks = sum(r.get('total_chunks', 0) for r in results)
+    return {
+        'files': len(results),
+        'failed_files': sum(1 for r in results if 'error' in r or r.get('failed_chunks')),
+        'chunks': chunks,
+        'seconds': round(elapsed, 3),
+        'chunks_per_s': round(chunks / elapsed, 1) if elapsed else 0.0,
+        'latency': {
+            'extract_wait': percentiles(stages['extract']),
+            'chunk': percentiles(stages['chunk']),
+            'extract_page': percentiles(stages['page']),
+            'extract_page_fallback': percentiles(stages['page_fallback']),
+            'embed_request': percentiles(client.latencies),
+            'upsert_request': percentiles(store.latencies),
+        },
+        'requests': {
+            'embed': client.stats['requests'],
+            'embed_rate_limited': client.stats['rate_limited'],
+            'embed_retries': engine_stats.get('retries', 0),
+            'upsert': store.stats_counts['upsert_requests'],
+            'vectors': store.stats_counts['vectors'],
+        },
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF),
+        'peak_child_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Describe each scale that is slower or uses more memory than the baseline."""
+    regressions = []
+    for scale, result in results.items():
+        base = baseline.get(scale)
+        if not base:
+            continue
+        if result['chunks_per_s'] < base['chunks_per_s'] * (1 - tolerance):
+            regressions.append(f"{scale}: {result['chunks_per_s']} chunks/s "
+                               f"vs {base['chunks_per_s']} in the baseline")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{scale}: peak RSS {result['peak_rss_mb']} MB "
+                               f"vs {base['peak_rss_mb']} MB in the baseline")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark extraction -> chunking -> embedding -> upsert with local "
+                    "stand-ins for the embedding API and the vector store."
+    )
+    parser.add_argument('--scales', default='1,10,100',
+                        help="comma-separated corpus sizes, in copies of the bundled PDF")
+    parser.add_argument('--collection', default='research-papers', choices=sorted(COLLECTIONS),
+                        help="collection whose chunker and chunk sizes to use")
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--embed-latency', type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument('--embed-rps', type=float, help="embedding requests per second before 429s")
+    parser.add_argument('--embed-tps', type=float, help="embedding tokens per second before 429s")
+    parser.add_argument('--embed-concurrency', type=int, default=4)
+    parser.add_argument('--upsert-latency', type=float, default=0.02, help="seconds per upsert request")
+    parser.add_argument('--upsert-concurrency', type=int, default=8)
+    parser.add_argument('--workdir', help="where to build the corpora (default: a temporary directory)")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative drop in chunks/s or growth in peak RSS")
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.corpus:
+        # Child process: one scale, so peak RSS is that run's own
+        result = run_once(args)
+        with open(args.result_file, 'w') as f:
+            json.dump(result, f)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='benchmark-ingest-')
+    results = {}
+    try:
+        for scale in [int(s) for s in args.scales.split(',')]:
+            corpus = os.path.join(workdir, f'{scale}x')
+            print(f"Building {scale}x corpus...")
+            build_corpus(corpus, scale)
+            result_file = os.path.join(workdir, f'{scale}x.json')
+            print(f"Running {scale}x...")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--corpus', corpus,
+                 '--result-file', result_file] + _child_args(args),
+                check=True, stdout=subprocess.DEVNULL
+            )
+            with open(result_file) as f:
+                results[f'{scale}x'] = json.load(f)
+            result = results[f'{scale}x']
+            print(f"  {result['chunks']} chunks in {result['seconds']}s: {result['chunks_per_s']} chunks/s, "
+                  f"peak RSS {result['peak_rss_mb']} MB (+{result['peak_child_rss_mb']} MB in workers)")
+            for stage, latency in result['latency'].items():
+                if latency['count']:
+                    print(f"  {stage}: p50 {latency['p50_ms']} ms, p99 {latency['p99_ms']} ms "
+                          f"over {latency['count']}")
+            print(f"  requests: {result['requests']}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+def _child_args(args) -> List[str]:
+    child = ['--collection', args.collection, '--dimension', str(args.dimension),
+             '--embed-latency', str(args.embed_latency), '--embed-concurrency', str(args.embed_concurrency),
+             '--upsert-latency', str(args.upsert_latency), '--upsert-concurrency', str(args.upsert_concurrency)]
+    if args.embed_rps:
+        child += ['--embed-rps', str(args.embed_rps)]
+    if args.embed_tps:
+        child += ['--embed-tps', str(args.embed_tps)]
+    return child
+
+if __name__ == "__main__":
+    main()
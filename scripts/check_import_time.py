@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import-time budget of each entry point, in milliseconds of module imports
+# on a warm interpreter (about twice what they take on a laptop). numpy is
+# the bulk of it; the query path must stay well under the time of a single
+# API call, so cron jobs and serving wrappers start answering right away.
+BUDGETS_MS = {
+    'test_pinecone': 250,
+    'rag.retrieval': 200,
+    'rag.fanout': 200,
+    'rag.ingest': 250,
+    'index_document': 300,
+    'index_female_athlete': 300,
+    'index_sport_scientist': 300,
+    'scripts/ingest.py': 300,
+    'scripts/process_pdf.py': 300,
+}
+
+# Imported only on the code paths that use them: each takes longer to
+# import than everything an entry point needs to start
+HEAVY_MODULES = ('openai', 'langchain', 'langchain_text_splitters', 'langchain_openai',
+                 'langchain_pinecone', 'langchain_core', 'pinecone', 'PyPDF2', 'pypdfium2',
+                 'pytesseract', 'tiktoken')
+
+def _statement(entry: str) -> str:
+    if entry.endswith('.py'):
+        # Runs the script's imports without running its main()
+        return f"import runpy; runpy.run_path({os.path.join(ROOT_DIR, entry)!r}, run_name='import_check')"
+    return f'import {entry}'
+
+def import_times(statement: str) -> List[Tuple[str, int]]:
+    """(module, microseconds spent in it) for every module imported by ``statement``, in order."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=ROOT_DIR,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(self_us)))
+    return times
+
+def measure(entry: str, startup: set, repeat: int) -> Dict:
+    """Fastest of ``repeat`` runs of importing an entry point, past interpreter startup."""
+    import_times(_statement(entry))  # compile .pyc files first
+    best = None
+    for _ in range(repeat):
+        times = [(name, us) for name, us in import_times(_statement(entry)) if name not in startup]
+        total = sum(us for _, us in times)
+        if best is None or total < best[0]:
+            best = (total, times)
+    total, times = best
+    heavy = sorted({name.split('.')[0] for name, _ in times if name.split('.')[0] in HEAVY_MODULES})
+    return {
+        'ms': round(total / 1000, 1),
+        'heavy': heavy,
+        'slowest': [(name, round(us / 1000, 1)) for name, us in sorted(times, key=lambda t: -t[1])[:8]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the query and ingest entry points import within their "
+                    "time budget, measured with `python -X importtime`, and without "
+                    "loading heavy dependencies (openai, langchain, PyPDF2, ...) up front."
+    )
+    parser.add_argument('entries', nargs='*', help="entry points to check (default: all budgeted ones)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per entry point; the fastest counts")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every budget, for slow machines")
+    parser.add_argument('--verbose', action='store_true', help="show the slowest modules of each entry point")
+    parser.add_argument('--output', help="write the measurements as JSON")
+    args = parser.parse_args()
+
+    entries = args.entries or list(BUDGETS_MS)
+    unknown = [entry for entry in entries if entry not in BUDGETS_MS]
+    if unknown:
+        print(f"No budget for: {', '.join(unknown)}")
+        sys.exit(2)
+
+    startup = {name for name, _ in import_times('pass')}
+    results = {}
+    failures = []
+    for entry in entries:
+        try:
+            result = measure(entry, startup, args.repeat)
+        except RuntimeError as e:
+            print(f"{entry:>24}: import failed")
+            failures.append(str(e))
+            continue
+        budget = BUDGETS_MS[entry] * args.scale
+        result['budget_ms'] = budget
+        results[entry] = result
+        status = 'ok' if result['ms'] <= budget and not result['heavy'] else 'FAIL'
+        print(f"{entry:>24}: {result['ms']:7.1f} ms (budget {budget:.0f} ms) {status}")
+        if result['ms'] > budget:
+            failures.append(f"{entry} takes {result['ms']} ms to import, over its {budget:.0f} ms budget")
+        if result['heavy']:
+            failures.append(f"{entry} imports {', '.join(result['heavy'])} at startup")
+        if args.verbose or status == 'FAIL':
+            for name, ms in result['slowest']:
+                print(f"{'':>26}{name}: {ms} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        print("\nFailed checks:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll entry points within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark_ingest import build_corpus
+from rag.checkpoint import checkpoint_path
+from rag.chunk_store import ChunkStore
+from rag.collections import COLLECTIONS
+from rag.ingest import Ingester
+from rag.manifest import Manifest
+from rag.stubs import FakeEmbeddingClient
+from rag.vector_store import LocalVectorStore
+
+INDEX_NAME = 'resume-check'
+
+def run_ingest(args):
+    """Child process: ingest the corpus into a local store under the workdir."""
+    collection = replace(COLLECTIONS[args.collection], source_dir=args.corpus, index_name=INDEX_NAME,
+                         dedup=False)
+    state_dir = os.path.join(args.workdir, 'state')
+    chunk_store = ChunkStore(os.path.join(state_dir, 'chunks.sqlite'))
+    try:
+        with Ingester(use_cache=False, embedding_client=FakeEmbeddingClient(latency=args.embed_latency),
+                      open_store=lambda name: LocalVectorStore(os.path.join(args.workdir, 'store'), name),
+                      manifest_dir=os.path.join(state_dir, 'manifests'),
+                      lexical_dir=os.path.join(state_dir, 'lexical'), chunk_store=chunk_store,
+                      checkpoint_dir=os.path.join(state_dir, 'checkpoints'),
+                      dead_letter_dir=os.path.join(state_dir, 'dead-letter'),
+                      answer_cache_path=os.path.join(state_dir, 'answers.sqlite'),
+                      upsert_batch_size=args.batch_size, max_inflight_upserts=2,
+                      flush_interval=args.flush_interval, progress_interval=3600) as ingester:
+            ingester.ingest(collection)
+    finally:
+        chunk_store.close()
+
+def journaled_batches(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return sum(1 for line in f if '"ids"' in line)
+
+def verify(workdir: str, collection: str, files: int) -> list:
+    """Problems with the resumed index: files not recorded, or recorded vectors not stored."""
+    namespace = COLLECTIONS[collection].namespace
+    manifest = Manifest.for_target(INDEX_NAME, namespace, directory=os.path.join(workdir, 'state', 'manifests'))
+    store = LocalVectorStore(os.path.join(workdir, 'store'), INDEX_NAME)
+    problems = []
+    if len(manifest.files) != files:
+        problems.append(f"{len(manifest.files)}/{files} files recorded in the manifest")
+    expected = [vector_id for key in manifest.files for vector_id in manifest.vector_ids(key)]
+    stored = store.fetch(expected, namespace)
+    missing = len(expected) - len(stored)
+    if missing:
+        problems.append(f"{missing}/{len(expected)} vectors recorded in the manifest are not in the store")
+    count = store.stats()['namespaces'].get(namespace, {}).get('vector_count', 0)
+    if count != len(expected):
+        problems.append(f"the store holds {count} vectors, the manifest records {len(expected)}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that an ingest into the local vector store resumes correctly after "
+                    "being killed: run it against stand-in embeddings, SIGKILL it once some "
+                    "batches are journaled, rerun it, and compare the manifest with the store."
+    )
+    parser.add_argument('--scale', type=int, default=6, help="corpus size, in copies of the bundled PDF")
+    parser.add_argument('--collection', default='research-papers', choices=sorted(COLLECTIONS))
+    parser.add_argument('--batch-size', type=int, default=20, help="vectors per upsert batch")
+    parser.add_argument('--kill-after', type=int, default=8, help="journaled batches before the kill")
+    parser.add_argument('--flush-interval', type=float, default=0.5)
+    parser.add_argument('--embed-latency', type=float, default=0.05)
+    parser.add_argument('--workdir', help="where to build the corpus and index (default: a temporary directory)")
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.corpus:
+        run_ingest(args)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='check-resume-')
+    try:
+        corpus = os.path.join(workdir, 'corpus')
+        files = len(build_corpus(corpus, args.scale))
+        command = [sys.executable, os.path.abspath(__file__), '--corpus', corpus, '--workdir', workdir,
+                   '--collection', args.collection, '--batch-size', str(args.batch_size),
+                   '--flush-interval', str(args.flush_interval), '--embed-latency', str(args.embed_latency)]
+        journal = checkpoint_path(INDEX_NAME, COLLECTIONS[args.collection].namespace,
+                                  directory=os.path.join(workdir, 'state', 'checkpoints'))
+
+        child = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        while child.poll() is None and journaled_batches(journal) < args.kill_after:
+            time.sleep(0.01)
+        if child.poll() is not None:
+            print(f"The ingest finished before {args.kill_after} batches were journaled; "
+                  f"use a larger --scale or a smaller --kill-after")
+            sys.exit(2)
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+        print(f"Killed the ingest after {journaled_batches(journal)} journaled batches")
+
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        problems = verify(workdir, args.collection, files)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if problems:
+        print("Resume after a crash lost data:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print(f"Resumed ingest of {files} files is complete")
+
+if __name__ == "__main__":
+    main()
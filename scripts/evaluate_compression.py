@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import random
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.collections import select_collections
+from rag.compression import PCA, compression_report, pca_path, supports_dimensions
+from rag.embedding_cache import EmbeddingCache
+from rag.embeddings import EmbeddingEngine
+from rag.evaluation import load_questions
+from rag.extraction import iter_pdf_documents
+from rag.ingest import CHUNKERS
+
+QUERY_WORDS = 25  # length of the chunk openings used as stand-in questions
+
+def collection_chunks(collection) -> list:
+    source_dir = collection.resolved_source_dir()
+    paths = [os.path.join(source_dir, f) for f in sorted(os.listdir(source_dir)) if f.lower().endswith('.pdf')]
+    chunker = CHUNKERS[collection.chunker]
+    return [chunk.text for path, pages in iter_pdf_documents(paths)
+            for chunk in chunker(path, pages, collection)]
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Measure how much recall each embedding compression option loses "
+                    "against exact search over full-precision vectors of a collection."
+    )
+    parser.add_argument('--collection', default='research-papers', help="collection to embed")
+    parser.add_argument('--config', help="JSON file with extra or overriding collection configs")
+    parser.add_argument('--dimensions', default='256,512', help="comma-separated reduced sizes to try")
+    parser.add_argument('--k', type=int, default=10, help="cutoff for recall@k")
+    parser.add_argument('--questions', help="questions file (see scripts/evaluate_retrieval.py); "
+                                            "default: openings of sampled chunks")
+    parser.add_argument('--sample', type=int, default=200, help="stand-in questions to sample")
+    parser.add_argument('--save-pca', type=int, metavar='DIMENSIONS',
+                        help="fit a PCA of this size on the collection and save it for ingest and queries")
+    parser.add_argument('--output', help="write the report as JSON")
+    args = parser.parse_args()
+
+    if not os.getenv('VITE_OPENAI_API_KEY'):
+        print("Missing required environment variable: VITE_OPENAI_API_KEY")
+        sys.exit(1)
+
+    try:
+        collection = select_collections([args.collection], args.config)[0]
+    except ValueError as e:
+        print(str(e))
+        sys.exit(1)
+
+    print(f"Chunking {collection.name}...")
+    texts = collection_chunks(collection)
+    if args.questions:
+        queries = [q.question for q in load_questions(args.questions)]
+    else:
+        sample = random.Random(0).sample(texts, min(args.sample, len(texts)))
+        queries = [' '.join(text.split()[:QUERY_WORDS]) for text in sample]
+    print(f"Embedding {len(texts)} chunks and {len(queries)} questions with {collection.model}...")
+
+    # Full-precision embeddings come from the cache after the first ingest
+    with EmbeddingEngine(model=collection.model, cache=EmbeddingCache()) as engine:
+        corpus = engine.embed_array(texts)
+        query_vectors = engine.embed_array(queries)
+        engine.cache.close()
+
+    dimensions = [int(d) for d in args.dimensions.split(',') if int(d) < corpus.shape[1]]
+    options = ['float32', 'int8', 'binary']
+    if supports_dimensions(collection.model):
+        options += [f'truncate-{d}' for d in dimensions]
+    options += [f'pca-{d}' for d in dimensions if d <= len(corpus)]
+    report = compression_report(corpus, query_vectors, options, k=args.k)
+
+    print(f"\nRecall@{args.k} against exact float32 search over {len(texts)} chunks:")
+    for option, result in report.items():
+        print(f"  {option:>14}: recall {result[f'recall@{args.k}']:.4f}, "
+              f"{result['bytes_per_vector']} bytes/vector, scan {result['scan_ms']} ms")
+
+    if args.save_pca:
+        path = pca_path(collection.resolved_index_name(), collection.namespace, collection.model, args.save_pca)
+        PCA.fit(corpus, args.save_pca).save(path)
+        print(f"\nSaved {args.save_pca}-dimension PCA to {path}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.collections import select_collections
+from rag.evaluation import evaluate, format_report, load_questions
+from rag.retrieval import Retriever
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Run a question set against a collection's index and report recall@k, "
+                    "MRR, per-stage latency and throughput."
+    )
+    parser.add_argument('questions', help="JSON lines file of questions (or one question per line)")
+    parser.add_argument('--collection', default='research-papers', help="collection to query")
+    parser.add_argument('--config', help="JSON file with extra or overriding collection configs")
+    parser.add_argument('--k', default='1,3,5,10,20', help="comma-separated cutoffs for recall@k")
+    parser.add_argument('--concurrency', type=int, default=8, help="queries in flight")
+    parser.add_argument('--no-lexical', action='store_true', help="vector retrieval only")
+    parser.add_argument('--generate', action='store_true', help="also build contexts and generate answers")
+    parser.add_argument('--generate-concurrency', type=int, default=4, help="chat requests in flight")
+    parser.add_argument('--output', help="write the report as JSON")
+    parser.add_argument('--details', help="write per-question results as JSON lines")
+    args = parser.parse_args()
+
+    if not os.getenv('VITE_OPENAI_API_KEY'):
+        print("Missing required environment variable: VITE_OPENAI_API_KEY")
+        sys.exit(1)
+
+    try:
+        collection = select_collections([args.collection], args.config)[0]
+    except ValueError as e:
+        print(str(e))
+        sys.exit(1)
+
+    ks = sorted(int(k) for k in args.k.split(','))
+    questions = load_questions(args.questions)
+    print(f"Evaluating {len(questions)} questions against {collection.name}")
+
+    # Retrieve as deep as the largest cutoff, whether or not the lexical index is used
+    details = [] if args.details else None
+    with Retriever(collection.resolved_index_name(), collection.namespace,
+                   embedding_model=collection.model, top_k=ks[-1], fused_top_k=ks[-1],
+                   use_answer_cache=False, use_lexical=not args.no_lexical) as retriever:
+        report = evaluate(retriever, questions, ks, concurrency=args.concurrency,
+                          generate=args.generate, generate_concurrency=args.generate_concurrency,
+                          details=details)
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if details is not None:
+        with open(args.details, 'w') as f:
+            for result in details:
+                f.write(json.dumps(result) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.collections import load_collections, select_collections
+from rag.ingest import Ingester
+from rag.metrics import Metrics, instrumented
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Index PDF collections into the vector store. Collections given "
+                    "together run concurrently, sharing embedding and upsert workers."
+    )
+    parser.add_argument('collections', nargs='*', help="collection names (default: all)")
+    parser.add_argument('--config', help="JSON file with extra or overriding collection configs")
+    parser.add_argument('--force', action='store_true', help="re-index unchanged files too")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="only re-send the chunks and files that failed in earlier runs")
+    parser.add_argument('--replay-dead-letters', action='store_true',
+                        help="only re-send the vectors whose upserts were dead-lettered in earlier runs")
+    parser.add_argument('--list', action='store_true', help="list collections and exit")
+    parser.add_argument('--embed-concurrency', type=int, default=4,
+                        help="embedding requests in flight per model")
+    parser.add_argument('--upsert-concurrency', type=int, default=8,
+                        help="upsert requests in flight across all collections")
+    parser.add_argument('--progress-interval', type=float, default=10.0,
+                        help="seconds between progress lines")
+    parser.add_argument('--metrics-file', help="append the run's counters and stage latencies "
+                                               "to this JSON lines file (default: $METRICS_FILE)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve Prometheus metrics on this port while running (default: $METRICS_PORT)")
+    parser.add_argument('--profile', help="write a cProfile dump, or a pyinstrument report "
+                                          "for a .html path (default: $PROFILE)")
+    args = parser.parse_args()
+
+    if args.list:
+        for collection in load_collections(args.config).values():
+            print(f"{collection.name}: {collection.source_dir} -> {collection.index_name}"
+                  f"/{collection.namespace or 'default'} ({collection.chunker} "
+                  f"{collection.chunk_size}/{collection.chunk_overlap}, {collection.model})")
+        return
+
+    if not os.getenv('VITE_OPENAI_API_KEY'):
+        print("Missing required environment variable: VITE_OPENAI_API_KEY")
+        sys.exit(1)
+
+    try:
+        collections = select_collections(args.collections or list(load_collections(args.config)),
+                                         args.config)
+    except ValueError as e:
+        print(str(e))
+        sys.exit(1)
+
+    metrics = Metrics()
+    with instrumented(metrics, args.metrics_file, args.metrics_port, args.profile,
+                      run="ingest", collections=[c.name for c in collections]):
+        with Ingester(openai_key=os.getenv('VITE_OPENAI_API_KEY'),
+                      pinecone_key=os.getenv('VITE_PINECONE_API_KEY'),
+                      max_embed_concurrency=args.embed_concurrency,
+                      max_inflight_upserts=args.upsert_concurrency,
+                      metrics=metrics, progress_interval=args.progress_interval) as ingester:
+            if args.replay_dead_letters:
+                results = {c.name: ingester.replay_dead_letters(c) for c in collections}
+            else:
+                results = ingester.ingest_all(collections, force=args.force, retry_failed=args.retry_failed)
+
+    print("\nProcessing Summary:")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,160 +1,70 @@
+import argparse
 import os
 import sys
 import json
-import time
-from typing import List, Dict
-import PyPDF2
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import OpenAIEmbeddings
-from pinecone import Pinecone
+from dataclasses import replace
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text from a PDF file."""
-    with open(pdf_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() + '\n'
-    return text.strip()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.collections import COLLECTIONS
+from rag.ingest import Ingester
+from rag.metrics import Metrics, instrumented
+from rag.vector_store import vector_store_backend
 
-def process_pdf(pdf_path: str, openai_key: str, pinecone_key: str, pinecone_env: str, index_name: str) -> Dict:
-    """Process a PDF file and upload its embeddings to Pinecone."""
-    try:
-        # Extract text from PDF
-        print(f"\nProcessing: {pdf_path}")
-        text = extract_text_from_pdf(pdf_path)
-        
-        if not text:
-            raise ValueError(f"No text content found in PDF: {pdf_path}")
-        
-        # Split text into chunks
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
-        )
-        
-        docs = splitter.create_documents(
-            [text],
-            metadatas=[{
-                'source': os.path.basename(pdf_path),
-                'filename': os.path.basename(pdf_path)
-            }]
-        )
-        
-        print(f"Created {len(docs)} document chunks")
-        
-        # Initialize OpenAI embeddings
-        embeddings = OpenAIEmbeddings(
-            openai_api_key=openai_key,
-            model="text-embedding-ada-002"
-        )
-        
-        # Initialize Pinecone
-        pc = Pinecone(api_key=pinecone_key)
-        index = pc.Index(index_name)
-        
-        # Process chunks and upload to Pinecone
-        processed_chunks = 0
-        failed_chunks = 0
-        batch_size = 50  # Process in smaller batches
-        
-        for i in range(0, len(docs), batch_size):
-            batch = docs[i:i + batch_size]
-            vectors = []
-            
-            for j, doc in enumerate(batch):
-                try:
-                    # Clean and truncate text
-                    clean_text = ' '.join(doc.page_content.split())[:8000]
-                    
-                    # Generate embedding
-                    embedding = embeddings.embed_documents([clean_text])[0]
-                    
-                    # Create vector ID
-                    vector_id = f"{os.path.basename(pdf_path)}-{i+j}-{int(time.time())}"[:512]
-                    
-                    vectors.append({
-                        'id': vector_id,
-                        'values': embedding,
-                        'metadata': {
-                            'text': clean_text,
-                            'source': doc.metadata['source'],
-                            'filename': doc.metadata['filename'],
-                            'chunk_index': i+j
-                        }
-                    })
-                    
-                    processed_chunks += 1
-                    print(f"Processed chunk {i+j+1}/{len(docs)}")
-                    
-                except Exception as e:
-                    print(f"Error processing chunk {i+j}: {str(e)}")
-                    failed_chunks += 1
-            
-            # Upsert batch to Pinecone
-            if vectors:
-                try:
-                    index.upsert(
-                        vectors=vectors,
-                        namespace='research-papers'
-                    )
-                    print(f"Uploaded batch of {len(vectors)} vectors")
-                except Exception as e:
-                    print(f"Error uploading batch: {str(e)}")
-                    failed_chunks += len(vectors)
-            
-            # Add delay between batches
-            if i + batch_size < len(docs):
-                time.sleep(2)
-        
-        summary = {
-            'filename': os.path.basename(pdf_path),
-            'processed_chunks': processed_chunks,
-            'failed_chunks': failed_chunks,
-            'total_chunks': len(docs)
-        }
-        
-        print(json.dumps(summary, indent=2))
-        return summary
-        
-    except Exception as e:
-        print(f"Error processing document: {str(e)}")
-        raise
+COLLECTION = COLLECTIONS['research-papers']
+NAMESPACE = COLLECTION.namespace
+
+def process_pdf(pdf_path: str, openai_key: str, pinecone_key: str, pinecone_env: str, index_name: str,
+                ingester: Optional[Ingester] = None) -> Dict:
+    """Process a PDF file and upload its embeddings to the vector store.
 
-def process_pdf_folder(folder_path: str, openai_key: str, pinecone_key: str, pinecone_env: str, index_name: str) -> List[Dict]:
-    """Process all PDF files in a folder."""
+    The file is recorded in the manifest once fully uploaded, and vectors
+    left over from a previous, longer version of it are deleted. Callers
+    processing several files should pass one ``ingester`` for all of them,
+    so its clients, caches and worker pools are reused.
+    """
+    collection = replace(COLLECTION, index_name=index_name)
+    if ingester is None:
+        with Ingester(openai_key=openai_key, pinecone_key=pinecone_key) as ingester:
+            results = ingester.ingest(collection, paths=[pdf_path], force=True)
+    else:
+        results = ingester.ingest(collection, paths=[pdf_path], force=True)
+    if 'error' in results[0]:
+        raise ValueError(results[0]['error'])
+    return results[0]
+
+def process_pdf_folder(folder_path: str, openai_key: str, pinecone_key: str, pinecone_env: str, index_name: str,
+                       retry_failed: bool = False, metrics: Optional[Metrics] = None) -> List[Dict]:
+    """Process new and changed PDF files in a folder, skipping unchanged ones.
+
+    Extraction, chunking, embedding and uploading run as one streaming
+    pipeline across all files, so only a bounded number of chunks and
+    vectors are held in memory at any time. An interrupted run picks up
+    after its last committed upsert batch; ``retry_failed`` re-sends only
+    what failed before. Stage timings and request counts go into ``metrics``.
+    """
     if not os.path.exists(folder_path):
         raise ValueError(f"Folder not found: {folder_path}")
     
-    results = []
-    pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
-    
-    if not pdf_files:
-        print(f"No PDF files found in {folder_path}")
-        return results
-    
-    print(f"Found {len(pdf_files)} PDF files")
-    
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(folder_path, pdf_file)
-        try:
-            result = process_pdf(pdf_path, openai_key, pinecone_key, pinecone_env, index_name)
-            results.append(result)
-            # Add delay between files
-            time.sleep(5)
-        except Exception as e:
-            print(f"Failed to process {pdf_file}: {str(e)}")
-            results.append({
-                'filename': pdf_file,
-                'error': str(e)
-            })
-    
-    return results
+    collection = replace(COLLECTION, source_dir=folder_path, index_name=index_name)
+    with Ingester(openai_key=openai_key, pinecone_key=pinecone_key, metrics=metrics) as ingester:
+        return ingester.ingest(collection, retry_failed=retry_failed)
 
 def main():
     # Load environment variables
     load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Index the PDFs in the pdfs folder.")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="only re-send the chunks and files that failed in earlier runs")
+    parser.add_argument('--metrics-file', help="append the run's counters and stage latencies "
+                                               "to this JSON lines file (default: $METRICS_FILE)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve Prometheus metrics on this port while running (default: $METRICS_PORT)")
+    parser.add_argument('--profile', help="write a cProfile dump, or a pyinstrument report "
+                                          "for a .html path (default: $PROFILE)")
+    args = parser.parse_args()
     
     # Get configuration from environment
     openai_key = os.getenv('VITE_OPENAI_API_KEY')
@@ -162,14 +72,18 @@ def main():
     pinecone_env = os.getenv('VITE_PINECONE_ENVIRONMENT')
     index_name = os.getenv('VITE_PINECONE_INDEX')
     
-    # Validate environment variables
-    missing_vars = []
-    for var_name, var_value in [
+    # Validate environment variables (the local vector store needs no Pinecone credentials)
+    required = [
         ('VITE_OPENAI_API_KEY', openai_key),
-        ('VITE_PINECONE_API_KEY', pinecone_key),
-        ('VITE_PINECONE_ENVIRONMENT', pinecone_env),
         ('VITE_PINECONE_INDEX', index_name)
-    ]:
+    ]
+    if vector_store_backend() == 'pinecone':
+        required += [
+            ('VITE_PINECONE_API_KEY', pinecone_key),
+            ('VITE_PINECONE_ENVIRONMENT', pinecone_env)
+        ]
+    missing_vars = []
+    for var_name, var_value in required:
         if not var_value:
             missing_vars.append(var_name)
     
@@ -180,8 +94,11 @@ def main():
     # Process all PDFs in the pdfs folder
     pdfs_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'pdfs')
     
+    metrics = Metrics()
     try:
-        results = process_pdf_folder(pdfs_folder, openai_key, pinecone_key, pinecone_env, index_name)
+        with instrumented(metrics, args.metrics_file, args.metrics_port, args.profile, run="process_pdf"):
+            results = process_pdf_folder(pdfs_folder, openai_key, pinecone_key, pinecone_env, index_name,
+                                         retry_failed=args.retry_failed, metrics=metrics)
         print("\nProcessing Summary:")
         print(json.dumps(results, indent=2))
     except Exception as e:
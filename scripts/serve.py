@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from typing import Optional
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.metrics import Metrics
+from rag.retrieval import Retriever
+from rag.service import DEFAULT_MAX_BATCH, DEFAULT_MAX_GENERATIONS, QueryService
+
+STUB_DIMENSION = 256
+STUB_NAMESPACE = 'research-papers'
+STUB_CHUNKS = [
+    ('Sleep extension in collegiate athletes', 'Extending sleep to ten hours a night improved sprint times '
+     'and shooting accuracy in collegiate basketball players over five to seven weeks.'),
+    ('Creatine and cognition', 'Creatine supplementation reduced the drop in reaction time and '
+     'decision making after sleep deprivation in trained athletes.'),
+    ('Low energy availability', 'Low energy availability in female athletes was associated with '
+     'menstrual dysfunction, reduced bone mineral density and impaired recovery.'),
+    ('Heat acclimation', 'Ten days of heat acclimation lowered core temperature and heart rate '
+     'during exercise and improved time-trial performance in the heat.'),
+]
+
+def real_factory(metrics: Metrics):
+    """Retrievers over the configured index sharing one vector store and chat client.
+
+    Each namespace's questions are embedded with the model (and dimensions)
+    its collection was indexed with. Namespaces with the same embedding
+    setup share one engine, and so its cache, rate limiter and query batches.
+    """
+    from rag.collections import find_collection
+    from rag.compression import supports_dimensions
+    from rag.embedding_cache import EmbeddingCache
+    from rag.embeddings import EmbeddingEngine
+    from rag.vector_store import open_vector_store
+
+    index_name = os.getenv('VITE_PINECONE_INDEX')
+    api_key = os.getenv('VITE_OPENAI_API_KEY')
+    cache = EmbeddingCache()
+    engines = {}
+    store = open_vector_store(index_name)
+    # One chat client, and so one keep-alive connection pool, for every namespace. The
+    # engines' clients are separate: they make no retries of their own
+    import openai
+    chat_client = openai.OpenAI(api_key=api_key)
+
+    def engine_for(model: str, dimensions: Optional[int]) -> EmbeddingEngine:
+        # Models without native reduced dimensions are reduced by the retriever's PCA
+        dimensions = dimensions if supports_dimensions(model) else None
+        key = model if dimensions is None else f"{model}@{dimensions}"
+        if key not in engines:
+            engines[key] = EmbeddingEngine(model=model, api_key=api_key, cache=cache,
+                                           dimensions=dimensions, metrics=metrics)
+        return engines[key]
+
+    def make_retriever(namespace: str) -> Retriever:
+        collection = find_collection(index_name, namespace)
+        return Retriever(index_name, namespace, store=store,
+                         engine=engine_for(collection.model, collection.dimensions),
+                         chat_client=chat_client, embedding_model=collection.model,
+                         dimensions=collection.dimensions, metrics=metrics)
+
+    return make_retriever
+
+def stub_factory(metrics: Metrics, directory: str, embed_latency: float, chat_latency: float):
+    """Retrievers over a small local index, embedding and answering with the stand-ins in rag.stubs."""
+    from rag.chunk_store import ChunkStore
+    from rag.embeddings import EmbeddingEngine
+    from rag.stubs import FakeChatClient, FakeEmbeddingClient
+    from rag.vector_batch import VectorBatch
+    from rag.vector_store import LocalVectorStore
+
+    engine = EmbeddingEngine(client=FakeEmbeddingClient(STUB_DIMENSION, latency=embed_latency), metrics=metrics)
+    chat_client = FakeChatClient(latency=chat_latency)
+    store = LocalVectorStore(directory, 'stub')
+    texts = [text for _, text in STUB_CHUNKS]
+    metadata = [{'filename': f"{title}.pdf", 'page': 1, 'chunk_index': 0} for title, _ in STUB_CHUNKS]
+    store.upsert(VectorBatch([f"stub-{i}" for i in range(len(texts))], engine.embed_array(texts),
+                             metadata, texts), STUB_NAMESPACE)
+    chunk_store = ChunkStore(':memory:')
+
+    def make_retriever(namespace: str) -> Retriever:
+        return Retriever('stub', namespace, store=store, engine=engine, chat_client=chat_client,
+                         use_answer_cache=False, use_lexical=False, chunk_store=chunk_store,
+                         min_score=-1.0, metrics=metrics)
+
+    return make_retriever
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Serve queries and answers over HTTP from one long-running process, "
+                    "keeping clients and caches warm, batching question embeddings and "
+                    "bounding concurrent chat completions."
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--namespace', default='research-papers', help="namespace of requests that name none")
+    parser.add_argument('--window-ms', type=float, default=5.0,
+                        help="how long a question waits for others to share its embedding request")
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH,
+                        help="questions per embedding request")
+    parser.add_argument('--max-generations', type=int, default=DEFAULT_MAX_GENERATIONS,
+                        help="chat completions in flight at once")
+    parser.add_argument('--workers', type=int, default=32, help="threads for index queries and generation")
+    parser.add_argument('--stub', action='store_true',
+                        help="answer from a small local index with stand-in OpenAI clients, for testing")
+    parser.add_argument('--stub-latency', type=float, default=0.5,
+                        help="seconds each stand-in chat completion takes")
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    stub_dir = None
+    if args.stub:
+        stub_dir = tempfile.TemporaryDirectory(prefix='rag-serve-')
+        make_retriever = stub_factory(metrics, stub_dir.name, 0.05, args.stub_latency)
+        namespace = STUB_NAMESPACE
+    else:
+        make_retriever = real_factory(metrics)
+        namespace = args.namespace
+
+    service = QueryService(make_retriever, namespace, window=args.window_ms / 1000,
+                           max_batch=args.max_batch, max_generations=args.max_generations,
+                           max_workers=args.workers, metrics=metrics)
+    # Built up front so the first request doesn't pay for it
+    service.retriever(namespace)
+    print(f"Serving on http://{args.host}:{args.port} (POST /query, POST /answer, GET /health, GET /metrics)")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if stub_dir is not None:
+            stub_dir.cleanup()
+        print(f"Time by stage:\n{metrics.report()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 import os
+import sys
 from dotenv import load_dotenv
-from pinecone import Pinecone, ServerlessSpec
 import openai
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.vector_store import PineconeStore, open_vector_store, vector_store_backend
+
 def load_environment():
     """Load environment variables and validate them."""
     load_dotenv()
     
     required_vars = [
-        'VITE_PINECONE_API_KEY',
         'VITE_OPENAI_API_KEY',
         'VITE_PINECONE_INDEX'
     ]
+    if vector_store_backend() == 'pinecone':
+        required_vars.append('VITE_PINECONE_API_KEY')
     
     missing = [var for var in required_vars if not os.getenv(var)]
     if missing:
@@ -35,32 +39,31 @@ def get_embedding(text: str, api_key: str) -> list:
     return response.data[0].embedding
 
 def test_pinecone_connection():
-    """Test basic Pinecone operations."""
+    """Test basic vector store operations."""
     try:
         # Load environment variables
         print("Loading environment variables...")
         env = load_environment()
         
-        # Initialize Pinecone
-        print("\nInitializing Pinecone...")
-        pc = Pinecone(api_key=env['pinecone_api_key'])
+        # Get the specific index
+        print(f"\nAccessing {vector_store_backend()} index: {env['index_name']}")
+        store = open_vector_store(env['index_name'], api_key=env['pinecone_api_key'])
         
         # List indexes
-        print("\nListing available indexes...")
-        indexes = pc.list_indexes()
-        print(f"Available indexes: {indexes}")
-        
-        # Get the specific index
-        print(f"\nAccessing index: {env['index_name']}")
-        index = pc.Index(env['index_name'])
+        if isinstance(store, PineconeStore):
+            print("\nListing available indexes...")
+            from pinecone import Pinecone
+            indexes = Pinecone(api_key=env['pinecone_api_key']).list_indexes()
+            print(f"Available indexes: {indexes}")
+        print(f"Index stats: {store.stats()}")
         
         # Test query
         test_query = "What are the key factors affecting athletic performance?"
         print(f"\nGenerating embedding for test query: '{test_query}'")
         query_embedding = get_embedding(test_query, env['openai_api_key'])
         
-        print("\nQuerying Pinecone...")
-        query_response = index.query(
+        print("\nQuerying index...")
+        matches = store.query(
             vector=query_embedding,
             top_k=3,
             include_metadata=True,
@@ -68,7 +71,7 @@ def test_pinecone_connection():
         )
         
         print("\nQuery Results:")
-        for i, match in enumerate(query_response.matches, 1):
+        for i, match in enumerate(matches, 1):
             print(f"\nMatch {i}:")
             print(f"Score: {match.score}")
             print(f"Metadata: {match.metadata}")
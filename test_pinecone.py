@@ -1,106 +1,158 @@
 import os
+import sys
+import json
+import atexit
 from dotenv import load_dotenv
-import openai
-from pinecone import Pinecone
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings
+from rag.collections import COLLECTIONS, find_collection
+from rag.evaluation import evaluate, format_report, load_questions
+from rag.fanout import FanoutRetriever, Target
+from rag.metrics import Metrics, instrumented
+from rag.retrieval import Retriever
 
 # Load environment variables
 load_dotenv(override=True)
 
-def get_embedding(text: str, api_key: str) -> list:
-    """Get embedding from OpenAI API."""
-    client = openai.OpenAI(api_key=api_key)
-    return client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    ).data[0].embedding
-
-def get_chatbot_response(query: str, context: str, api_key: str) -> str:
-    """Generate a chatbot response using OpenAI."""
-    client = openai.OpenAI(api_key=api_key)
-    
-    system_prompt = """You are a sports science expert analyzing research papers. 
-    Use ONLY the provided research context to answer the question.
-    Be specific about methodology, results, and conclusions from the paper.
-    If the context contains partial information, share what's available and indicate what's missing.
-    If the context doesn't contain relevant information, say so."""
-    
-    response = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context: {context}\n\nQuestion: {query}"}
-        ],
-        temperature=0.3,  # Lower temperature for more focused responses
-        max_tokens=1000   # Increased for more detailed responses
-    )
-    
-    return response.choices[0].message.content
+_retrievers = {}
+# Shared by every retriever; METRICS_FILE, METRICS_PORT and PROFILE report it
+_metrics = Metrics()
+
+def get_retriever(namespace: str = "research-papers") -> Retriever:
+    """Long-lived retriever per namespace, so clients and caches are reused between queries.
+
+    Questions are embedded with the model (and dimensions) the namespace's
+    collection was indexed with. Its OpenAI clients are created on the
+    first embedding or answer that isn't cached, so startup doesn't pay for
+    importing openai.
+    """
+    if namespace not in _retrievers:
+        index_name = os.getenv('VITE_PINECONE_INDEX')
+        collection = find_collection(index_name, namespace)
+        _retrievers[namespace] = Retriever(
+            index_name,
+            namespace,
+            embedding_model=collection.model,
+            dimensions=collection.dimensions,
+            metrics=_metrics
+        )
+    return _retrievers[namespace]
+
+_fanout = None
+
+def get_fanout() -> FanoutRetriever:
+    """Fan-out over every collection whose index is configured, with their own retrievers."""
+    global _fanout
+    if _fanout is None:
+        targets = []
+        for collection in COLLECTIONS.values():
+            try:
+                index_name = collection.resolved_index_name()
+            except ValueError as e:
+                print(f"Skipping {collection.name}: {e}")
+                continue
+            key = f"collection:{collection.name}"
+            if key not in _retrievers:
+                _retrievers[key] = Retriever(
+                    index_name,
+                    collection.namespace,
+                    embedding_model=collection.model,
+                    dimensions=collection.dimensions,
+                    metrics=_metrics
+                )
+            targets.append(Target(collection.name, _retrievers[key]))
+        _fanout = FanoutRetriever(targets)
+    return _fanout
+
+@atexit.register
+def _close_retrievers():
+    global _fanout
+    if _fanout is not None:
+        _fanout.close()
+        _fanout = None
+    for retriever in _retrievers.values():
+        retriever.close()
+    _retrievers.clear()
 
 def test_query(query_text: str, namespace: str = "research-papers"):
-    """Test a specific query."""
+    """Test a specific query, printing the answer as it streams in."""
     try:
         print(f"\nQuery: '{query_text}'")
-        
-        # Initialize Pinecone
-        pc = Pinecone(
-            api_key=os.getenv('VITE_PINECONE_API_KEY'),
-            environment=os.getenv('VITE_PINECONE_ENVIRONMENT')
-        )
-        
-        # Get the index
-        index = pc.Index(os.getenv('VITE_PINECONE_INDEX'))
-        
-        # Generate embedding
-        query_embedding = get_embedding(query_text, os.getenv('VITE_OPENAI_API_KEY'))
-        
-        # Query with higher top_k and include all metadata
-        response = index.query(
-            vector=query_embedding,
-            top_k=20,  # Increased to get more context
-            include_metadata=True,
-            namespace=namespace,
+
+        # Embedding, index query and answer go through the cached retriever
+        retriever = get_retriever(namespace)
+        answer = retriever.stream_answer(
+            query_text,
             filter={
                 "filename": {"$eq": "1736171_Boukhris,O_2024.pdf"}  # Filter for specific paper
             }
         )
-        
+
         # Debug info
-        print(f"\nFound {len(response.matches)} matches with scores:")
-        for match in response.matches:
-            print(f"Score: {match.score:.4f} - Text starts with: {match.metadata.get('text', '')[:100]}...")
-        
-        # Combine relevant text from matches with higher threshold
-        context = "\n".join([
-            match.metadata.get('text', '') 
-            for match in response.matches 
-            if match.score > 0.01  # Adjusted threshold
-        ])
-        
-        print(f"\nTotal context length: {len(context)} characters")
-        
-        # Get chatbot response
-        if context:
-            answer = get_chatbot_response(query_text, context, os.getenv('VITE_OPENAI_API_KEY'))
-            print("\nAnswer:", answer)
-            
+        if answer.timing.cached:
+            print("\nAnswering from the answer cache")
+        else:
+            print(f"\nFound {len(answer.matches)} matches with scores:")
+            for match in answer.matches:
+                print(f"Score: {match.score:.4f} - Text starts with: {match.metadata.get('text', '')[:100]}...")
+
+        if answer.context is not None:
+            context = answer.context
+            print(f"\nContext: {context.tokens} tokens from {len(context.pieces)} pieces "
+                  f"({context.tokens_saved} of {context.naive_tokens} tokens saved; {context.stats})")
+
+        # Stream the chatbot response
+        print("\nAnswer: ", end="", flush=True)
+        for delta in answer:
+            print(delta, end="", flush=True)
+        print()
+
+        if answer.text:
             print("\nSources:")
-            for i, match in enumerate(response.matches[:5], 1):  # Show top 5 sources
-                if match.score > 0.01:
-                    print(f"{i}. Score: {match.score:.4f}")
+            for i, source in enumerate(answer.sources[:5], 1):  # Show top 5 sources
+                print(f"{i}. Score: {source['score']:.4f}")
         else:
-            print("\nNo relevant information found in the database.")
-            
+            print("No relevant information found in the database.")
+
+        print(f"\nTiming: {json.dumps(answer.timing.as_dict())}")
+
     except Exception as e:
         print(f"Error: {e}")
 
-if __name__ == "__main__":
+def run_fanout_query(query_text: str):
+    """Query every collection at once and show the fused matches."""
+    print(f"\nQuery (all collections): '{query_text}'")
+    result = get_fanout().retrieve(query_text)
+    for match in result.matches:
+        print(f"Score: {match.score:.4f} [{match.metadata['collection']}] - "
+              f"Text starts with: {match.metadata.get('text', '')[:100]}...")
+    print(f"\nPer-collection seconds: {json.dumps({k: round(v, 3) for k, v in result.seconds.items()})}")
+    if result.timed_out:
+        print(f"Missed the deadline: {', '.join(result.timed_out)}")
+    for name, error in result.errors.items():
+        print(f"Error from {name}: {error}")
+
+def run_batch(path: str, namespace: str = "research-papers"):
+    """Run a file of questions concurrently and report retrieval quality and latency.
+
+    See ``scripts/evaluate_retrieval.py`` for cutoffs, answer generation and JSON output.
+    """
+    print(format_report(evaluate(get_retriever(namespace), load_questions(path))))
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--all":
+        run_fanout_query(" ".join(sys.argv[2:]))
+        return
+    if len(sys.argv) > 1:
+        run_batch(sys.argv[1])
+        return
+
     test_queries = [
         "Can you provide a summary of the main findings of this study?",
         "What is non-sleep deep rest (NSDR) and what were its effects in this study?"
     ]
-    
+
     for query in test_queries:
-        test_query(query)
\ No newline at end of file
+        test_query(query)
+
+if __name__ == "__main__":
+    with instrumented(_metrics, run="test_pinecone"):
+        main()